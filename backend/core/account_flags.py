@@ -0,0 +1,91 @@
+"""
+Account Flags
+Per-account screening facts behind the static rules, computed once per account.
+
+An account's master data (name, country, KYC status, declared income, gating)
+reduces to an AccountRecord: a bit set of PEP hit, high-risk jurisdiction,
+incomplete KYC and gating, plus the amount above which the 50%-of-income rule
+fires. The DataLoader builds the records when master data loads and refreshes
+an account's record when its data changes, so the PEP, jurisdiction, KYC and
+gating rules test a few bits instead of re-reading and re-screening both
+parties on every evaluation.
+"""
+
+import math
+
+from backend.core.screening import is_watchlisted
+
+HIGH_RISK_COUNTRIES = frozenset({"Panama", "Syria", "North Korea", "Iran"})
+GATED_STATUS = "Gated_5000_Limit"
+
+FLAG_PEP = 1
+FLAG_HIGH_RISK = 2
+FLAG_KYC_INCOMPLETE = 4
+FLAG_GATED = 8
+
+
+class AccountRecord:
+    __slots__ = ("bits", "country", "income", "income_limit")
+
+    def __init__(self, bits, country, income, income_limit):
+        self.bits = bits
+        self.country = country
+        self.income = income
+        self.income_limit = income_limit  # Transfers above this exceed 50% of income
+
+
+def account_record(account_id, info, pep_db, high_risk_countries=HIGH_RISK_COUNTRIES):
+    """Flags for one account's master data (an empty dict for unknown accounts)."""
+    country = info.get("Country", "Unknown")
+    income = float(info.get("Declared_Income", 0))
+    bits = 0
+    if is_watchlisted(pep_db, account_id, info.get("Name", "")):
+        bits |= FLAG_PEP
+    if country in high_risk_countries:
+        bits |= FLAG_HIGH_RISK
+    if info.get("KYC_Status", "Incomplete") == "Incomplete":
+        bits |= FLAG_KYC_INCOMPLETE
+    if info.get("Account_Status") == GATED_STATUS:
+        bits |= FLAG_GATED
+    # Without a declared income the rule never fires
+    return AccountRecord(bits, country, income, 0.5 * income if income > 0 else math.inf)
+
+
+class AccountFlags:
+    def __init__(self, high_risk_countries=HIGH_RISK_COUNTRIES, records=None):
+        """
+        Args:
+            high_risk_countries (set): Jurisdictions that set FLAG_HIGH_RISK.
+            records (dict, optional): account -> AccountRecord.
+        """
+        self.high_risk_countries = frozenset(high_risk_countries)
+        self.records = records if records is not None else {}
+        self.unknown = account_record(None, {}, (), self.high_risk_countries)
+
+    @classmethod
+    def build(cls, account_db, pep_db, high_risk_countries=HIGH_RISK_COUNTRIES, account_ids=None):
+        """
+        Flags for every account in account_db, or only for account_ids when given.
+        """
+        flags = cls(high_risk_countries)
+        for account_id in account_db if account_ids is None else account_ids:
+            info = account_db.get(account_id)
+            if info is not None:
+                flags.records[account_id] = account_record(account_id, info, pep_db, flags.high_risk_countries)
+        return flags
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, account_id):
+        return self.records.get(account_id, self.unknown)
+
+    def refresh(self, account_id, info, pep_db):
+        """Recomputes an account's record after its master data changed."""
+        self.records[account_id] = account_record(account_id, info, pep_db, self.high_risk_countries)
+
+    def subset(self, account_ids):
+        """Records for some accounts only, e.g. to ship to a worker process."""
+        return AccountFlags(self.high_risk_countries, {
+            account_id: self.records[account_id] for account_id in account_ids if account_id in self.records
+        })
@@ -1,11 +1,55 @@
 
 from datetime import datetime
+
+import numpy as np
 import pandas as pd
 
+from backend.core.account_flags import (
+    FLAG_GATED, FLAG_HIGH_RISK, FLAG_KYC_INCOMPLETE, FLAG_PEP, HIGH_RISK_COUNTRIES, AccountFlags
+)
+from backend.core.graph_index import CYCLE_MAX_HOPS, CYCLE_VISIT_BUDGET, TransactionGraph
+from backend.core.sketches import ReceiverWindows
+from backend.core.store import TransactionStore
+from backend.core.windows import SenderWindows, series_to_epoch_seconds, to_epoch_seconds
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+STRUCTURING_WINDOW_SECONDS = 24 * 3600
+VELOCITY_WINDOW_SECONDS = 48 * 3600
+MULE_SENDER_THRESHOLD = 4
+
+
+def batch_accounts(txs):
+    """Every sender and receiver of a batch, once each."""
+    return {tx.get(key) for tx in txs for key in ("Sender_Account_ID", "Receiver_Account_ID")}
+
+
+def batch_times(txs):
+    """
+    Each row's evaluation time and recorded time, in epoch seconds.
+
+    As in evaluate_transaction, a row is evaluated at its Timestamp parsed with
+    TIMESTAMP_FORMAT, or at "now" if that fails. Later rows see it at the time
+    the windows indexes record it (to_epoch_seconds, which also accepts e.g.
+    ISO timestamps); NaN if it never counts towards their windows.
+    """
+    stamps = [tx.get("Timestamp") for tx in txs]
+    parsed = pd.to_datetime(pd.Series(stamps, dtype=object), format=TIMESTAMP_FORMAT, errors="coerce")
+    strict = parsed.notna().to_numpy()
+    if not strict.all():
+        parsed = parsed.fillna(pd.Timestamp(datetime.now()))  # Fallback
+    times = series_to_epoch_seconds(parsed)
+    recorded = times.copy()
+    for i in np.flatnonzero(~strict):
+        recorded[i] = to_epoch_seconds(stamps[i])
+    return times, recorded
+
+
 class AMLEngine:
     def __init__(self):
-        self.high_risk_countries = {"Panama", "Syria", "North Korea", "Iran"}
+        self.high_risk_countries = set(HIGH_RISK_COUNTRIES)
         self.structuring_threshold = 10000  # Default threshold
+        self.cycle_max_hops = CYCLE_MAX_HOPS
+        self.cycle_visit_budget = CYCLE_VISIT_BUDGET
 
     def set_structuring_threshold(self, value: float):
         """Crisis Feature 1: Dynamically update reporting threshold"""
@@ -44,7 +88,8 @@ class AMLEngine:
         
         return min(total_risk, 100)  # Cap at 100
 
-    def evaluate_transaction(self, tx, account_db, pep_db, tx_history_df):
+    def evaluate_transaction(self, tx, account_db, pep_db, tx_history_df, graph=None, windows=None,
+                             receiver_windows=None, account_flags=None):
         """
         Evaluates a single transaction against 6 deterministic rules.
         
@@ -52,24 +97,21 @@ class AMLEngine:
             tx (dict): The transaction to evaluate. Must contain:
                        'Sender_Account_ID', 'Receiver_Account_ID', 'Amount', 'Timestamp'
             account_db (dict): Account lookup dictionary.
-            pep_db (set): Set of PEP names.
-            tx_history_df (pd.DataFrame): DataFrame of past transactions.
+            pep_db (PEPScreener | set): Watchlist screener, or a set of lowercase PEP names matched exactly.
+            tx_history_df (pd.DataFrame | TransactionStore): Past transactions.
+            graph (TransactionGraph, optional): Pre-built edge index over tx_history_df.
+                If omitted, one is built from tx_history_df for this call.
+            windows (SenderWindows, optional): Per-sender time windows over tx_history_df.
+                If omitted, they are built from tx_history_df for this call.
+            receiver_windows (ReceiverWindows, optional): Per-receiver distinct senders
+                over tx_history_df. If omitted, they are built from tx_history_df for this call.
+            account_flags (AccountFlags, optional): Precomputed flags over account_db and
+                pep_db. If omitted, the two parties' flags are computed for this call.
             
         Returns:
             dict: Evaluation result containing total_score, risk_breakdown, and decision.
         """
-        
-        risk_breakdown = {
-            "structuring": 0,
-            "velocity": 0,
-            "network": 0,
-            "pep": 0,
-            "jurisdiction": 0,
-            "kyc": 0
-        }
-        triggered_rules = []
-        cycle_path = None  # Crisis Feature 3: Initialize cycle path safely
-
+        findings = {}
         
         sender_id = tx.get("Sender_Account_ID")
         receiver_id = tx.get("Receiver_Account_ID")
@@ -77,172 +119,357 @@ class AMLEngine:
         timestamp_str = tx.get("Timestamp")
         
         try:
-            current_time = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
+            current_time = datetime.strptime(timestamp_str, TIMESTAMP_FORMAT)
         except:
             current_time = datetime.now() # Fallback
 
-        sender_info = account_db.get(sender_id, {})
-        receiver_info = account_db.get(receiver_id, {})
+        flags = self.account_flags_for((sender_id, receiver_id), account_db, pep_db, account_flags)
+        sender, receiver = flags.get(sender_id), flags.get(receiver_id)
         
         # CRISIS FEATURE 2: Check if account is GATED
-        if sender_info.get("Account_Status") == "Gated_5000_Limit":
-            if amount > 5000:
-                raise ValueError(f"GATED_ACCOUNT_BREACH: Account {sender_id} is limited to ₹5,000 transfers. Attempted: ${amount:,.2f}")
+        if sender.bits & FLAG_GATED and amount > 5000:
+            raise ValueError(self._gated_breach_message(sender_id, amount))
         
+        # Only the fallback index builders below need a DataFrame view of the store
+        if isinstance(tx_history_df, TransactionStore) and None in (graph, windows, receiver_windows):
+            tx_history_df = tx_history_df.to_dataframe()
+
         # ---------------------------------------------------------
         # 1. Structuring Risk (Smurfing)
         # Logic: Sum amounts for Sender over trailing 24h. > threshold via multiple txs -> +30
         # ---------------------------------------------------------
-        if not tx_history_df.empty:
-            # Filter for sender
-            sender_history = tx_history_df[tx_history_df["Sender_Account_ID"] == sender_id].copy()
-            if not sender_history.empty:
-                # Convert timestamps safely
-                sender_history["Timestamp_dt"] = pd.to_datetime(sender_history["Timestamp"])
-                start_window = current_time - pd.Timedelta(hours=24)
-                
-                recent_txs = sender_history[sender_history["Timestamp_dt"] >= start_window]
-                total_24h = recent_txs["Amount"].sum() + amount
-                count_24h = len(recent_txs) + 1
-                
-                if total_24h > self.structuring_threshold and count_24h > 1:
-                    risk_breakdown["structuring"] = 30
-                    triggered_rules.append(f"Structuring: total {total_24h} > threshold {self.structuring_threshold} over {count_24h} transactions in 24h")
+        # Per-sender windows are maintained incrementally by the DataLoader;
+        # ad-hoc callers that only pass a DataFrame get a throwaway copy.
+        if windows is None:
+            windows = SenderWindows.from_dataframe(tx_history_df, horizon_hours=None)
+        current_ts = to_epoch_seconds(current_time)
+
+        count_prior_24h, total_prior_24h = windows.stats(sender_id, current_ts - STRUCTURING_WINDOW_SECONDS)
+        if count_prior_24h:
+            total_24h = total_prior_24h + amount
+            count_24h = count_prior_24h + 1
+            
+            if total_24h > self.structuring_threshold and count_24h > 1:
+                findings["structuring"] = (total_24h, count_24h)
 
         # ---------------------------------------------------------
         # 2. Velocity Risk
         # Logic: Count frequency in last 48h. If > 3x baseline (assume 5 for MVP) -> +20
         # ---------------------------------------------------------
-        if not tx_history_df.empty:
-            start_window_48 = current_time - pd.Timedelta(hours=48)
-            # Re-using sender_history if computed, else re-filter
-            # (Assuming simplicity here)
-            sender_history_48 = tx_history_df[
-                (tx_history_df["Sender_Account_ID"] == sender_id)
-            ].copy()
-            sender_history_48["Timestamp_dt"] = pd.to_datetime(sender_history_48["Timestamp"])
-            recent_48h = sender_history_48[sender_history_48["Timestamp_dt"] >= start_window_48]
-            
-            # Simple threshold for MVP: > 5 tx in 48h is suspicious if no baseline
-            if len(recent_48h) > 5:
-                risk_breakdown["velocity"] = 20
-                triggered_rules.append(f"Velocity: {len(recent_48h)} transactions in 48h")
+        count_48h, _ = windows.stats(sender_id, current_ts - VELOCITY_WINDOW_SECONDS)
+        
+        # Simple threshold for MVP: > 5 tx in 48h is suspicious if no baseline
+        if count_48h > 5:
+            findings["velocity"] = count_48h
 
         # ---------------------------------------------------------
         # 3. Network & Layering Risk (Graph Traversal)
-        # Logic: 3 hops. Circular (A->B->C->A) or Mule (Many->One). +40 Risk.
-        # OPTIMIZED: Bulletproof BFS for circular detection (A->B->C->A pattern)
+        # Logic: Circular ring of up to cycle_max_hops (A->B->C->A is 3) or Mule
+        # (Many->One within the mule window). +40 Risk.
         # ---------------------------------------------------------
-        # Build a directed graph from transaction history
-        graph = {}
-        if not tx_history_df.empty:
-            for _, row in tx_history_df.iterrows():
-                u, v = row["Sender_Account_ID"], row["Receiver_Account_ID"]
-                if u not in graph:
-                    graph[u] = set()
-                graph[u].add(v)
-        
-        # Add current transaction edge to graph
-        if sender_id not in graph:
-            graph[sender_id] = set()
-        graph[sender_id].add(receiver_id)
-
-        # Detect CIRCULAR PATTERN: Check if receiver can reach sender in <= 2 hops
-        # Pattern: A -> B -> C -> A (3 edges, forming a cycle)
-        # BFS from receiver_id, looking for sender_id within 2 steps
-        # CRISIS FEATURE 3: Track path for network visualization
-        found_cycle = False
-        cycle_path = None
-        if receiver_id in graph:  # Only check if receiver has outgoing edges
-            queue = [(receiver_id, 0, [sender_id, receiver_id])]  # (node, depth, path)
-            visited = {receiver_id}
-            
-            while queue and not found_cycle:
-                curr, depth, path = queue.pop(0)
-                
-                # Check neighbors of current node
-                neighbors = graph.get(curr, set())
-                for neighbor in neighbors:
-                    # Found cycle: receiver leads back to sender
-                    if neighbor == sender_id:
-                        found_cycle = True
-                        cycle_path = path + [sender_id]  # Complete the cycle
-                        break
-                    
-                    # Continue BFS if within depth limit
-                    if depth < 2 and neighbor not in visited:
-                        visited.add(neighbor)
-                        queue.append((neighbor, depth + 1, path + [neighbor]))
-            
-        if found_cycle:
-            risk_breakdown["network"] = 40
-            triggered_rules.append("Network: Circular transaction pattern detected (A→B→C→A)")
-        
-        # Detect MULE ACCOUNT: Receiver has > 4 unique incoming senders
-        # This indicates potential money laundering via intermediary accounts
-        if not found_cycle:  # Don't double-penalize
-            incoming_senders = set()
-            if not tx_history_df.empty:
-                receiver_history = tx_history_df[tx_history_df["Receiver_Account_ID"] == receiver_id]
-                incoming_senders = set(receiver_history["Sender_Account_ID"].tolist())
-            incoming_senders.add(sender_id)  # Include current sender
-            
-            if len(incoming_senders) > 4:
-                risk_breakdown["network"] = 40
-                triggered_rules.append(f"Network: Mule account detected ({len(incoming_senders)} unique senders → {receiver_id})")
-
+        # The graph index is maintained incrementally by the DataLoader; ad-hoc
+        # callers that only pass a DataFrame get a throwaway index built once.
+        if graph is None:
+            graph = TransactionGraph.from_dataframe(tx_history_df)
+        if receiver_windows is None:
+            receiver_windows = ReceiverWindows.from_dataframe(tx_history_df, horizon_hours=None)
+        unique_senders = receiver_windows.distinct_senders(
+            receiver_id, current_ts - receiver_windows.window_seconds, sender_id  # Include current sender
+        )
+        self._network_findings(graph, sender_id, receiver_id, unique_senders, findings)
 
         # ---------------------------------------------------------
         # 4. PEP Risk
         # Logic: Sender or Receiver name in PEP list. +50.
+        # High Value PEP Escalation (> $20k) adds +35.
         # ---------------------------------------------------------
-        sender_name = sender_info.get("Name", "")
-        receiver_name = receiver_info.get("Name", "")
-        
-        is_sender_pep = sender_name.lower() in pep_db
-        is_receiver_pep = receiver_name.lower() in pep_db
-        
-        if is_sender_pep or is_receiver_pep:
-            risk_breakdown["pep"] = 50
-            triggered_rules.append(f"PEP: Match found ({'Sender' if is_sender_pep else 'Receiver'})")
-            
-            # High Value PEP Escalation (> $20k)
-            if amount > 20000:
-                risk_breakdown["pep"] += 35  # Pushes score > 80 (STR Generation)
-                triggered_rules.append("PEP: High-Value Transaction Escalation (> $20k)")
+        if (sender.bits | receiver.bits) & FLAG_PEP:
+            findings["pep"] = "Sender" if sender.bits & FLAG_PEP else "Receiver"
+            findings["pep_high_value"] = amount > 20000
 
         # ---------------------------------------------------------
         # 5. Jurisdiction Risk
-        # Logic: Country in High-Risk list. +25.
+        # Logic: Sender or Receiver country in High-Risk list. +25.
         # ---------------------------------------------------------
-        # Check Sender and Receiver countries
-        # The prompt specifically says "Check the Country field."
-        # Assuming sender's country for now, or both. Let's check both?
-        # Prompt says "If *it* matches...". Usually sender country or destination country. I'll check both.
-        
-        sender_country = sender_info.get("Country", "Unknown")
-        receiver_country = receiver_info.get("Country", "Unknown")
-        
-        if sender_country in self.high_risk_countries or receiver_country in self.high_risk_countries:
-            risk_breakdown["jurisdiction"] = 25
-            triggered_rules.append(f"Jurisdiction: High Risk ({sender_country if sender_country in self.high_risk_countries else receiver_country})")
+        if (sender.bits | receiver.bits) & FLAG_HIGH_RISK:
+            findings["jurisdiction"] = sender.country if sender.bits & FLAG_HIGH_RISK else receiver.country
 
         # ---------------------------------------------------------
         # 6. KYC & Profile Risk
         # Logic: KYC "Incomplete" OR Amount > 50% Declared_Income. +20.
         # ---------------------------------------------------------
-        kyc_status = sender_info.get("KYC_Status", "Incomplete")
-        declared_income = float(sender_info.get("Declared_Income", 0))
+        findings["kyc_incomplete"] = bool(sender.bits & FLAG_KYC_INCOMPLETE)
+        if amount > sender.income_limit:
+            findings["income"] = sender.income
+
+        return self._build_result(amount, findings)
+
+    def evaluate_batch(self, txs, account_db, pep_db, tx_history_df, graph=None, windows=None,
+                       receiver_windows=None, account_flags=None):
+        """
+        Evaluates an ordered list of transactions as if each were evaluated and
+        recorded in turn, i.e. row i sees rows 0..i-1 of the batch as history.
+        
+        Structuring, velocity, PEP, jurisdiction and KYC rules are computed over
+        the whole batch with NumPy; only the graph rules run per row, against a
+        copy-on-write overlay so the supplied index is left untouched.
+        
+        Args:
+            txs (list[dict]): Transactions in evaluation order.
+            account_db, pep_db, tx_history_df, graph, windows, receiver_windows, account_flags:
+                As for evaluate_transaction.
+            
+        Returns:
+            list[dict]: One result per transaction, in order. Rows rejected by the
+                gated-account check carry an "error" key instead of a score and are
+                not visible to later rows.
+        """
+        if not txs:
+            return []
+
+        if isinstance(tx_history_df, TransactionStore) and None in (graph, windows, receiver_windows):
+            tx_history_df = tx_history_df.to_dataframe()
+        if windows is None:
+            windows = SenderWindows.from_dataframe(tx_history_df, horizon_hours=None)
+        if graph is None:
+            graph = TransactionGraph.from_dataframe(tx_history_df)
+        if receiver_windows is None:
+            receiver_windows = ReceiverWindows.from_dataframe(tx_history_df, horizon_hours=None)
+
+        flags = self.account_flags_for(batch_accounts(txs), account_db, pep_db, account_flags)
+        overlay = graph.overlay()
+        unique_senders = self.batch_distinct_senders(txs, flags, receiver_windows)
+
+        def network(i, sender_id, receiver_id, findings):
+            self._network_findings(overlay, sender_id, receiver_id, int(unique_senders[i]), findings)
+            overlay.add_edge(sender_id, receiver_id)
+
+        return [
+            row if isinstance(row, dict) else self._build_result(*row)
+            for row in self.batch_findings(txs, flags, windows, network)
+        ]
+
+    def account_flags_for(self, account_ids, account_db, pep_db, account_flags=None):
+        """
+        The supplied flags, or flags computed for just these accounts when none were
+        supplied (or they were built for other high-risk countries than this engine's).
+        """
+        if account_flags is not None and account_flags.high_risk_countries == self.high_risk_countries:
+            return account_flags
+        return AccountFlags.build(account_db, pep_db, self.high_risk_countries, account_ids)
+
+    def batch_findings(self, txs, account_flags, windows, network):
+        """
+        The per-row work of evaluate_batch, before scoring.
+
+        `network(i, sender_id, receiver_id, findings)` adds the graph findings
+        for row i; it is called for accepted rows only, in batch order. Window
+        counts only ever combine a sender's own rows, so any subset of senders
+        (with their windows) can be evaluated on its own.
+
+        Returns:
+            list: Per row, either the gated-breach result dict or an
+                (amount, findings) pair for _build_result.
+        """
+        n = len(txs)
+        senders = [tx.get("Sender_Account_ID") for tx in txs]
+        receivers = [tx.get("Receiver_Account_ID") for tx in txs]
+        amounts = np.array([float(tx.get("Amount", 0)) for tx in txs])
+        times, recorded = batch_times(txs)
+
+        # Precomputed per-account flags, looked up once per distinct account
+        codes, accounts = pd.factorize(pd.Series(senders + receivers, dtype=object), use_na_sentinel=False)
+        records = [account_flags.get(account_id) for account_id in accounts]
+        sender_codes, receiver_codes = codes[:n], codes[n:]
+        bits = np.array([record.bits for record in records], dtype=np.uint8)
+        income = np.array([record.income for record in records])
+        income_limit = np.array([record.income_limit for record in records])
+        is_pep = (bits & FLAG_PEP) != 0
+        high_risk = (bits & FLAG_HIGH_RISK) != 0
+        kyc_incomplete = (bits & FLAG_KYC_INCOMPLETE) != 0
+        gated = (bits & FLAG_GATED) != 0
+
+        # CRISIS FEATURE 2: Gated breaches are rejected and never become history
+        breach = gated[sender_codes] & (amounts > 5000)
+        accepted = ~breach
+
+        # Rules 1 & 2: prior history from the windows plus earlier accepted batch rows
+        count_24h = np.zeros(n, dtype=np.int64)
+        total_24h = np.zeros(n)
+        count_48h = np.zeros(n, dtype=np.int64)
+        for sender_code in np.unique(sender_codes):
+            rows = np.flatnonzero((sender_codes == sender_code) & accepted)
+            if len(rows) == 0:
+                continue
+            sender_id = accounts[sender_code]
+            c24, t24 = windows.stats_many(sender_id, times[rows] - STRUCTURING_WINDOW_SECONDS)
+            c48, _ = windows.stats_many(sender_id, times[rows] - VELOCITY_WINDOW_SECONDS)
+            b24, bt24, b48 = self._batch_window_counts(times[rows], recorded[rows], amounts[rows])
+            count_24h[rows] = c24 + b24
+            total_24h[rows] = t24 + bt24
+            count_48h[rows] = c48 + b48
+
+        structuring = accepted & (count_24h > 0)
+        total_24h = total_24h + amounts
+        structuring &= total_24h > self.structuring_threshold
+        velocity = accepted & (count_48h > 5)
+
+        # Rules 4-6
+        sender_pep = is_pep[sender_codes]
+        pep = sender_pep | is_pep[receiver_codes]
+        pep_high_value = pep & (amounts > 20000)
+        sender_high_risk = high_risk[sender_codes]
+        jurisdiction = sender_high_risk | high_risk[receiver_codes]
+        kyc = kyc_incomplete[sender_codes]
+        sender_income = income[sender_codes]
+        over_income = amounts > income_limit[sender_codes]
+
+        rows = []
+        for i in range(n):
+            sender_id, receiver_id = senders[i], receivers[i]
+            if breach[i]:
+                rows.append({"error": self._gated_breach_message(sender_id, float(amounts[i]))})
+                continue
+
+            findings = {}
+            if structuring[i]:
+                findings["structuring"] = (float(total_24h[i]), int(count_24h[i]) + 1)
+            if velocity[i]:
+                findings["velocity"] = int(count_48h[i])
+            network(i, sender_id, receiver_id, findings)
+            if pep[i]:
+                findings["pep"] = "Sender" if sender_pep[i] else "Receiver"
+                findings["pep_high_value"] = bool(pep_high_value[i])
+            if jurisdiction[i]:
+                findings["jurisdiction"] = records[sender_codes[i] if sender_high_risk[i] else receiver_codes[i]].country
+            findings["kyc_incomplete"] = bool(kyc[i])
+            if over_income[i]:
+                findings["income"] = float(sender_income[i])
+
+            rows.append((float(amounts[i]), findings))
+        return rows
+
+    @staticmethod
+    def batch_accepted(txs, account_flags):
+        """Rows that pass the gated-account check, i.e. that become history."""
+        accepted = np.ones(len(txs), dtype=bool)
+        for i, tx in enumerate(txs):
+            gated = account_flags.get(tx.get("Sender_Account_ID")).bits & FLAG_GATED
+            accepted[i] = not (gated and float(tx.get("Amount", 0)) > 5000)
+        return accepted
+
+    def batch_distinct_senders(self, txs, account_flags, receiver_windows):
+        """
+        For each accepted row, the distinct senders to its receiver within the
+        mule window (the row's own sender included), counting earlier accepted
+        rows of the batch as history. Other rows get 0.
+
+        This is the only rule that combines rows of different senders, so it is
+        computed in one pass over the whole batch, against an overlay.
+        """
+        times, recorded = batch_times(txs)
+        view = receiver_windows.overlay()
+        counts = np.zeros(len(txs), dtype=np.int64)
+        for i in np.flatnonzero(self.batch_accepted(txs, account_flags)):
+            sender_id, receiver_id = txs[i].get("Sender_Account_ID"), txs[i].get("Receiver_Account_ID")
+            counts[i] = view.distinct_senders(receiver_id, times[i] - view.window_seconds, sender_id)
+            view.add(receiver_id, sender_id, recorded[i])  # NaN times are skipped
+        return counts
+
+    @staticmethod
+    def _batch_window_counts(times, recorded, amounts):
+        """
+        For one sender's accepted batch rows (in batch order), counts earlier
+        rows recorded inside each row's 24h and 48h windows and sums their 24h
+        amounts. Rows recorded at NaN never count.
+        """
+        n = len(times)
+        count_24h = np.zeros(n, dtype=np.int64)
+        total_24h = np.zeros(n)
+        count_48h = np.zeros(n, dtype=np.int64)
+        if n < 2:
+            return count_24h, total_24h, count_48h
+        positions = np.arange(n)
+        # Bound the pairwise masks to ~1M cells per step for very busy senders
+        step = max(1, (1 << 20) // n)
+        for start in range(0, n, step):
+            rows = slice(start, min(start + step, n))
+            earlier = positions[None, :] < positions[rows, None]
+            in_24h = earlier & (recorded[None, :] >= times[rows, None] - STRUCTURING_WINDOW_SECONDS)
+            in_48h = earlier & (recorded[None, :] >= times[rows, None] - VELOCITY_WINDOW_SECONDS)
+            count_24h[rows] = in_24h.sum(axis=1)
+            total_24h[rows] = in_24h @ amounts
+            count_48h[rows] = in_48h.sum(axis=1)
+        return count_24h, total_24h, count_48h
+
+    @staticmethod
+    def _gated_breach_message(sender_id, amount):
+        return f"GATED_ACCOUNT_BREACH: Account {sender_id} is limited to ₹5,000 transfers. Attempted: ${amount:,.2f}"
+
+    def _network_findings(self, graph, sender_id, receiver_id, unique_senders, findings):
+        # Detect CIRCULAR PATTERN: Check if receiver can reach sender, closing a
+        # ring of at most cycle_max_hops edges (A -> B -> C -> A is 3)
+        # CRISIS FEATURE 3: Track path for network visualization
+        cycle_path = graph.find_cycle(sender_id, receiver_id, self.cycle_max_hops, self.cycle_visit_budget)
+        if cycle_path is not None:
+            findings["cycle_path"] = cycle_path
+            return
         
+        # Detect MULE ACCOUNT: Receiver has > 4 unique incoming senders within
+        # the mule window. This indicates potential money laundering via
+        # intermediary accounts (only when no cycle was found, to avoid double-penalizing)
+        if unique_senders > MULE_SENDER_THRESHOLD:
+            findings["mule"] = (unique_senders, receiver_id)
+
+    def _build_result(self, amount, findings):
+        """Turns rule findings into the scored result returned by the evaluate methods."""
+        risk_breakdown = {
+            "structuring": 0,
+            "velocity": 0,
+            "network": 0,
+            "pep": 0,
+            "jurisdiction": 0,
+            "kyc": 0
+        }
+        triggered_rules = []
+
+        if "structuring" in findings:
+            total_24h, count_24h = findings["structuring"]
+            risk_breakdown["structuring"] = 30
+            # Rounded to cents so the text does not depend on summation order
+            triggered_rules.append(f"Structuring: total {round(total_24h, 2)} > threshold {self.structuring_threshold} over {count_24h} transactions in 24h")
+
+        if "velocity" in findings:
+            risk_breakdown["velocity"] = 20
+            triggered_rules.append(f"Velocity: {findings['velocity']} transactions in 48h")
+
+        if "cycle_path" in findings:
+            risk_breakdown["network"] = 40
+            hops = len(findings["cycle_path"]) - 1
+            triggered_rules.append(f"Network: Circular transaction pattern detected ({hops}-hop ring)")
+        elif "mule" in findings:
+            unique_senders, receiver_id = findings["mule"]
+            risk_breakdown["network"] = 40
+            triggered_rules.append(f"Network: Mule account detected ({unique_senders} unique senders → {receiver_id})")
+
+        if "pep" in findings:
+            risk_breakdown["pep"] = 50
+            triggered_rules.append(f"PEP: Match found ({findings['pep']})")
+            if findings["pep_high_value"]:
+                risk_breakdown["pep"] += 35  # Pushes score > 80 (STR Generation)
+                triggered_rules.append("PEP: High-Value Transaction Escalation (> $20k)")
+
+        if "jurisdiction" in findings:
+            risk_breakdown["jurisdiction"] = 25
+            triggered_rules.append(f"Jurisdiction: High Risk ({findings['jurisdiction']})")
+
         kyc_risk = False
-        if kyc_status == "Incomplete":
+        if findings.get("kyc_incomplete"):
             kyc_risk = True
             triggered_rules.append("KYC: Status is Incomplete")
-        
-        if declared_income > 0 and amount > (0.5 * declared_income):
+        if "income" in findings:
             kyc_risk = True
-            triggered_rules.append(f"KYC: Amount ({amount}) > 50% of Income ({declared_income})")
-            
+            triggered_rules.append(f"KYC: Amount ({amount}) > 50% of Income ({findings['income']})")
         if kyc_risk:
             risk_breakdown["kyc"] = 20
 
@@ -263,8 +490,8 @@ class AMLEngine:
         }
         
         # CRISIS FEATURE 3: Include cycle path if circular pattern detected
-        if cycle_path:
-            result["cycle_path"] = cycle_path
+        if findings.get("cycle_path"):
+            result["cycle_path"] = findings["cycle_path"]
             
         return result
 
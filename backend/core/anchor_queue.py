@@ -0,0 +1,202 @@
+"""
+Asynchronous Anchoring Queue
+Moves storeAudit transactions off the request path.
+
+Ledger rows (or Merkle batch roots) are enqueued in the `anchor_queue` table in
+the same SQLite transaction that writes them, so nothing is lost on restart.
+A background worker sends queued anchors with locally assigned nonces (many
+can be in flight at once), polls for receipts without blocking, and backfills
+`eth_tx_hash` in compliance_log once an anchor is mined.
+
+Queue status flow: queued -> sent -> confirmed. Without a reachable, configured
+chain, anchors resolve to mock hashes (status "mock"), as before.
+"""
+
+import sqlite3
+import threading
+import time
+
+QUEUE_SCHEMA = '''CREATE TABLE IF NOT EXISTS anchor_queue
+             (id INTEGER PRIMARY KEY AUTOINCREMENT,
+              first_id INTEGER,
+              last_id INTEGER,
+              batch_id INTEGER,
+              audit_hash TEXT,
+              risk_score INTEGER,
+              status TEXT DEFAULT 'queued',
+              nonce INTEGER,
+              eth_tx_hash TEXT,
+              attempts INTEGER DEFAULT 0,
+              last_error TEXT,
+              sent_at REAL,
+              created_at DATETIME DEFAULT CURRENT_TIMESTAMP)'''
+QUEUE_INDEX = "CREATE INDEX IF NOT EXISTS idx_anchor_queue_status ON anchor_queue (status, id)"
+
+
+class NonceManager:
+    """Hands out consecutive nonces locally instead of asking the node per transaction."""
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._next = None
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self._next is None:
+                # "pending" counts our own in-flight transactions too
+                self._next = self.w3.eth.get_transaction_count(self.address, "pending")
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def reset(self):
+        """Re-sync from the node on the next call (after a rejected or dropped send)."""
+        with self._lock:
+            self._next = None
+
+
+class AnchorWorker:
+    def __init__(self, provenance, poll_interval=0.5, max_in_flight=64, receipt_timeout=120, max_attempts=5):
+        """
+        Args:
+            provenance (ProvenanceManager): Supplies the Web3 client and the storeAudit call.
+            poll_interval (float): Seconds between send/receipt passes.
+            max_in_flight (int): Most anchors sent but not yet mined.
+            receipt_timeout (float): Seconds before an unmined anchor is re-sent.
+            max_attempts (int): Send attempts before an anchor is marked failed.
+        """
+        self.provenance = provenance
+        self.poll_interval = poll_interval
+        self.max_in_flight = max_in_flight
+        self.receipt_timeout = receipt_timeout
+        self.max_attempts = max_attempts
+        self.nonces = None
+        self._conn = sqlite3.connect(provenance.db_path, check_same_thread=False, timeout=30)
+        self._pass_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="anchor-worker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        with self._pass_lock:
+            self._conn.close()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"❌ Anchor worker error: {e} - retrying")
+
+    def pending_count(self):
+        with self._pass_lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM anchor_queue WHERE status IN ('queued', 'sent')"
+            ).fetchone()[0]
+
+    def drain(self, timeout=30):
+        """Runs passes until nothing is queued or in flight; returns True if drained."""
+        deadline = time.monotonic() + timeout
+        while self.pending_count():
+            if time.monotonic() > deadline:
+                return False
+            self.run_once()
+            time.sleep(0.05)
+        return True
+
+    def run_once(self):
+        """One send pass and one receipt pass."""
+        with self._pass_lock:
+            if not self.provenance.chain_ready():
+                self._resolve_mock()
+                return
+            if self.nonces is None:
+                self.nonces = NonceManager(self.provenance.w3, self.provenance.account_address)
+            self._send_queued()
+            self._poll_receipts()
+
+    def _claim(self, status, limit):
+        return self._conn.execute(
+            "SELECT id, first_id, last_id, batch_id, audit_hash, risk_score, eth_tx_hash, attempts, sent_at "
+            "FROM anchor_queue WHERE status = ? ORDER BY id LIMIT ?", (status, limit)
+        ).fetchall()
+
+    def _resolve_mock(self):
+        rows = self._claim("queued", 1000)
+        for row_id, first_id, last_id, batch_id, audit_hash, risk_score, *_ in rows:
+            self._backfill(row_id, first_id, last_id, batch_id,
+                           self.provenance.mock_eth_hash(audit_hash, risk_score), "mock")
+        self._conn.commit()
+
+    def _send_queued(self):
+        in_flight = self._conn.execute("SELECT COUNT(*) FROM anchor_queue WHERE status = 'sent'").fetchone()[0]
+        rows = self._claim("queued", max(0, self.max_in_flight - in_flight))
+        if not rows:
+            return
+        w3 = self.provenance.w3
+        gas_price = w3.eth.gas_price or w3.to_wei('20', 'gwei')
+
+        for row_id, first_id, last_id, batch_id, audit_hash, risk_score, _, attempts, _ in rows:
+            nonce = self.nonces.next()
+            try:
+                eth_tx_hash = self.provenance.send_audit(audit_hash, risk_score, nonce, gas_price)
+            except Exception as e:
+                # The nonce may now be out of step with the node; re-sync before the next send
+                self.nonces.reset()
+                status = "failed" if attempts + 1 >= self.max_attempts else "queued"
+                self._conn.execute(
+                    "UPDATE anchor_queue SET status = ?, attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    (status, str(e), row_id)
+                )
+                self._conn.commit()
+                print(f"❌ Anchor send failed for queue entry {row_id}: {e}")
+                break
+            self._conn.execute(
+                "UPDATE anchor_queue SET status = 'sent', nonce = ?, eth_tx_hash = ?, attempts = attempts + 1, sent_at = ? WHERE id = ?",
+                (nonce, eth_tx_hash, time.time(), row_id)
+            )
+            self._conn.commit()
+
+    def _poll_receipts(self):
+        w3 = self.provenance.w3
+        now = time.time()
+        for row_id, first_id, last_id, batch_id, _, _, eth_tx_hash, attempts, sent_at in self._claim("sent", self.max_in_flight):
+            try:
+                receipt = w3.eth.get_transaction_receipt(eth_tx_hash)
+            except Exception:
+                receipt = None  # Not mined yet
+            if receipt is None:
+                if now - (sent_at or now) > self.receipt_timeout:
+                    # Dropped from the pool: send again with a fresh nonce
+                    self.nonces.reset()
+                    status = "failed" if attempts >= self.max_attempts else "queued"
+                    self._conn.execute(
+                        "UPDATE anchor_queue SET status = ?, last_error = 'receipt timeout' WHERE id = ?", (status, row_id)
+                    )
+                    self._conn.commit()
+                continue
+            if receipt.get("status", 1) == 0:
+                self._conn.execute(
+                    "UPDATE anchor_queue SET status = 'failed', last_error = 'reverted' WHERE id = ?", (row_id,)
+                )
+            else:
+                self._backfill(row_id, first_id, last_id, batch_id, eth_tx_hash, "confirmed")
+                print(f"✅ Blockchain TX: {eth_tx_hash} (Block: {receipt['blockNumber']})")
+            self._conn.commit()
+
+    def _backfill(self, row_id, first_id, last_id, batch_id, eth_tx_hash, status):
+        self._conn.execute(
+            "UPDATE anchor_queue SET status = ?, eth_tx_hash = ? WHERE id = ?", (status, eth_tx_hash, row_id)
+        )
+        self._conn.execute(
+            "UPDATE compliance_log SET eth_tx_hash = ? WHERE id BETWEEN ? AND ?", (eth_tx_hash, first_id, last_id)
+        )
+        if batch_id is not None:
+            self._conn.execute("UPDATE merkle_batches SET eth_tx_hash = ? WHERE id = ?", (eth_tx_hash, batch_id))
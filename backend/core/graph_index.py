@@ -0,0 +1,253 @@
+"""
+Transaction Graph Index
+Incrementally maintained sender → receiver adjacency used by the network rule.
+
+The index is owned by the DataLoader and grows by one edge per accepted
+transaction, so circular-pattern checks only touch the local
+neighbourhood of the accounts involved instead of the whole history. Ring
+searches are bounded both in length (CYCLE_MAX_HOPS) and in the number of
+accounts visited (CYCLE_VISIT_BUDGET).
+
+Alongside the adjacency, AccountClusters tracks which accounts are connected
+by any chain of transfers (in either direction). A ring needs the receiver to
+reach the sender, so accounts in different clusters are ruled out in O(α(n))
+before any path search, and whole clusters can be listed without a traversal.
+"""
+
+import os
+from collections import ChainMap
+
+CYCLE_MAX_HOPS = int(os.getenv("CYCLE_MAX_HOPS", "6"))
+CYCLE_VISIT_BUDGET = int(os.getenv("CYCLE_VISIT_BUDGET", "5000"))
+
+_ROOT = object()
+
+
+def find_cycle(successors, predecessors, sender_id, receiver_id,
+               max_hops=CYCLE_MAX_HOPS, visit_budget=CYCLE_VISIT_BUDGET):
+    """
+    Looks for a ring the pending edge sender → receiver would close.
+
+    Bidirectional BFS: forward from the receiver over `successors(node)`,
+    backward from the sender over `predecessors(node)` (both iterables in
+    insertion order), always growing the smaller frontier by one full layer.
+    Each side records where it reached a node from, and the path is rebuilt
+    only once the two sides meet. Shared by every edge index so they all
+    report the same ring for the same edges.
+
+    Args:
+        max_hops (int): Longest ring reported, in edges, the pending edge included.
+        visit_budget (int): Nodes the search may visit before giving up (no ring),
+            which bounds the cost of queries touching hub accounts.
+
+    Returns:
+        list | None: The ring as [sender, receiver, ..., sender], or None.
+    """
+    # The pending edge itself is a self-loop
+    if sender_id == receiver_id:
+        return [sender_id, receiver_id, sender_id]
+
+    forward = {receiver_id: _ROOT}   # node -> node it was reached from
+    backward = {sender_id: _ROOT}    # node -> node it leads to
+    forward_frontier, backward_frontier = [receiver_id], [sender_id]
+    # The path back from the receiver may use every hop but the pending edge
+    for _ in range(max_hops - 1):
+        if not forward_frontier or not backward_frontier:
+            return None
+        grow_forward = len(forward_frontier) <= len(backward_frontier)
+        if grow_forward:
+            frontier, reached, other, neighbours = forward_frontier, forward, backward, successors
+        else:
+            frontier, reached, other, neighbours = backward_frontier, backward, forward, predecessors
+        next_frontier = []
+        for node in frontier:
+            for neighbour in neighbours(node):
+                if neighbour in reached:
+                    continue
+                reached[neighbour] = node
+                if neighbour in other:
+                    return _ring(forward, backward, neighbour, sender_id)
+                if len(forward) + len(backward) > visit_budget:
+                    return None
+                next_frontier.append(neighbour)
+        if grow_forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+    return None
+
+
+def _ring(forward, backward, meeting, sender_id):
+    head = []
+    node = meeting
+    while node is not _ROOT:
+        head.append(node)
+        node = forward[node]
+    ring = [sender_id] + head[::-1]
+    node = backward[meeting]
+    while node is not _ROOT:
+        ring.append(node)
+        node = backward[node]
+    return ring
+
+
+class AccountClusters:
+    """Union-find over accounts, merged as edges are added."""
+
+    def __init__(self):
+        self.parent = {}   # account -> parent account; roots point at themselves
+        self.size = {}     # root -> accounts in its cluster
+        self.members = {}  # root -> accounts in its cluster (None on overlays)
+
+    def __len__(self):
+        return len(self.members)
+
+    def overlay(self):
+        """Copy-on-write view for speculative merges; member lists are not kept."""
+        view = AccountClusters()
+        view.parent = ChainMap({}, self.parent)
+        view.size = ChainMap({}, self.size)
+        view.members = None
+        return view
+
+    def find(self, account_id):
+        parent = self.parent
+        if account_id not in parent:
+            return account_id
+        root = account_id
+        while parent[root] != root:
+            root = parent[root]
+        # Path compression; concurrent readers only ever repoint a node at its
+        # own root, which unions (made under the write lock) never move
+        while parent[account_id] != root:
+            parent[account_id], account_id = root, parent[account_id]
+        return root
+
+    def union(self, a, b):
+        for account_id in (a, b):
+            if account_id not in self.parent:
+                self.parent[account_id] = account_id
+                self.size[account_id] = 1
+                if self.members is not None:
+                    self.members[account_id] = [account_id]
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        if self.members is not None:
+            self.members[root_a].extend(self.members.pop(root_b))
+            del self.size[root_b]
+
+    def connected(self, a, b):
+        return a == b or (a in self.parent and b in self.parent and self.find(a) == self.find(b))
+
+    def cluster_of(self, account_id):
+        """Accounts in account_id's cluster (in the order they joined it), or None if it has no edges."""
+        if account_id not in self.parent:
+            return None
+        return list(self.members[self.find(account_id)])
+
+    def clusters(self, min_size=1):
+        """(representative account, members) pairs, largest cluster first."""
+        found = [(root, members) for root, members in self.members.items() if len(members) >= min_size]
+        return sorted(found, key=lambda item: len(item[1]), reverse=True)
+
+
+class TransactionGraph:
+    def __init__(self):
+        # Adjacency maps use dicts (not sets) so neighbour order follows
+        # insertion order and traversals are reproducible across processes.
+        self.successors = {}    # sender -> {receiver: None}
+        self.predecessors = {}  # receiver -> {sender: None}
+        self.clusters = AccountClusters()
+        self.edge_count = 0
+        # New edges are also logged here after start_edge_log() (the
+        # ShardedEvaluator, to update its shared index incrementally)
+        self.edge_log = None
+        self.edge_log_limit = 0
+
+    @classmethod
+    def from_dataframe(cls, tx_history_df):
+        """Builds an index from a transaction history DataFrame."""
+        graph = cls()
+        if tx_history_df is None or tx_history_df.empty:
+            return graph
+        if "Sender_Account_ID" not in tx_history_df or "Receiver_Account_ID" not in tx_history_df:
+            return graph
+        senders = tx_history_df["Sender_Account_ID"].tolist()
+        receivers = tx_history_df["Receiver_Account_ID"].tolist()
+        for sender_id, receiver_id in zip(senders, receivers):
+            graph.add_edge(sender_id, receiver_id)
+        return graph
+
+    def overlay(self):
+        """
+        Copy-on-write view for speculative edges, e.g. earlier rows of a batch.
+
+        Edges added to the overlay are visible to its queries but never reach
+        this index; only the adjacency of nodes the overlay touches is copied.
+        """
+        view = TransactionGraph()
+        view.successors = ChainMap({}, self.successors)
+        view.predecessors = ChainMap({}, self.predecessors)
+        view.clusters = self.clusters.overlay()
+        view.edge_count = self.edge_count
+        return view
+
+    @staticmethod
+    def _writable(adjacency, node):
+        if isinstance(adjacency, ChainMap):
+            local = adjacency.maps[0]
+            if node not in local:
+                local[node] = dict(adjacency.get(node, {}))
+            return local[node]
+        return adjacency.setdefault(node, {})
+
+    def add_edge(self, sender_id, receiver_id):
+        if receiver_id in self.successors.get(sender_id, ()):
+            return
+        self._writable(self.successors, sender_id)[receiver_id] = None
+        self._writable(self.predecessors, receiver_id)[sender_id] = None
+        self.clusters.union(sender_id, receiver_id)
+        self.edge_count += 1
+        if self.edge_log is not None:
+            if len(self.edge_log) < self.edge_log_limit:
+                self.edge_log.append((sender_id, receiver_id))
+            else:
+                self.edge_log = None  # Past the limit the reader rebuilds from the adjacency instead
+
+    def start_edge_log(self, limit):
+        """
+        Logs the edges added from now on, for a reader that drains the log.
+
+        Args:
+            limit (int): Edges kept at most. One more drops the log (edge_log
+                turns None again), so it can never grow into a copy of the graph.
+        """
+        self.edge_log = []
+        self.edge_log_limit = limit
+
+    def stop_edge_log(self):
+        self.edge_log = None
+
+    def add_transaction(self, tx):
+        self.add_edge(tx.get("Sender_Account_ID"), tx.get("Receiver_Account_ID"))
+
+    def find_cycle(self, sender_id, receiver_id, max_hops=CYCLE_MAX_HOPS, visit_budget=CYCLE_VISIT_BUDGET):
+        """
+        Checks whether the pending edge sender → receiver closes a ring of at
+        most `max_hops` edges (A→B→C→A is 3). See the module-level find_cycle.
+
+        Returns:
+            list | None: The cycle as [sender, receiver, ..., sender], or None.
+        """
+        if sender_id != receiver_id and not self.clusters.connected(sender_id, receiver_id):
+            return None  # No chain of transfers links them at all
+        return find_cycle(
+            lambda node: self.successors.get(node, ()),
+            lambda node: self.predecessors.get(node, ()),
+            sender_id, receiver_id, max_hops, visit_budget
+        )
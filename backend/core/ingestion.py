@@ -1,36 +1,96 @@
 
-import pandas as pd
 import os
+import time
+
+from backend.core.account_flags import AccountFlags
+from backend.core.graph_index import TransactionGraph
+from backend.core.locks import ReadWriteLock
+from backend.core.screening import PEPScreener
+from backend.core.sketches import ReceiverWindows
+from backend.core.snapshot import CACHE_DIR_NAME, SnapshotCache
+from backend.core.store import TransactionStore
+from backend.core.windows import SenderWindows
 
 class DataLoader:
-    def __init__(self, data_dir="backend/data"):
+    def __init__(self, data_dir="backend/data", use_snapshot_cache=True):
         self.data_dir = data_dir
+        self.use_snapshot_cache = use_snapshot_cache and os.getenv("REGSHIELD_SNAPSHOT_CACHE", "1") != "0"
         self.accounts_df = None
         self.pep_df = None
-        self.transactions_df = None
+        self.transactions = TransactionStore()
         self.pep_names = set()
+        self.pep_screener = PEPScreener()
         self.account_lookup = {}
+        self.account_flags = AccountFlags()
+        self.graph = TransactionGraph()
+        self.windows = SenderWindows()
+        self.receiver_windows = ReceiverWindows()
+        # Evaluations read the history and its indexes under lock.read();
+        # append_transaction takes it exclusively
+        self.lock = ReadWriteLock()
         
         self.load_data()
 
     def load_data(self):
+        started = time.perf_counter()
+        # Excel sources are read through Parquet snapshots when available
+        cache = SnapshotCache(os.path.join(self.data_dir, CACHE_DIR_NAME), enabled=self.use_snapshot_cache)
+
         # 1. Load Accounts (Use specific names from Prompt)
-        accounts_path = os.path.join(self.data_dir, "regshield_account_master.xlsx")
-        if os.path.exists(accounts_path):
-            self.accounts_df = pd.read_excel(accounts_path)
+        accounts_df = cache.read_excel(os.path.join(self.data_dir, "regshield_account_master.xlsx"))
+        if accounts_df is not None:
+            self.accounts_df = accounts_df
             # Create O(1) Lookup
             self.account_lookup = self.accounts_df.set_index("Account_ID").to_dict(orient="index")
         
         # 2. Load PEP Watchlist
-        pep_path = os.path.join(self.data_dir, "regshield_pep_watchlist.xlsx")
-        if os.path.exists(pep_path):
-            self.pep_df = pd.read_excel(pep_path)
+        pep_df = cache.read_excel(os.path.join(self.data_dir, "regshield_pep_watchlist.xlsx"))
+        if pep_df is not None:
+            self.pep_df = pep_df
             self.pep_names = set(self.pep_df["Name"].str.lower().tolist())
+            # Fuzzy index over the same names; the screening the engine uses
+            self.pep_screener = PEPScreener.from_dataframe(self.pep_df)
+
+        # Screening facts per account, refreshed when an account's data changes
+        self.account_flags = AccountFlags.build(self.account_lookup, self.pep_screener)
 
         # 3. Load Transactions (Simulated Stream)
-        tx_path = os.path.join(self.data_dir, "regshield_transaction_log.xlsx")
-        if os.path.exists(tx_path):
-            self.transactions_df = pd.read_excel(tx_path)
+        tx_df = cache.read_excel(os.path.join(self.data_dir, "regshield_transaction_log.xlsx"))
+        self.transactions = TransactionStore.from_dataframe(tx_df)
+
+        # 4. Index the history once; append_transaction keeps it current
+        self.graph = TransactionGraph.from_dataframe(tx_df)
+        self.windows = SenderWindows.from_dataframe(tx_df)
+        self.receiver_windows = ReceiverWindows.from_dataframe(tx_df)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        source = "snapshot cache" if cache.enabled else "Excel"
+        print(f"📦 DataLoader: {len(self.transactions)} transactions, {len(self.account_lookup)} accounts "
+              f"loaded in {elapsed_ms:.1f} ms via {source} (hits: {cache.hits}, misses: {cache.misses})")
+
+    @property
+    def transactions_df(self):
+        """DataFrame view over the columnar history (cached until the next append)."""
+        return self.transactions.to_dataframe()
+
+    def append_transaction(self, tx):
+        """Records an accepted transaction in the history and its indexes."""
+        self.append_transactions([tx])
+
+    def append_transactions(self, txs):
+        """Records accepted transactions in order, under one exclusive lock."""
+        with self.lock.write():
+            for tx in txs:
+                self.transactions.append(tx)
+                self.graph.add_transaction(tx)
+                self.windows.add_transaction(tx)
+                self.receiver_windows.add_transaction(tx)
+
+    def set_account_status(self, account_id, status):
+        """Updates an account's status (e.g. gating) so later evaluations see it."""
+        with self.lock.write():
+            self.account_lookup[account_id]["Account_Status"] = status
+            self.account_flags.refresh(account_id, self.account_lookup[account_id], self.pep_screener)
 
     def get_account(self, account_id):
         return self.account_lookup.get(account_id)
@@ -38,14 +98,7 @@ class DataLoader:
     def is_pep(self, name):
         if not name:
             return False
-        return name.lower() in self.pep_names
+        return self.pep_screener.match(name) is not None
 
     def get_all_transactions(self):
-        if self.transactions_df is not None:
-            return self.transactions_df.to_dict(orient="records")
-        return []
-
-# Initialize global loader
-data_loader = DataLoader() # This will run on import, which isn't ideal for modularity but fits the prompt's simplicity. 
-# Better to instantiate where needed or use Dependency Injection. 
-# For now, I'll instantiate it inside the main app or keep it here as a singleton.
+        return self.transactions_df.to_dict(orient="records")
@@ -0,0 +1,125 @@
+"""
+Ledger Query API
+Keyset-paginated reads over compliance_log for auditors.
+
+Every query walks one index in (key, id) order and resumes strictly after the
+last row of the previous page, so a page costs one index seek plus `limit`
+rows no matter how deep into the ledger it is (no OFFSET scans). SQLite index
+entries end with the rowid, so single-column indexes already give (key, id)
+order for free.
+"""
+
+import base64
+import json
+import sqlite3
+from datetime import datetime, timezone
+
+from backend.core.verification import connect_readonly
+
+QUERY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_compliance_log_tx_id ON compliance_log (tx_id)",
+    "CREATE INDEX IF NOT EXISTS idx_compliance_log_decision ON compliance_log (decision)",
+    "CREATE INDEX IF NOT EXISTS idx_compliance_log_score ON compliance_log (score)",
+    "CREATE INDEX IF NOT EXISTS idx_compliance_log_timestamp ON compliance_log (timestamp)",
+]
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+COLUMNS = "id, tx_id, tx_data, score, decision, prev_hash, current_hash, eth_tx_hash, timestamp"
+
+# Queryable columns; equality lookups page in id order, ranges in (column, id) order
+EQUALITY_QUERIES = ("tx_id", "decision")
+RANGE_QUERIES = ("score", "timestamp")
+
+
+def encode_cursor(key, row_id):
+    return base64.urlsafe_b64encode(json.dumps([key, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns (key, id) from an opaque page cursor; raises ValueError if malformed."""
+    try:
+        key, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(row_id, int):
+        raise ValueError("Invalid cursor")
+    return key, row_id
+
+
+def ledger_timestamp(value):
+    """ISO-8601 bound -> compliance_log's CURRENT_TIMESTAMP format (UTC)."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def build_query(by, params, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    SQL parts for one page, run in order until limit + 1 rows are read (the
+    extra row only signals that a next page exists).
+
+    Equality lookups page on id. Range lookups resume in two seeks, the rest of
+    the cursor's key value and then the keys after it, because SQLite will not
+    seek an index on a (key, id) > (?, ?) row value.
+
+    Args:
+        by (str): A column from EQUALITY_QUERIES or RANGE_QUERIES.
+        params (tuple): (value,) for equality lookups, (low, high) for ranges.
+        cursor (str | None): next_cursor from the previous page.
+    """
+    select = f"SELECT {COLUMNS} FROM compliance_log WHERE"
+    fetch = limit + 1
+    if by in EQUALITY_QUERIES:
+        (value,) = params
+        after_id = decode_cursor(cursor)[1] if cursor else 0
+        return [(f"{select} {by} = ? AND id > ? ORDER BY id LIMIT ?", [value, after_id, fetch])]
+    if by not in RANGE_QUERIES:
+        raise ValueError(f"Unknown ledger query: {by}")
+    
+    low, high = params
+    if not cursor:
+        return [(f"{select} {by} BETWEEN ? AND ? ORDER BY {by}, id LIMIT ?", [low, high, fetch])]
+    key, after_id = decode_cursor(cursor)
+    return [
+        (f"{select} {by} = ? AND id > ? ORDER BY id LIMIT ?", [key, after_id, fetch]),
+        (f"{select} {by} > ? AND {by} <= ? ORDER BY {by}, id LIMIT ?", [key, high, fetch]),
+    ]
+
+
+def stream_page(db_path, by, params, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    NDJSON lines for one page: one ledger row each, then a {"next_cursor": ...}
+    trailer (null on the last page). Rows come straight off the SQLite cursor.
+
+    The query is built here, so a bad cursor raises ValueError before anything
+    is streamed.
+    """
+    parts = build_query(by, params, cursor, limit)
+    return _stream_rows(db_path, parts, by, limit)
+
+
+def _stream_rows(db_path, parts, column, limit):
+    # StreamingResponse advances this generator on whichever threadpool thread
+    # is free, so the connection may not stay on one thread. It is only ever
+    # used by this generator, one step at a time.
+    conn = connect_readonly(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        next_cursor, last, count = None, None, 0
+        for sql, args in parts:
+            for row in conn.execute(sql, args):
+                if count == limit:
+                    next_cursor = encode_cursor(last[column], last["id"])
+                    break
+                record = dict(row)
+                record["tx_data"] = json.loads(record["tx_data"])
+                yield json.dumps(record) + "\n"
+                last, count = row, count + 1
+            if next_cursor:
+                break
+        yield json.dumps({"next_cursor": next_cursor}) + "\n"
+    finally:
+        conn.close()
@@ -0,0 +1,105 @@
+"""
+Group-Commit Ledger Writer
+Collects compliance_log rows from concurrent requests and commits them together.
+
+Callers submit their rows and block on a Future. A single writer thread takes
+everything queued (up to `max_rows`, lingering up to `max_wait_ms` for more),
+hands the group to the commit function in submission order, and resolves each
+caller's Future with its own records once the shared transaction is durable.
+If the group's transaction fails, each caller's entries are retried in a
+transaction of their own, so one bad entry only fails its own caller.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    def __init__(self, commit_fn, max_rows=512, max_wait_ms=0.0, name="ledger-writer"):
+        """
+        Args:
+            commit_fn (callable): Takes a list of entries, persists them in one
+                transaction and returns one record per entry, in order.
+            max_rows (int): Commit as soon as this many rows are collected.
+            max_wait_ms (float): Longest time to hold a group open for more rows.
+        """
+        self.commit_fn = commit_fn
+        self.max_rows = max(1, int(max_rows))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self._queue = queue.Queue()
+        self._closed = False
+        self._submit_lock = threading.Lock()
+        self.groups_committed = 0
+        self.rows_committed = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, entries):
+        """Queues entries for the next group; the Future resolves to their records."""
+        future = Future()
+        with self._submit_lock:
+            if self._closed:
+                future.set_exception(RuntimeError("Ledger writer is closed"))
+            else:
+                self._queue.put((list(entries), future))
+        return future
+
+    def close(self, timeout=5):
+        """Commits whatever is queued, then stops the writer thread."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _collect(self, first):
+        group = [first]
+        rows = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        stop = False
+        while rows < self.max_rows:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            group.append(item)
+            rows += len(item[0])
+        return group, stop
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            group, stop = self._collect(first)
+            self._commit(group)
+            if stop:
+                return
+
+    def _commit(self, group):
+        entries = [entry for item_entries, _ in group for entry in item_entries]
+        try:
+            records = self.commit_fn(entries) if entries else []
+        except Exception as e:
+            if len(group) == 1:
+                group[0][1].set_exception(e)
+            else:
+                print(f"⚠️ Group commit of {len(entries)} rows failed ({e}) - retrying each caller's rows alone")
+                for item in group:
+                    self._commit([item])
+            return
+        self.groups_committed += 1
+        self.rows_committed += len(entries)
+        offset = 0
+        for item_entries, future in group:
+            future.set_result(records[offset:offset + len(item_entries)])
+            offset += len(item_entries)
@@ -0,0 +1,124 @@
+"""
+Concurrency Primitives
+Locks guarding the shared in-memory indexes on the evaluate path.
+
+ReadWriteLock lets any number of evaluations read the history, graph and
+windows at once while appends get exclusive access (waiting writers block new
+readers, so appends are never starved). KeyedLocks serializes work per key,
+e.g. per sender account, on the event loop: requests for one account run in
+arrival order while requests for other accounts proceed in parallel.
+FileLeaderLock elects one process among several workers for singleton duties.
+"""
+
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-worker deployments only
+    fcntl = None
+
+
+class ReadWriteLock:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class KeyedLocks:
+    def __init__(self):
+        # key -> [asyncio.Lock, holders + waiters]; entries are dropped once unused
+        self._locks = {}
+
+    def __len__(self):
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, *keys):
+        """
+        Holds the locks for every key. Keys are taken in sorted order, so
+        callers locking overlapping key sets cannot deadlock.
+        """
+        keys = sorted(set(keys), key=str)
+        acquired = []
+        try:
+            for key in keys:
+                entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+                entry[1] += 1
+                try:
+                    await entry[0].acquire()
+                except BaseException:
+                    self._release_ref(key)
+                    raise
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._locks[key][0].release()
+                self._release_ref(key)
+
+    def _release_ref(self, key):
+        entry = self._locks[key]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._locks[key]
+
+
+class FileLeaderLock:
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self):
+        """
+        Takes the lock without waiting; True if this process now holds it. The
+        OS releases it if the holder dies, so a restarted worker can take over.
+        """
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,78 @@
+"""
+Merkle Batching for Ledger Anchoring
+Builds a Merkle tree over a run of compliance_log hashes so a single on-chain
+root commits to every row in the batch.
+
+Leaves and interior nodes are domain-separated (0x00 / 0x01 prefixes) so an
+interior node can never be passed off as a leaf. An odd node at the end of a
+level is promoted unchanged rather than paired with a copy of itself.
+"""
+
+import hashlib
+
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def hash_leaf(ledger_hash):
+    """Leaf digest for a compliance_log current_hash (hex string)."""
+    return hashlib.sha256(LEAF_PREFIX + bytes.fromhex(ledger_hash)).digest()
+
+
+def hash_node(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def build_levels(ledger_hashes):
+    """
+    Returns every level of the tree, leaves first and the root level last.
+
+    Args:
+        ledger_hashes (list): current_hash values in ledger order.
+    """
+    if not ledger_hashes:
+        raise ValueError("Cannot build a Merkle tree with no leaves")
+    level = [hash_leaf(h) for h in ledger_hashes]
+    levels = [level]
+    while len(level) > 1:
+        nxt = [hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        levels.append(nxt)
+        level = nxt
+    return levels
+
+
+def merkle_root(ledger_hashes):
+    return build_levels(ledger_hashes)[-1][0].hex()
+
+
+def inclusion_proof(ledger_hashes, index):
+    """
+    Sibling path from leaf `index` up to the root.
+
+    Returns:
+        list: [{"position": "left" | "right", "hash": hex}, ...] from the leaf upward.
+    """
+    levels = build_levels(ledger_hashes)
+    if not 0 <= index < len(ledger_hashes):
+        raise IndexError(f"Leaf index {index} outside batch of {len(ledger_hashes)}")
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({
+                "position": "left" if sibling < index else "right",
+                "hash": level[sibling].hex()
+            })
+        index //= 2
+    return proof
+
+
+def verify_proof(ledger_hash, proof, root):
+    """True if `proof` links the ledger hash to the Merkle root."""
+    node = hash_leaf(ledger_hash)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        node = hash_node(sibling, node) if step["position"] == "left" else hash_node(node, sibling)
+    return node.hex() == root
@@ -1,31 +1,91 @@
 
 import hashlib
+import multiprocessing
 import sqlite3
 import json
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from datetime import datetime
-from web3 import Web3
 from dotenv import load_dotenv
 
+from backend.core.anchor_queue import AnchorWorker, QUEUE_INDEX, QUEUE_SCHEMA
+from backend.core.ledger_writer import GroupCommitWriter
+from backend.core.locks import FileLeaderLock
+from backend.core.ledger_query import QUERY_INDEXES
+from backend.core.merkle import inclusion_proof, merkle_root, verify_proof
+from backend.core.verification import (
+    CHECKPOINT_SCHEMA, GENESIS_HASH, ROWS_SQL, chain_hash, checkpoint_valid,
+    connect_readonly, load_checkpoint_key, sign_checkpoint, verify_segment, walk_chain
+)
+
 load_dotenv()
 
 # Get the absolute path to the project root
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 DB_PATH = os.path.join(PROJECT_ROOT, "backend", "data", "provenance.db")
 
+# WAL + NORMAL: commits append to the WAL without an fsync each; the database
+# stays consistent on crash and only an OS/power failure can drop the newest commits.
+LEDGER_SYNCHRONOUS = os.getenv("LEDGER_SYNCHRONOUS", "NORMAL").upper()
+
+# Group commit: a writer thread commits up to N queued rows per transaction,
+# holding a group open for at most M milliseconds. With M=0 a group is whatever
+# queued up while the previous commit ran, which adds no latency when idle.
+LEDGER_GROUP_COMMIT_ROWS = int(os.getenv("LEDGER_GROUP_COMMIT_ROWS", "512"))
+LEDGER_GROUP_COMMIT_MS = float(os.getenv("LEDGER_GROUP_COMMIT_MS", "0"))
+
+# Anchoring: "queue" enqueues one storeAudit per row for the background anchor
+# worker; "merkle" enqueues one Merkle root per interval instead; "per_tx" sends
+# and waits for each anchor on the request path (legacy).
+ANCHOR_MODE = os.getenv("ANCHOR_MODE", "queue").lower()
+ANCHOR_INTERVAL_SECONDS = float(os.getenv("ANCHOR_INTERVAL_SECONDS", "5"))
+ANCHOR_MAX_LEAVES = int(os.getenv("ANCHOR_MAX_LEAVES", "4096"))
+ANCHOR_MAX_IN_FLIGHT = int(os.getenv("ANCHOR_MAX_IN_FLIGHT", "64"))
+ANCHOR_PENDING = "PENDING_ANCHOR"
+
+# Verification: routine checks resume from a signed checkpoint that trails the
+# tip by this many rows, so the newest rows are always re-walked; full audits
+# verify segments of this many ids in parallel processes.
+LEDGER_CHECKPOINT_LAG = int(os.getenv("LEDGER_CHECKPOINT_LAG", "1000"))
+LEDGER_VERIFY_SEGMENT_ROWS = int(os.getenv("LEDGER_VERIFY_SEGMENT_ROWS", "50000"))
+
+INSERT_LOG_SQL = "INSERT INTO compliance_log (tx_id, tx_data, score, decision, prev_hash, current_hash, eth_tx_hash, evaluation) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+# Queues the newest N ledger rows; runs in the transaction that inserted them
+ENQUEUE_ROWS_SQL = "INSERT INTO anchor_queue (first_id, last_id, audit_hash, risk_score) SELECT id, id, current_hash, score FROM compliance_log ORDER BY id DESC LIMIT ?"
+
 class ProvenanceManager:
-    def __init__(self, db_path=DB_PATH):
+    def __init__(self, db_path=DB_PATH, anchor_mode=ANCHOR_MODE):
         self.db_path = db_path
+        self.anchor_mode = anchor_mode
+        self.checkpoint_lag = LEDGER_CHECKPOINT_LAG
+        self.verify_segment_rows = LEDGER_VERIFY_SEGMENT_ROWS
         # Ensure the directory exists
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        
+        # One long-lived writer connection; the lock serializes chain appends
+        # so prev_hash -> current_hash can never fork under concurrent requests.
+        self._lock = threading.Lock()
+        self._conn = self._connect()
         self.init_db()
+        self._head_hash = self._read_latest_hash()
+        # Last PRAGMA data_version seen by the writer; a change means another
+        # process (or connection) wrote to the ledger
+        self._data_version = None
+        self._writer = GroupCommitWriter(
+            self._append_entries,
+            max_rows=LEDGER_GROUP_COMMIT_ROWS,
+            max_wait_ms=LEDGER_GROUP_COMMIT_MS
+        )
         
-        # Web3 Configuration
+        # Web3 Configuration (the client is created on first use, see `w3`)
         self.rpc_url = os.getenv("ETH_RPC_URL", "http://127.0.0.1:7545")
-        self.w3 = Web3(Web3.HTTPProvider(self.rpc_url))
+        self._w3 = None
         self.contract_address = os.getenv("ETH_CONTRACT_ADDRESS")
         self.private_key = os.getenv("ETH_PRIVATE_KEY")
         self.sender_address = os.getenv("ETH_SENDER_ADDRESS")
+        self._contract = None
         
         # ABI for AuditLog contract
         # function storeAudit(string memory auditHash, uint8 riskScore) public
@@ -50,90 +110,159 @@ class ProvenanceManager:
             }
         ]''')
         
-        # Log connection status
-        if self.w3.is_connected():
-            print(f"✅ Web3 Connected to Ganache at {self.rpc_url}")
-        else:
-            print(f"⚠️  Web3 NOT Connected - Using Mock Hashes")
+        # Background anchoring: the worker drains anchor_queue; in merkle mode a
+        # second thread batches rows into roots and enqueues those instead
+        self._anchor_stop = threading.Event()
+        self._anchor_thread = None
+        self.anchor_worker = None
+        # With several worker processes on one ledger, only the first to start
+        # seals Merkle batches and sends anchors; the others just log rows
+        self._anchor_leader = FileLeaderLock(self.db_path + ".anchor.lock")
+        if self.anchor_mode in ("queue", "merkle") and self._anchor_leader.acquire():
+            self.anchor_worker = AnchorWorker(self, max_in_flight=ANCHOR_MAX_IN_FLIGHT)
+            self.anchor_worker.start()
+            if self.anchor_mode == "merkle":
+                self._anchor_thread = threading.Thread(target=self._anchor_loop, name="merkle-anchor", daemon=True)
+                self._anchor_thread.start()
+
+    @property
+    def w3(self):
+        """Web3 client, imported and probed lazily so startup never waits on the RPC."""
+        if self._w3 is None:
+            from web3 import Web3
+            self._w3 = Web3(Web3.HTTPProvider(self.rpc_url))
+            
+            # Log connection status
+            if self._w3.is_connected():
+                print(f"✅ Web3 Connected to Ganache at {self.rpc_url}")
+            else:
+                print(f"⚠️  Web3 NOT Connected - Using Mock Hashes")
+        return self._w3
         
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={LEDGER_SYNCHRONOUS}")
+        return conn
+
+    def close(self):
+        self._writer.close()
+        if self._anchor_thread is not None:
+            self._anchor_stop.set()
+            self._anchor_thread.join()
+            self.anchor_pending_batch()  # Flush rows logged since the last interval
+        if self.anchor_worker is not None:
+            # Unsent anchors stay queued in SQLite and resume on the next start
+            self.anchor_worker.close()
+        self._anchor_leader.release()
+        with self._lock:
+            self._conn.close()
+
     def init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS compliance_log
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      tx_id TEXT,
-                      tx_data TEXT,
-                      score INTEGER,
-                      decision TEXT,
-                      prev_hash TEXT,
-                      current_hash TEXT,
-                      eth_tx_hash TEXT,
-                      timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-        conn.commit()
-        conn.close()
+        with self._lock:
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS compliance_log
+                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          tx_id TEXT,
+                          tx_data TEXT,
+                          score INTEGER,
+                          decision TEXT,
+                          prev_hash TEXT,
+                          current_hash TEXT,
+                          eth_tx_hash TEXT,
+                          timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                          evaluation TEXT)''')
+            # Evaluation results (outside the hash chain) let streams replay rows without re-running rules
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(compliance_log)")]
+            if "evaluation" not in columns:
+                self._conn.execute("ALTER TABLE compliance_log ADD COLUMN evaluation TEXT")
+            for index_sql in QUERY_INDEXES:
+                self._conn.execute(index_sql)
+            # One row per anchored Merkle root, covering ledger ids first_id..last_id
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS merkle_batches
+                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          merkle_root TEXT,
+                          first_id INTEGER,
+                          last_id INTEGER UNIQUE,
+                          leaf_count INTEGER,
+                          eth_tx_hash TEXT,
+                          created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+            self._conn.execute(QUEUE_SCHEMA)
+            self._conn.execute(QUEUE_INDEX)
+            self._conn.execute(CHECKPOINT_SCHEMA)
+            self._conn.commit()
+
+    def _read_latest_hash(self):
+        with self._lock:
+            return self._query_latest_hash()
+
+    def _query_latest_hash(self):
+        result = self._conn.execute("SELECT current_hash FROM compliance_log ORDER BY id DESC LIMIT 1").fetchone()
+        return result[0] if result else GENESIS_HASH
 
     def get_latest_hash(self):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT current_hash FROM compliance_log ORDER BY id DESC LIMIT 1")
-        result = c.fetchone()
-        conn.close()
-        return result[0] if result else "GENESIS_HASH"
+        """Chain head, served from memory (kept current by log_transactions)."""
+        return self._head_hash
 
     def calculate_hash(self, tx_data, score, prev_hash):
-        # Deterministic string representation
-        payload = f"{json.dumps(tx_data, sort_keys=True)}{score}{prev_hash}"
-        return hashlib.sha256(payload.encode()).hexdigest()
+        return chain_hash(tx_data, score, prev_hash)
+
+    def mock_eth_hash(self, audit_hash, risk_score, salt=""):
+        """Clean stand-in for a transaction hash when the chain is unavailable (demo mode)."""
+        return f"0x{hashlib.sha256(f'{audit_hash}{risk_score}{salt}'.encode()).hexdigest()[:40]}"
+
+    def chain_ready(self):
+        """True if anchors can go on-chain: RPC reachable and contract/key configured."""
+        return bool(self.contract_address and self.private_key) and self.w3.is_connected()
+
+    @property
+    def account_address(self):
+        # Sender address (derived from the private key if not set)
+        if not self.sender_address:
+            self.sender_address = self.w3.eth.account.from_key(self.private_key).address
+        return self.sender_address
+
+    @property
+    def contract(self):
+        if self._contract is None:
+            self._contract = self.w3.eth.contract(
+                address=self.w3.to_checksum_address(self.contract_address),
+                abi=self.contract_abi
+            )
+        return self._contract
+
+    def send_audit(self, audit_hash, risk_score, nonce, gas_price):
+        """Signs and submits storeAudit(auditHash, riskScore) without waiting; returns the tx hash."""
+        txn_data = self.contract.functions.storeAudit(
+            audit_hash,
+            min(risk_score, 255)  # uint8 max value
+        ).build_transaction({
+            'from': self.account_address,
+            'nonce': nonce,
+            'gas': 300000,
+            'gasPrice': gas_price
+        })
+        signed_txn = self.w3.eth.account.sign_transaction(txn_data, self.private_key)
+        tx_hash_bytes = self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+        return self.w3.to_hex(tx_hash_bytes)
 
     def anchor_to_blockchain(self, current_hash: str, risk_score: int) -> str:
-        """Anchor audit hash to Ganache blockchain"""
+        """Anchor audit hash to Ganache blockchain and wait for the receipt (per_tx mode)"""
         # Fallback if not connected - return clean mock hash for demo
         if not self.w3.is_connected():
-            return f"0x{hashlib.sha256(f'{current_hash}{risk_score}'.encode()).hexdigest()[:40]}"
+            return self.mock_eth_hash(current_hash, risk_score)
         
         # Validate configuration
         if not self.contract_address or not self.private_key:
             print("⚠️  Missing ETH_CONTRACT_ADDRESS or ETH_PRIVATE_KEY - Using mock hash")
-            return f"0x{hashlib.sha256(f'{current_hash}{risk_score}'.encode()).hexdigest()[:40]}"
+            return self.mock_eth_hash(current_hash, risk_score)
         
         try:
-            # 1. Get sender address (derive from private key if not set)
-            if self.sender_address:
-                account_addr = self.sender_address
-            else:
-                account = self.w3.eth.account.from_key(self.private_key)
-                account_addr = account.address
-            
-            # 2. Get nonce
-            nonce = self.w3.eth.get_transaction_count(account_addr)
-            
-            # 3. Build contract transaction
-            contract = self.w3.eth.contract(
-                address=Web3.to_checksum_address(self.contract_address),
-                abi=self.contract_abi
-            )
-            
-            # Call storeAudit(string auditHash, uint8 riskScore)
-            txn_data = contract.functions.storeAudit(
-                current_hash,
-                min(risk_score, 255)  # uint8 max value
-            ).build_transaction({
-                'from': account_addr,
-                'nonce': nonce,
-                'gas': 300000,
-                'gasPrice': self.w3.eth.gas_price or self.w3.to_wei('20', 'gwei')
-            })
-            
-            # 4. Sign transaction
-            signed_txn = self.w3.eth.account.sign_transaction(txn_data, self.private_key)
-            
-            # 5. Send transaction
-            tx_hash_bytes = self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+            nonce = self.w3.eth.get_transaction_count(self.account_address)
+            gas_price = self.w3.eth.gas_price or self.w3.to_wei('20', 'gwei')
+            tx_hash_hex = self.send_audit(current_hash, risk_score, nonce, gas_price)
             
-            # 6. Wait for receipt (with timeout)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash_bytes, timeout=10)
-            
-            tx_hash_hex = self.w3.to_hex(tx_hash_bytes)
+            # Wait for receipt (with timeout)
+            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash_hex, timeout=10)
             print(f"✅ Blockchain TX: {tx_hash_hex} (Block: {receipt['blockNumber']})")
             
             return tx_hash_hex
@@ -141,50 +270,273 @@ class ProvenanceManager:
         except Exception as e:
             print(f"❌ Blockchain Error: {e} - Using mock hash")
             # Return a clean mock hash instead of displaying the error
-            return f"0x{hashlib.sha256(f'{current_hash}{risk_score}{str(e)}'.encode()).hexdigest()[:40]}"
+            return self.mock_eth_hash(current_hash, risk_score, str(e))
     
-    def log_transaction(self, tx_data, score, decision):
-        prev_hash = self.get_latest_hash()
-        current_hash = self.calculate_hash(tx_data, score, prev_hash)
-        
-        # Anchor to blockchain
-        eth_tx_hash = self.anchor_to_blockchain(current_hash, score)
+    def log_transaction(self, tx_data, score, decision, evaluation=None):
+        return self.log_transactions([(tx_data, score, decision, evaluation)])[0]
+
+    def log_transactions(self, entries):
+        """
+        Chains and stores several evaluations in order, contiguously.
+
+        The rows join the writer's next group commit together with rows from
+        concurrent callers; this returns once that transaction is durable.
+
+        Args:
+            entries (list): (tx_data, score, decision) tuples in ledger order,
+                optionally with a fourth evaluation dict stored alongside the row.
+
+        Returns:
+            list: One provenance record per entry, including its ledger_id.
+        """
+        return self._writer.submit(entries).result()
+
+    def _append_entries(self, entries):
+        """Writer-thread side of log_transactions: chain, insert and commit one group."""
+        with self._lock:
+            # Worker processes sharing the ledger serialize on SQLite's write lock;
+            # if another connection committed since our last append, reload the head
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version != self._data_version:
+                    self._head_hash = self._query_latest_hash()
+                    self._data_version = data_version
+                
+                prev_hash = self._head_hash
+                rows = []
+                records = []
+                for entry in entries:
+                    tx_data, score, decision = entry[:3]
+                    evaluation = entry[3] if len(entry) > 3 else None
+                    current_hash = self.calculate_hash(tx_data, score, prev_hash)
+                    
+                    # Anchor to blockchain (other modes backfill eth_tx_hash from the anchor worker)
+                    if self.anchor_mode == "per_tx":
+                        eth_tx_hash = self.anchor_to_blockchain(current_hash, score)
+                    else:
+                        eth_tx_hash = None
+                    
+                    rows.append((
+                        tx_data.get("Transaction_ID"), json.dumps(tx_data), score, decision, prev_hash, current_hash,
+                        eth_tx_hash, json.dumps(evaluation) if evaluation is not None else None
+                    ))
+                    records.append({
+                        "prev_hash": prev_hash,
+                        "current_hash": current_hash,
+                        "eth_tx_hash": eth_tx_hash or ANCHOR_PENDING
+                    })
+                    prev_hash = current_hash
+                
+                self._conn.executemany(INSERT_LOG_SQL, rows)
+                # The group is inserted contiguously by this connection alone
+                last_id = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                if self.anchor_mode == "queue":
+                    self._conn.execute(ENQUEUE_ROWS_SQL, (len(rows),))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            # Only advance the cached head once the rows are durable
+            self._head_hash = prev_hash
         
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("INSERT INTO compliance_log (tx_id, tx_data, score, decision, prev_hash, current_hash, eth_tx_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                  (tx_data.get("Transaction_ID"), json.dumps(tx_data), score, decision, prev_hash, current_hash, eth_tx_hash))
-        conn.commit()
-        conn.close()
+        for ledger_id, record in enumerate(records, last_id - len(records) + 1):
+            record["ledger_id"] = ledger_id
+        return records
+
+    def _anchor_loop(self):
+        while not self._anchor_stop.wait(ANCHOR_INTERVAL_SECONDS):
+            try:
+                while self.anchor_pending_batch() is not None:
+                    pass
+            except Exception as e:
+                print(f"❌ Merkle anchoring failed: {e} - retrying next interval")
+
+    def anchor_pending_batch(self):
+        """
+        Seals the next run of not-yet-batched ledger rows under one Merkle root
+        and queues the root for anchoring.
+
+        Returns:
+            dict | None: The new batch, or None if every row is already batched.
+        """
+        with self._lock:
+            # Read and seal in one write transaction, so callers in other
+            # processes can never batch the same rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                last = self._conn.execute("SELECT COALESCE(MAX(last_id), 0) FROM merkle_batches").fetchone()[0]
+                rows = self._conn.execute(
+                    "SELECT id, current_hash, score FROM compliance_log WHERE id > ? ORDER BY id LIMIT ?",
+                    (last, ANCHOR_MAX_LEAVES)
+                ).fetchall()
+                if not rows:
+                    self._conn.rollback()
+                    return None
+                
+                root = merkle_root([row[1] for row in rows])
+                batch = {
+                    "merkle_root": root,
+                    "first_id": rows[0][0],
+                    "last_id": rows[-1][0],
+                    "leaf_count": len(rows)
+                }
+                cursor = self._conn.execute(
+                    "INSERT INTO merkle_batches (merkle_root, first_id, last_id, leaf_count) VALUES (?, ?, ?, ?)",
+                    (root, batch["first_id"], batch["last_id"], batch["leaf_count"])
+                )
+                batch["batch_id"] = cursor.lastrowid
+                # The root goes through the same storeAudit call, tagged with the batch's peak score
+                self._conn.execute(
+                    "INSERT INTO anchor_queue (first_id, last_id, batch_id, audit_hash, risk_score) VALUES (?, ?, ?, ?, ?)",
+                    (batch["first_id"], batch["last_id"], batch["batch_id"], root, max(row[2] for row in rows))
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        print(f"🌳 Merkle batch sealed: {batch['leaf_count']} rows, root {root[:16]}...")
+        return batch
+
+    def get_inclusion_proof(self, tx_id):
+        """
+        Merkle inclusion proof for the latest ledger row of `tx_id`.
+
+        Returns:
+            dict | None: None if the transaction is not in the ledger; status
+            "PENDING" until its batch is anchored, else the proof and batch root.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, current_hash FROM compliance_log WHERE tx_id = ? ORDER BY id DESC LIMIT 1", (tx_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            ledger_id, ledger_hash = row
+            batch = self._conn.execute(
+                "SELECT id, merkle_root, first_id, last_id, eth_tx_hash FROM merkle_batches WHERE last_id >= ? ORDER BY last_id LIMIT 1",
+                (ledger_id,)
+            ).fetchone()
+            if batch is None or batch[2] > ledger_id:
+                return {"tx_id": tx_id, "ledger_id": ledger_id, "leaf": ledger_hash, "status": "PENDING"}
+            batch_id, root, first_id, last_id, eth_tx_hash = batch
+            batch_rows = self._conn.execute(
+                "SELECT id, current_hash FROM compliance_log WHERE id BETWEEN ? AND ? ORDER BY id", (first_id, last_id)
+            ).fetchall()
         
+        leaf_index = [r[0] for r in batch_rows].index(ledger_id)
+        proof = inclusion_proof([r[1] for r in batch_rows], leaf_index)
         return {
-            "prev_hash": prev_hash,
-            "current_hash": current_hash,
-            "eth_tx_hash": eth_tx_hash
+            "tx_id": tx_id,
+            "ledger_id": ledger_id,
+            "leaf": ledger_hash,
+            "status": "ANCHORED",
+            "leaf_index": leaf_index,
+            "proof": proof,
+            "merkle_root": root,
+            "batch_id": batch_id,
+            "eth_tx_hash": eth_tx_hash,
+            # False if any row in the batch was rewritten after anchoring
+            "verified": verify_proof(ledger_hash, proof, root)
         }
 
-    def verify_ledger(self):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT tx_data, score, prev_hash, current_hash FROM compliance_log ORDER BY id ASC")
-        rows = c.fetchall()
-        conn.close()
-        
-        recalculated_prev = "GENESIS_HASH"
-        for row in rows:
-            tx_data_str, score, stored_prev, stored_curr = row
-            tx_data = json.loads(tx_data_str)
-            
-            if stored_prev != recalculated_prev:
-                return "TAMPERED"
-            
-            recalc_curr = self.calculate_hash(tx_data, score, recalculated_prev)
-            
-            if recalc_curr != stored_curr:
-                return "TAMPERED"
-            
-            recalculated_prev = recalc_curr
+    def verify_ledger(self, mode="incremental"):
+        """Returns "VERIFIED" or "TAMPERED"; see verify_ledger_report."""
+        return self.verify_ledger_report(mode)["status"]
+
+    def verify_ledger_report(self, mode="incremental"):
+        """
+        Re-derives the hash chain.
+
+        Args:
+            mode (str): "incremental" walks rows after the newest valid checkpoint
+                (at least the trailing `checkpoint_lag` rows); "full" walks the
+                whole ledger from genesis in parallel segments.
+
+        Returns:
+            dict: status, mode, rows_checked, first_tampered_id and resumed_from
+            (the checkpointed ledger id the walk started after).
+        """
+        if mode == "full":
+            return self._verify_full()
+        return self._verify_incremental()
+
+    def _latest_checkpoint(self, conn):
+        """Newest checkpoint whose signature checks out; forged or stale ones are skipped."""
+        key = load_checkpoint_key(self.db_path)
+        for ledger_id, head_hash, signature in conn.execute(
+            "SELECT ledger_id, head_hash, signature FROM verification_checkpoints ORDER BY id DESC"
+        ):
+            if checkpoint_valid(key, ledger_id, head_hash, signature):
+                return ledger_id, head_hash
+            print(f"⚠️  Ignoring checkpoint at ledger id {ledger_id}: bad signature")
+        return None
+
+    def _verify_incremental(self):
+        conn = connect_readonly(self.db_path)
+        try:
+            tip = conn.execute("SELECT COALESCE(MAX(id), 0) FROM compliance_log").fetchone()[0]
+            checkpoint = self._latest_checkpoint(conn)
+            start_id, prev_hash = checkpoint or (0, GENESIS_HASH)
+            report = {"mode": "incremental", "resumed_from": start_id, "rows_checked": 0, "first_tampered_id": None}
+            if checkpoint:
+                row = conn.execute("SELECT current_hash FROM compliance_log WHERE id = ?", (start_id,)).fetchone()
+                if row is None or row[0] != prev_hash:
+                    return {**report, "status": "TAMPERED", "first_tampered_id": start_id}
             
-        return "VERIFIED"
+            # Walk up to the next checkpoint position, then the trailing rows
+            split_id = max(start_id, tip - self.checkpoint_lag)
+            bad, prev_hash, last_id, checked = walk_chain(conn.execute(ROWS_SQL, (start_id, split_id)), prev_hash)
+            new_checkpoint = (last_id, prev_hash) if last_id is not None else None
+            if bad is None:
+                bad, prev_hash, _, tail_checked = walk_chain(conn.execute(ROWS_SQL, (split_id, tip)), prev_hash)
+                checked += tail_checked
+        finally:
+            conn.close()
+        
+        report["rows_checked"] = checked
+        if bad is not None:
+            return {**report, "status": "TAMPERED", "first_tampered_id": bad}
+        if new_checkpoint:
+            self._store_checkpoint(*new_checkpoint)
+        return {**report, "status": "VERIFIED"}
+
+    def _store_checkpoint(self, ledger_id, head_hash):
+        signature = sign_checkpoint(load_checkpoint_key(self.db_path), ledger_id, head_hash)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO verification_checkpoints (ledger_id, head_hash, signature) VALUES (?, ?, ?)",
+                (ledger_id, head_hash, signature)
+            )
+            self._conn.commit()
 
-provenance_manager = ProvenanceManager()
+    def _verify_full(self):
+        conn = connect_readonly(self.db_path)
+        try:
+            tip = conn.execute("SELECT COALESCE(MAX(id), 0) FROM compliance_log").fetchone()[0]
+        finally:
+            conn.close()
+        
+        bounds = list(range(0, tip, self.verify_segment_rows)) + [tip]
+        lows, highs = bounds[:-1], bounds[1:]
+        workers = min(len(lows), os.cpu_count() or 1)
+        if workers <= 1:
+            segments = [verify_segment(self.db_path, lo, hi) for lo, hi in zip(lows, highs)]
+        else:
+            # Spawned (not forked) workers: this process runs writer/anchor threads
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                segments = list(pool.map(verify_segment, repeat(self.db_path), lows, highs))
+        
+        report = {"mode": "full", "resumed_from": 0, "rows_checked": 0, "first_tampered_id": None, "status": "VERIFIED"}
+        prev_hash = GENESIS_HASH
+        for segment in segments:
+            if segment["first_id"] is None:
+                continue
+            report["rows_checked"] += segment["rows"]
+            # Segments must join up: each starts from the hash the previous one ended on
+            if segment["first_prev"] != prev_hash:
+                return {**report, "status": "TAMPERED", "first_tampered_id": segment["first_id"]}
+            if segment["first_tampered_id"] is not None:
+                return {**report, "status": "TAMPERED", "first_tampered_id": segment["first_tampered_id"]}
+            prev_hash = segment["last_hash"]
+        return report
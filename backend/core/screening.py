@@ -0,0 +1,223 @@
+"""
+Watchlist Screening
+Fuzzy PEP/watchlist name matching through a character trigram inverted index.
+
+Names are normalized (accents and punctuation stripped, case folded, tokens
+sorted so "Doe, John" equals "John Doe") and indexed by their trigrams. A query
+within PEP_MATCH_THRESHOLD similarity (1 - edit distance / longer length) of a
+watchlist entry must share most of its trigrams with it, so only the postings
+of the query's rarest trigrams are probed for candidates; the rest are counted
+with vectorized lookups and the few survivors are verified by edit distance.
+Screening cost depends on how rare a name's trigrams are, not on watchlist size.
+
+Results are cached per account, so screening a known account again is a
+dictionary lookup.
+"""
+
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+PEP_MATCH_THRESHOLD = float(os.getenv("PEP_MATCH_THRESHOLD", "0.85"))
+GRAM_SIZE = 3
+PROBE_POSTINGS = 20000  # Postings counted in one pass before switching to lookups
+
+_SEPARATORS = re.compile(r"[\W_]+")
+_CODE_BITS = 21  # Enough for any Unicode code point
+
+
+def normalize_name(name):
+    """Canonical form used for matching: 'José  DOE-Smith' -> 'doe jose smith'."""
+    if not isinstance(name, str):
+        return ""
+    if name.isascii():
+        folded = name.lower()
+    else:
+        decomposed = unicodedata.normalize("NFKD", name)
+        folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return " ".join(sorted(set(_SEPARATORS.sub(" ", folded).split())))
+
+
+def name_grams(key):
+    padded = f" {key} "
+    return {padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1)}
+
+
+def _gram_code(gram):
+    code = 0
+    for ch in gram:
+        code = (code << _CODE_BITS) | ord(ch)
+    return code
+
+
+def _gram_codes(keys, length):
+    """Distinct trigram codes of equal-length keys, one padded row per key (repeats masked as -1)."""
+    chars = np.array([f" {key} " for key in keys], dtype=f"U{length + 2}").view(np.uint32)
+    chars = chars.reshape(len(keys), length + 2).astype(np.int64)
+    codes = np.zeros((len(keys), length), dtype=np.int64)
+    for offset in range(GRAM_SIZE):
+        codes = (codes << _CODE_BITS) | chars[:, offset:offset + length]
+    codes.sort(axis=1)
+    codes[:, 1:][codes[:, 1:] == codes[:, :-1]] = -1
+    return codes
+
+
+def _edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 once it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    # Only cells within `limit` of the diagonal can stay under the limit
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        first, last = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(first, last + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]), over)
+        if min(current[first - 1:last + 1]) > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+class PEPScreener:
+    def __init__(self, names=(), threshold=PEP_MATCH_THRESHOLD):
+        """
+        Args:
+            names (iterable): Watchlist names (Series or list).
+            threshold (float): Minimum similarity, 1.0 for exact (normalized) matches only.
+        """
+        self.threshold = threshold
+        spellings = {}
+        for name in names:
+            key = normalize_name(name)
+            if key and key not in spellings:
+                spellings[key] = name
+        # Entries are numbered shortest name first, so a length band is an entry range
+        self.keys = sorted(spellings, key=len)
+        self.names = [spellings[key] for key in self.keys]  # Original watchlist spelling
+        self.exact = {key: entry for entry, key in enumerate(self.keys)}
+        self.lengths = np.fromiter((len(key) for key in self.keys), dtype=np.int64, count=len(self.keys))
+
+        gram_parts, entry_parts = [], []
+        groups = np.flatnonzero(np.diff(self.lengths, prepend=-1))
+        for first, last in zip(groups.tolist(), groups[1:].tolist() + [len(self.keys)]):
+            codes = _gram_codes(self.keys[first:last], int(self.lengths[first]))
+            keep = codes >= 0
+            gram_parts.append(codes[keep])
+            entry_parts.append(np.nonzero(keep)[0] + first)
+        grams = np.concatenate(gram_parts) if gram_parts else np.zeros(0, dtype=np.int64)
+        entries = np.concatenate(entry_parts) if entry_parts else np.zeros(0, dtype=np.int64)
+
+        # CSR postings: entries holding gram codes[g] are entries[indptr[g]:indptr[g + 1]], ascending
+        order = np.argsort(grams, kind="stable")
+        grams = grams[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(grams)) + 1] if len(grams) else np.zeros(0, dtype=np.int64)
+        self.codes = grams[starts]
+        self.indptr = np.r_[starts, len(grams)].astype(np.int64)
+        self.entries = entries[order].astype(np.int32)
+        self._accounts = {}     # account -> (name, match)
+
+    @classmethod
+    def from_dataframe(cls, pep_df, threshold=PEP_MATCH_THRESHOLD):
+        if pep_df is None or pep_df.empty or "Name" not in pep_df.columns:
+            return cls(threshold=threshold)
+        return cls(pep_df["Name"].tolist(), threshold=threshold)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, name):
+        return self.match(name) is not None
+
+    def match(self, name):
+        """
+        Finds the closest watchlist entry to a name.
+
+        Returns:
+            dict | None: {"name": watchlist spelling, "score": similarity} of the best
+                match at or above the threshold, None if there is none.
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        entry = self.exact.get(key)
+        if entry is not None:
+            return {"name": self.names[entry], "score": 1.0}
+        if self.threshold >= 1.0 or not self.keys:
+            return None
+
+        # Longest a match may be, and so the most edits it may take
+        length = len(key)
+        max_edits = int((1 - self.threshold) * length / self.threshold + 1e-9)
+        if not max_edits:
+            return None
+        lo = int(np.searchsorted(self.lengths, length - max_edits, "left"))
+        hi = int(np.searchsorted(self.lengths, length + max_edits, "right"))
+
+        # Each edit breaks at most GRAM_SIZE of the query's trigrams, so a match
+        # misses at most `spare` of them and holds one of any spare + 1
+        query = name_grams(key)
+        codes = np.array([_gram_code(gram) for gram in query], dtype=np.int64)
+        at = np.searchsorted(self.codes, codes).clip(max=len(self.codes) - 1)
+        grams = at[self.codes[at] == codes]
+        sizes = self.indptr[grams + 1] - self.indptr[grams]
+        order = np.argsort(sizes, kind="stable")
+        grams, sizes = grams[order].tolist(), np.cumsum(sizes[order])
+        required = len(query) - GRAM_SIZE * max_edits
+        spare = len(grams) - max(required, 1)
+        if spare < 0:
+            return None
+        # Count the rarest grams in one pass (at least spare + 1 of them, more while cheap)
+        counted = max(spare + 1, int(np.searchsorted(sizes, PROBE_POSTINGS, "right")))
+        candidates, shared = np.unique(np.concatenate([self._postings(g) for g in grams[:counted]]), return_counts=True)
+        in_band = (candidates >= lo) & (candidates < hi) & (shared >= counted - spare)
+        candidates, shared = candidates[in_band], shared[in_band]
+        # Look the rest up only for candidates that can still reach `required`
+        for remaining, gram in zip(range(len(grams) - counted, 0, -1), grams[counted:]):
+            viable = shared + remaining >= required
+            candidates, shared = candidates[viable], shared[viable]
+            if not len(candidates):
+                break
+            posting = self._postings(gram)
+            found = np.searchsorted(posting, candidates).clip(max=len(posting) - 1)
+            shared += posting[found] == candidates
+        candidates = candidates[shared >= required]
+
+        best = None
+        for entry in candidates.tolist():
+            candidate = self.keys[entry]
+            longest = max(length, len(candidate))
+            limit = int((1 - self.threshold) * longest + 1e-9)
+            distance = _edit_distance(key, candidate, limit)
+            if distance <= limit:
+                score = 1 - distance / longest
+                if best is None or score > best["score"]:
+                    best = {"name": self.names[entry], "score": round(score, 4)}
+        return best
+
+    def screen(self, account_id, name):
+        """match() for an account's name, cached until the account's name changes."""
+        cached = self._accounts.get(account_id)
+        if cached is not None and cached[0] == name:
+            return cached[1]
+        result = self.match(name)
+        self._accounts[account_id] = (name, result)
+        return result
+
+    def _postings(self, gram):
+        return self.entries[self.indptr[gram]:self.indptr[gram + 1]]
+
+
+def is_watchlisted(pep_db, account_id, name):
+    """
+    True if an account's name is on the watchlist. A PEPScreener matches fuzzily;
+    a plain set of lowercase names (tests, worker shards) matches exactly.
+    """
+    if isinstance(pep_db, PEPScreener):
+        return pep_db.screen(account_id, name) is not None
+    return (name or "").lower() in pep_db
@@ -0,0 +1,544 @@
+"""
+Sharded Batch Evaluation
+Spreads AMLEngine.evaluate_batch over worker processes, one shard of senders each.
+
+Rows are partitioned by sender account: a shard holds every row of its senders
+together with their windows, so the structuring and velocity rules (which only
+combine a sender's own rows) are exact within it. The ring rule looks at other
+senders' edges, so it goes through an EdgeIndex instead: a CSR adjacency over
+the history kept in shared memory across batches (history edges added later
+are written into its spare slots in place) plus a small per-batch delta of
+the edges the batch's accepted rows add. Each batch edge records the row that
+added it, and a query for row i only sees edges added before i, which is
+exactly what the single-process overlay shows row i. The mule rule's windowed
+sender counts only combine a receiver's own rows, so they are taken first, in
+shards of receivers, while the parent prepares the delta.
+Results are therefore identical to evaluate_batch, whatever the number of
+workers.
+"""
+
+import heapq
+import multiprocessing
+import os
+import threading
+import weakref
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backend.core.graph_index import (
+    CYCLE_MAX_HOPS, CYCLE_VISIT_BUDGET, AccountClusters, TransactionGraph, find_cycle
+)
+from backend.core.sketches import ReceiverWindows
+from backend.core.store import TransactionStore
+from backend.core.windows import SenderWindows
+
+SHARDED_EVAL_WORKERS = int(os.getenv("SHARDED_EVAL_WORKERS", "1"))  # 0 = one per core
+SHARDED_EVAL_MIN_ROWS = int(os.getenv("SHARDED_EVAL_MIN_ROWS", "5000"))
+
+# More shards than workers evens out senders with very different row counts
+SHARDS_PER_WORKER = 4
+
+HISTORY_EDGE = -1  # "added at" position of edges already in the history
+
+# Room each node's adjacency keeps for edges added after the index is built
+INDEX_SLACK = 4            # Spare slots per node, at least (and per spare node)
+INDEX_SPARE_NODES = 1024   # Spare nodes, at least, for accounts the history gains
+# Edges that find no room are shipped with every batch until the index is
+# rebuilt, once there are more than this many of them
+INDEX_OVERFLOW_MIN = int(os.getenv("INDEX_OVERFLOW_MIN", "10000"))
+INDEX_OVERFLOW_FRACTION = 0.05  # ...or more than this fraction of the history
+
+
+def _slotted(node_count, slots, owners, neighbours):
+    """Adjacency of `slots` nodes with spare room after each node's neighbours: start, length, indices."""
+    owners = np.asarray(owners, dtype=np.int64)
+    length = np.zeros(slots, dtype=np.int64)
+    length[:node_count] = np.bincount(owners, minlength=node_count)
+    start = np.zeros(slots + 1, dtype=np.int64)
+    np.cumsum(length + np.maximum(length // 2, INDEX_SLACK), out=start[1:])
+    # Stable, so each node keeps its neighbours in insertion order
+    order = np.argsort(owners, kind="stable")
+    owners = owners[order]
+    rank = np.arange(len(owners)) - (np.cumsum(length) - length)[owners]
+    indices = np.zeros(int(start[-1]), dtype=np.int64)
+    indices[start[owners] + rank] = np.asarray(neighbours, dtype=np.int64)[order]
+    return [start, length, indices]
+
+
+def _by_owner(owners, neighbours, added_at):
+    order = np.argsort(np.asarray(owners, dtype=np.int64), kind="stable")
+    return [np.asarray(column, dtype=np.int64)[order] for column in (owners, neighbours, added_at)]
+
+
+class _SharedArrays:
+    """int64 arrays, named by ARRAYS, that can be placed in one shared memory block."""
+
+    ARRAYS = ()
+
+    def __init__(self, arrays, shm=None):
+        self._bind(arrays)
+        self._shm = shm
+
+    def _bind(self, arrays):
+        self._arrays = arrays
+        # Lookups go through memoryviews: plain ints, no NumPy scalar overhead,
+        # and slices are iterated lazily so a visit budget cuts hubs short
+        for name, array in zip(self.ARRAYS, arrays):
+            setattr(self, name, None if array is None else memoryview(array))
+
+    def share(self):
+        """
+        Copies the arrays into one shared memory block, which later writes go to.
+
+        Returns:
+            tuple: Spec for attach() in another process.
+        """
+        arrays = self._arrays
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, sum(array.nbytes for array in arrays)))
+        views, offset = [], 0
+        for array in arrays:
+            view = np.ndarray(array.shape, dtype=np.int64, buffer=self._shm.buf, offset=offset)
+            view[:] = array
+            views.append(view)
+            offset += array.nbytes
+        self._bind(views)
+        return (self._shm.name, tuple(len(array) for array in arrays))
+
+    @classmethod
+    def attach(cls, spec):
+        name, sizes = spec
+        shm = shared_memory.SharedMemory(name=name)
+        arrays, offset = [], 0
+        for size in sizes:
+            arrays.append(np.ndarray((size,), dtype=np.int64, buffer=shm.buf, offset=offset))
+            offset += size * 8
+        return cls(arrays, shm=shm)
+
+    def close(self, unlink=False):
+        if self._shm is None:
+            return
+        self._bind([None] * len(self.ARRAYS))  # Views must go before the block can close
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+        self._shm = None
+
+
+class EdgeIndex(_SharedArrays):
+    """
+    Adjacency of the history graph, kept in shared memory across batches.
+
+    Every node has spare slots after its neighbours, so history edges added
+    later are written in place and workers see them without a new copy. Edges
+    that find no room (their node is full, or no spare node is left) go to
+    an overflow list that each batch's EdgeDelta carries instead.
+    """
+
+    ARRAYS = ("succ_start", "succ_len", "succ_to", "pred_start", "pred_len", "pred_from")
+
+    def __init__(self, arrays, shm=None):
+        super().__init__(arrays, shm)
+        # Only kept by the builder
+        self.nodes = []     # Code -> account ID
+        self.codes = {}     # Account ID -> code
+        self.succ_overflow = []  # (sender code, receiver code), in insertion order
+        self.pred_overflow = []  # (receiver code, sender code), in insertion order
+
+    @classmethod
+    def build(cls, graph):
+        """Indexes graph's edges, each node's neighbours in insertion order."""
+        codes = {}
+
+        def code(node):
+            return codes.setdefault(node, len(codes))
+
+        succ, pred = ([], []), ([], [])
+        for sender_id, receivers_of in graph.successors.items():
+            sender_code = code(sender_id)
+            for receiver_id in receivers_of:
+                succ[0].append(sender_code)
+                succ[1].append(code(receiver_id))
+        # Predecessors keep their own insertion order, which can differ from the successors'
+        for receiver_id, senders_of in graph.predecessors.items():
+            for sender_id in senders_of:
+                pred[0].append(code(receiver_id))
+                pred[1].append(code(sender_id))
+
+        slots = len(codes) + max(len(codes) // 2, INDEX_SPARE_NODES)
+        index = cls(_slotted(len(codes), slots, *succ) + _slotted(len(codes), slots, *pred))
+        index.codes = codes
+        index.nodes = list(codes)
+        return index
+
+    def code(self, node):
+        code = self.codes.get(node)
+        if code is None:
+            code = self.codes[node] = len(self.nodes)
+            self.nodes.append(node)
+        return code
+
+    def add_edge(self, sender_id, receiver_id):
+        """Appends an edge the history gained, in place while its nodes have room."""
+        sender, receiver = self.code(sender_id), self.code(receiver_id)
+        self._append(self.succ_start, self.succ_len, self.succ_to, self.succ_overflow, sender, receiver)
+        self._append(self.pred_start, self.pred_len, self.pred_from, self.pred_overflow, receiver, sender)
+
+    @staticmethod
+    def _append(start, length, indices, overflow, owner, neighbour):
+        # A node's slots never free up, so once it overflows all its later
+        # edges follow and its neighbours stay in insertion order
+        if owner < len(length) and start[owner] + length[owner] < start[owner + 1]:
+            indices[start[owner] + length[owner]] = neighbour
+            length[owner] += 1
+        else:
+            overflow.append((owner, neighbour))
+
+    def full(self, edge_count):
+        """True once enough edges overflowed that rebuilding beats shipping them with every batch."""
+        overflow = max(len(self.succ_overflow), len(self.pred_overflow))
+        return overflow > max(INDEX_OVERFLOW_MIN, INDEX_OVERFLOW_FRACTION * edge_count)
+
+
+class EdgeDelta(_SharedArrays):
+    """
+    What a batch adds to its EdgeIndex, as per-row columns: each row's account
+    codes, whether it adds a new edge (accepted, and not in the history) and
+    its accounts' history clusters, plus the index's overflow. The builder
+    only looks codes up; each worker sorts the edges by node itself (edges()).
+    """
+
+    ARRAYS = ("sender", "receiver", "adds", "sender_root", "receiver_root",
+              "succ_overflow_owner", "succ_overflow_to", "pred_overflow_owner", "pred_overflow_from")
+
+    def __init__(self, arrays, shm=None):
+        super().__init__(arrays, shm)
+        self._edges = None
+        # Only kept by the builder
+        self.nodes = []      # The index's nodes when the batch started
+        self.new_nodes = []  # Batch accounts the index has no code for
+
+    @classmethod
+    def build(cls, index, graph, senders, receivers, accepted):
+        """Every batch account gets a code, accepted or not."""
+        new_codes, new_nodes, roots = {}, [], {}
+
+        def code(node):
+            known = index.codes.get(node)
+            if known is None:
+                known = new_codes.get(node)
+            if known is None:
+                known = new_codes[node] = len(index.nodes) + len(new_nodes)
+                new_nodes.append(node)
+            return known
+
+        def root(node):
+            known = roots.get(node)
+            if known is None:
+                known = roots[node] = code(graph.clusters.find(node))
+            return known
+
+        columns = ([], [], [], [], [])
+        for position, (sender_id, receiver_id) in enumerate(zip(senders, receivers)):
+            columns[0].append(code(sender_id))
+            columns[1].append(code(receiver_id))
+            columns[2].append(bool(accepted[position]) and receiver_id not in graph.successors.get(sender_id, ()))
+            columns[3].append(root(sender_id))
+            columns[4].append(root(receiver_id))
+        overflow = [np.asarray(edges, dtype=np.int64).reshape(-1, 2).T for edges in (index.succ_overflow,
+                                                                                     index.pred_overflow)]
+        delta = cls([np.asarray(column, dtype=np.int64) for column in columns] + [*overflow[0], *overflow[1]])
+        delta.nodes, delta.new_nodes = index.nodes[:], new_nodes
+        return delta
+
+    def node(self, code):
+        return self.nodes[code] if code < len(self.nodes) else self.new_nodes[code - len(self.nodes)]
+
+    def edges(self):
+        """The delta's edges by node, built on first use in each process."""
+        if self._edges is None:
+            self._edges = _DeltaEdges(self)
+        return self._edges
+
+    def at(self, index, position):
+        edges = self.edges()
+        return _EdgeView(index, edges, position, edges.linked(self.sender[position], self.receiver[position], position))
+
+    def close(self, unlink=False):
+        self._edges = None
+        super().close(unlink)
+
+
+class _DeltaEdges:
+    """An EdgeDelta's overflow and batch edges sorted by node, each tagged with the row that adds it."""
+
+    def __init__(self, delta):
+        sender, receiver = np.asarray(delta.sender), np.asarray(delta.receiver)
+        adds = np.flatnonzero(np.asarray(delta.adds))
+        # Only the first row adding an edge adds it
+        _, first = np.unique(np.stack([sender[adds], receiver[adds]], axis=1), axis=0, return_index=True)
+        rows = np.sort(adds[first])
+        succ = _by_owner(
+            np.concatenate([delta.succ_overflow_owner, sender[rows]]),
+            np.concatenate([delta.succ_overflow_to, receiver[rows]]),
+            np.concatenate([np.full(len(delta.succ_overflow_owner), HISTORY_EDGE), rows]),
+        )
+        pred = _by_owner(
+            np.concatenate([delta.pred_overflow_owner, receiver[rows]]),
+            np.concatenate([delta.pred_overflow_from, sender[rows]]),
+            np.concatenate([np.full(len(delta.pred_overflow_owner), HISTORY_EDGE), rows]),
+        )
+        self.succ_owner, self.succ_to, self.succ_at, self.pred_owner, self.pred_from, self.pred_at = (
+            memoryview(array) for array in succ + pred
+        )
+        # History clusters merged over the batch's new edges: accounts apart at
+        # the end of the batch were apart at every row
+        self.clusters = AccountClusters()
+        for a, b in zip(np.asarray(delta.sender_root)[rows].tolist(), np.asarray(delta.receiver_root)[rows].tolist()):
+            self.clusters.union(a, b)
+        self._roots = delta.sender_root, delta.receiver_root
+
+    def linked(self, sender, receiver, position):
+        """False if row `position`'s edge cannot close a ring at all."""
+        sender_root, receiver_root = self._roots
+        return sender == receiver or self.clusters.connected(sender_root[position], receiver_root[position])
+
+
+class _EdgeView:
+    """The history plus earlier rows' edges, as the overlay shows batch row `position`."""
+
+    def __init__(self, index, delta, position, linked):
+        self.index = index
+        self.delta = delta
+        self.position = position
+        self.linked = linked
+
+    def _neighbours(self, start, length, indices, owner, delta_indices, added_at, node):
+        history = indices[start[node]:start[node] + length[node]] if node < len(length) else ()
+        lo = bisect_left(owner, node)
+        hi = bisect_left(owner, node + 1, lo)
+        # Within a node, overflowed history edges come first, then batch edges in row order
+        hi = bisect_left(added_at, self.position, lo, hi)
+        return history if lo == hi else chain(history, delta_indices[lo:hi])
+
+    def successors(self, node):
+        index, delta = self.index, self.delta
+        return self._neighbours(index.succ_start, index.succ_len, index.succ_to,
+                                delta.succ_owner, delta.succ_to, delta.succ_at, node)
+
+    def predecessors(self, node):
+        index, delta = self.index, self.delta
+        return self._neighbours(index.pred_start, index.pred_len, index.pred_from,
+                                delta.pred_owner, delta.pred_from, delta.pred_at, node)
+
+    def find_cycle(self, sender, receiver, max_hops=CYCLE_MAX_HOPS, visit_budget=CYCLE_VISIT_BUDGET):
+        if sender != receiver and not self.linked:
+            return None
+        return find_cycle(self.successors, self.predecessors, sender, receiver, max_hops, visit_budget)
+
+
+# Worker side: the index (kept across batches) and the batch's delta, attached on first use
+_attached = {}  # class -> (block name, attached arrays)
+
+
+def _attached_arrays(cls, spec):
+    held = _attached.get(cls)
+    if held is None or held[0] != spec[0]:
+        if held is not None:
+            held[1].close()
+        held = _attached[cls] = (spec[0], cls.attach(spec))
+    return held[1]
+
+
+def count_distinct_senders(aml_engine, shard):
+    """
+    Worker entry point: AMLEngine.batch_distinct_senders for one shard of
+    receivers, which holds every batch row to them.
+    """
+    return aml_engine.batch_distinct_senders(shard["txs"], shard["account_flags"], shard["receiver_windows"]).tolist()
+
+
+def evaluate_shard(aml_engine, index_spec, delta_spec, shard):
+    """
+    Worker entry point: AMLEngine.batch_findings for one shard of senders,
+    with rings (as account codes, not IDs) read from the shared EdgeIndex and
+    EdgeDelta and mule counts taken from the receiver shards.
+    """
+    index = _attached_arrays(EdgeIndex, index_spec)
+    delta = _attached_arrays(EdgeDelta, delta_spec)
+    edges = delta.edges()
+    positions, unique_senders = shard["positions"], shard["unique_senders"]
+
+    def network(i, sender_id, receiver_id, findings):
+        position = positions[i]
+        sender, receiver = delta.sender[position], delta.receiver[position]
+        view = _EdgeView(index, edges, position, edges.linked(sender, receiver, position))
+        aml_engine._network_findings(view, sender, receiver, unique_senders[i], findings)
+
+    return aml_engine.batch_findings(shard["txs"], shard["account_flags"], shard["windows"], network)
+
+
+class ShardedEvaluator:
+    def __init__(self, workers=SHARDED_EVAL_WORKERS, min_rows=SHARDED_EVAL_MIN_ROWS):
+        """
+        Args:
+            workers (int): Worker processes; 0 uses one per core, 1 evaluates in-process.
+            min_rows (int): Smaller batches are evaluated in-process, where
+                shipping the shards would cost more than it saves.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.min_rows = min_rows
+        self._pool = None
+        self._index = None          # EdgeIndex of the last graph evaluated against
+        self._index_spec = None
+        self._indexed_graph = None  # Weak reference to that graph
+        # Batches share the pool and the index, so they take turns
+        self._lock = threading.Lock()
+
+    def evaluate_batch(self, aml_engine, txs, account_db, pep_db, tx_history_df, graph=None, windows=None,
+                       receiver_windows=None, account_flags=None):
+        """Same arguments and results as AMLEngine.evaluate_batch (plus the engine to use)."""
+        if self.workers <= 1 or len(txs) < max(self.min_rows, 2):
+            return aml_engine.evaluate_batch(txs, account_db, pep_db, tx_history_df, graph=graph, windows=windows,
+                                             receiver_windows=receiver_windows, account_flags=account_flags)
+
+        if isinstance(tx_history_df, TransactionStore) and None in (graph, windows, receiver_windows):
+            tx_history_df = tx_history_df.to_dataframe()
+        if windows is None:
+            windows = SenderWindows.from_dataframe(tx_history_df, horizon_hours=None)
+        if graph is None:
+            graph = TransactionGraph.from_dataframe(tx_history_df)
+        if receiver_windows is None:
+            receiver_windows = ReceiverWindows.from_dataframe(tx_history_df, horizon_hours=None)
+
+        senders = [tx.get("Sender_Account_ID") for tx in txs]
+        receivers = [tx.get("Receiver_Account_ID") for tx in txs]
+        # Screened here, so workers only receive their accounts' flags
+        flags = aml_engine.account_flags_for(set(senders) | set(receivers), account_db, pep_db, account_flags)
+        # Gating is static within a batch, so which rows add edges is known up front
+        accepted = aml_engine.batch_accepted(txs, flags)
+
+        with self._lock:
+            pool = self._executor()
+            # Mule counts mix the senders of a receiver, so workers count them
+            # first, per receiver, while the edge delta is prepared here
+            counting = [
+                (positions, pool.submit(count_distinct_senders, aml_engine,
+                                        self._receiver_shard(positions, txs, senders, flags, receiver_windows)))
+                for positions in self._partition(receivers)
+            ]
+            index = self._history_index(graph)
+            delta = EdgeDelta.build(index, graph, senders, receivers, accepted)
+            delta_spec = delta.share()
+            try:
+                unique_senders = [0] * len(txs)
+                for positions, future in counting:
+                    for position, count in zip(positions, future.result()):
+                        unique_senders[position] = count
+                shards = [
+                    self._shard(positions, txs, receivers, unique_senders, flags, windows)
+                    for positions in self._partition(senders)
+                ]
+                futures = [pool.submit(evaluate_shard, aml_engine, self._index_spec, delta_spec, shard)
+                           for shard in shards]
+                results = [None] * len(txs)
+                for shard, future in zip(shards, futures):
+                    for position, row in zip(shard["positions"], future.result()):
+                        results[position] = row if isinstance(row, dict) else self._result(aml_engine, delta, *row)
+                return results
+            finally:
+                delta.close(unlink=True)
+
+    def _history_index(self, graph):
+        """
+        The shared EdgeIndex of graph. Edges the graph gained since the last
+        batch are added to it in place; it is only rebuilt for another graph,
+        or once too many edges overflowed its spare room (or the graph's
+        bounded edge log, see start_edge_log(), gave up).
+        """
+        index = self._index
+        if index is not None and self._indexed_graph() is graph and graph.edge_log is not None:
+            for sender_id, receiver_id in graph.edge_log:
+                index.add_edge(sender_id, receiver_id)
+            del graph.edge_log[:]
+            if not index.full(graph.edge_count):
+                return index
+        self._close_index()
+        index = EdgeIndex.build(graph)
+        self._index_spec = index.share()
+        # From now on the graph logs its new edges for the next batch, but no
+        # more than would make the index full anyway
+        graph.start_edge_log(int(max(INDEX_OVERFLOW_MIN, INDEX_OVERFLOW_FRACTION * graph.edge_count)))
+        self._index, self._indexed_graph = index, weakref.ref(graph)
+        return index
+
+    def _close_index(self):
+        if self._index is not None:
+            graph = self._indexed_graph()
+            if graph is not None:
+                graph.stop_edge_log()
+            self._index.close(unlink=True)
+            self._index = self._index_spec = self._indexed_graph = None
+
+    def close(self):
+        with self._lock:
+            self._close_index()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            # Spawned (not forked) workers: the server runs writer/anchor threads
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _partition(self, accounts):
+        """Batch positions per shard; every row of an account (sender or receiver) lands in the same shard."""
+        rows_by_account = {}
+        for position, account_id in enumerate(accounts):
+            rows_by_account.setdefault(account_id, []).append(position)
+        shard_count = min(len(rows_by_account), self.workers * SHARDS_PER_WORKER)
+        # Busiest accounts first, each to the least loaded shard
+        loads = [(0, shard) for shard in range(shard_count)]
+        shards = [[] for _ in range(shard_count)]
+        for rows in sorted(rows_by_account.values(), key=len, reverse=True):
+            load, shard = heapq.heappop(loads)
+            shards[shard].extend(rows)
+            heapq.heappush(loads, (load + len(rows), shard))
+        return [sorted(rows) for rows in shards]
+
+    @staticmethod
+    def _shard(positions, txs, receivers, unique_senders, account_flags, windows):
+        shard_txs = [txs[p] for p in positions]
+        shard_senders = {tx.get("Sender_Account_ID") for tx in shard_txs}
+        return {
+            "positions": positions,
+            "txs": shard_txs,
+            "unique_senders": [unique_senders[p] for p in positions],
+            "account_flags": account_flags.subset(shard_senders | {receivers[p] for p in positions}),
+            "windows": windows.subset(shard_senders),
+        }
+
+    @staticmethod
+    def _receiver_shard(positions, txs, senders, account_flags, receiver_windows):
+        shard_txs = [txs[p] for p in positions]
+        return {
+            "txs": shard_txs,
+            # Gating decides which rows count, and it is a sender flag
+            "account_flags": account_flags.subset({senders[p] for p in positions}),
+            "receiver_windows": receiver_windows.subset({tx.get("Receiver_Account_ID") for tx in shard_txs}),
+        }
+
+    @staticmethod
+    def _result(aml_engine, delta, amount, findings):
+        # Workers report graph findings as account codes
+        if "cycle_path" in findings:
+            findings["cycle_path"] = [delta.node(code) for code in findings["cycle_path"]]
+        if "mule" in findings:
+            unique_senders, receiver_code = findings["mule"]
+            findings["mule"] = (unique_senders, delta.node(receiver_code))
+        return aml_engine._build_result(amount, findings)
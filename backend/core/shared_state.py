@@ -0,0 +1,166 @@
+"""
+Engine State
+Where accepted transactions, account gating and engine settings are recorded.
+
+EngineState applies changes to this process only, which is all a single worker
+needs. SharedEngineState also journals them in a SQLite database shared by
+every worker process on the host, and replays the changes committed by other
+workers, so all workers score against the same history, gates and threshold.
+
+Other workers' commits are detected with PRAGMA data_version (a counter that
+moves only when another connection commits), checked before every evaluation
+and by a background poller. A change reaches every worker within
+SHARED_STATE_POLL_SECONDS even when it is idle.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+SHARED_STATE_DB = os.getenv("SHARED_STATE_DB")  # unset = single-process state
+SHARED_STATE_POLL_SECONDS = float(os.getenv("SHARED_STATE_POLL_SECONDS", "0.25"))
+
+SHARED_STATE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS engine_settings
+             (key TEXT PRIMARY KEY,
+              value TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS account_status
+             (account_id TEXT PRIMARY KEY,
+              status TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS transaction_journal
+             (id INTEGER PRIMARY KEY AUTOINCREMENT,
+              origin TEXT,
+              tx_data TEXT)''',
+]
+
+
+class EngineState:
+    """Process-local engine state (the default, single-worker deployment)."""
+
+    def __init__(self, data_loader, aml_engine):
+        self.data_loader = data_loader
+        self.aml_engine = aml_engine
+
+    def refresh(self):
+        """Applies changes made by other workers; nothing to do for local state."""
+
+    def append_transactions(self, txs):
+        self.data_loader.append_transactions(txs)
+
+    def set_structuring_threshold(self, value):
+        self.aml_engine.set_structuring_threshold(value)
+
+    def set_account_status(self, account_id, status):
+        self.data_loader.set_account_status(account_id, status)
+
+    def close(self):
+        pass
+
+
+class SharedEngineState(EngineState):
+    def __init__(self, db_path, data_loader, aml_engine, poll_seconds=SHARED_STATE_POLL_SECONDS):
+        """
+        Args:
+            db_path (str): SQLite database shared by all workers.
+            data_loader (DataLoader): This worker's in-memory history and account lookup.
+            aml_engine (AMLEngine): This worker's engine.
+            poll_seconds (float): Upper bound on how long an idle worker takes to see a change.
+        """
+        super().__init__(data_loader, aml_engine)
+        self.db_path = db_path
+        self.poll_seconds = poll_seconds
+        self.origin = uuid.uuid4().hex
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SHARED_STATE_SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._data_version = None
+        self._journal_cursor = 0
+        # Catch up on everything other workers (or earlier runs) recorded
+        self._sync()
+        self._stop = threading.Event()
+        self._poller = threading.Thread(target=self._poll, name="shared-state-poller", daemon=True)
+        self._poller.start()
+
+    def refresh(self):
+        """Applies other workers' changes if any were committed since the last check."""
+        with self._lock:
+            if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+                self._sync_locked()
+
+    def append_transactions(self, txs):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO transaction_journal (origin, tx_data) VALUES (?, ?)",
+                [(self.origin, json.dumps(tx)) for tx in txs]
+            )
+            self._conn.commit()
+        self.data_loader.append_transactions(txs)
+
+    def set_structuring_threshold(self, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO engine_settings (key, value) VALUES ('structuring_threshold', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (json.dumps(value),)
+            )
+            self._conn.commit()
+        self.aml_engine.set_structuring_threshold(value)
+
+    def set_account_status(self, account_id, status):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO account_status (account_id, status) VALUES (?, ?) "
+                "ON CONFLICT(account_id) DO UPDATE SET status = excluded.status",
+                (account_id, status)
+            )
+            self._conn.commit()
+        self.data_loader.set_account_status(account_id, status)
+
+    def close(self):
+        self._stop.set()
+        self._poller.join()
+        with self._lock:
+            self._conn.close()
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Shared state refresh failed: {e}")
+
+    def _sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        # Read the version first: anything committed after it triggers another sync
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+        for key, value in self._conn.execute("SELECT key, value FROM engine_settings"):
+            if key == "structuring_threshold":
+                threshold = json.loads(value)
+                if threshold != self.aml_engine.structuring_threshold:
+                    self.aml_engine.set_structuring_threshold(threshold)
+
+        for account_id, status in self._conn.execute("SELECT account_id, status FROM account_status"):
+            info = self.data_loader.account_lookup.get(account_id)
+            if info is not None and info.get("Account_Status") != status:
+                self.data_loader.set_account_status(account_id, status)
+
+        rows = self._conn.execute(
+            "SELECT id, origin, tx_data FROM transaction_journal WHERE id > ? ORDER BY id", (self._journal_cursor,)
+        ).fetchall()
+        if rows:
+            self._journal_cursor = rows[-1][0]
+            # This worker's own rows were applied when it recorded them
+            others = [json.loads(tx_data) for _, origin, tx_data in rows if origin != self.origin]
+            if others:
+                self.data_loader.append_transactions(others)
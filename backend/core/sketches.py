@@ -0,0 +1,202 @@
+"""
+Distinct-Sender Windows
+Per-receiver counts of distinct senders over a sliding time window, for the mule rule.
+
+Each receiver's transfers are grouped into time buckets (MULE_WINDOW_BUCKETS per
+window). A bucket counts its senders exactly, keeping each sender's latest
+timestamp, until it holds SKETCH_EXACT_LIMIT of them; it then turns into a
+HyperLogLog sketch of 2**HLL_PRECISION one-byte registers, so memory per
+account stays bounded however many senders a hub receives from. A window query
+merges the handful of buckets it overlaps, independent of history length.
+
+Counts are exact while the buckets involved are exact, which covers every
+receiver near the mule threshold; sketched buckets are counted whole and
+estimated to within a few percent.
+"""
+
+import hashlib
+import math
+import os
+from collections import ChainMap
+
+import numpy as np
+
+from backend.core.windows import series_to_epoch_seconds, to_epoch_seconds
+
+MULE_WINDOW_HOURS = float(os.getenv("MULE_WINDOW_HOURS", "168"))
+MULE_WINDOW_BUCKETS = 8
+SKETCH_EXACT_LIMIT = 64
+HLL_PRECISION = 10
+
+_REGISTERS = 1 << HLL_PRECISION
+_RANK_BITS = 64 - HLL_PRECISION
+_NO_SENDER = object()
+
+
+def _sender_hash(sender_id):
+    # Stable across processes (unlike hash()), so every worker estimates alike
+    return int.from_bytes(hashlib.blake2b(str(sender_id).encode(), digest_size=8).digest(), "big")
+
+
+def _hll_add(registers, sender_id):
+    h = _sender_hash(sender_id)
+    index = h >> _RANK_BITS
+    rank = _RANK_BITS - (h & ((1 << _RANK_BITS) - 1)).bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def _hll_estimate(registers):
+    values = np.frombuffer(registers, dtype=np.uint8)
+    m = len(values)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -values.astype(np.int64)))
+    zeros = int(np.count_nonzero(values == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)  # Small-range correction
+    return int(round(estimate))
+
+
+class DistinctCounter:
+    __slots__ = ("latest", "registers")
+
+    def __init__(self):
+        self.latest = {}       # sender -> newest timestamp, while exact
+        self.registers = None  # HyperLogLog registers once sketched
+
+    def copy(self):
+        counter = DistinctCounter()
+        counter.latest = None if self.latest is None else dict(self.latest)
+        counter.registers = None if self.registers is None else bytearray(self.registers)
+        return counter
+
+    def add(self, sender_id, ts):
+        if self.registers is not None:
+            _hll_add(self.registers, sender_id)
+            return
+        if ts > self.latest.get(sender_id, float("-inf")):
+            self.latest[sender_id] = ts
+        if len(self.latest) > SKETCH_EXACT_LIMIT:
+            self.registers = bytearray(_REGISTERS)
+            for known in self.latest:
+                _hll_add(self.registers, known)
+            self.latest = None
+
+
+class ReceiverWindows:
+    def __init__(self, window_hours=MULE_WINDOW_HOURS, horizon_hours=MULE_WINDOW_HOURS):
+        """
+        Args:
+            window_hours (float): Length of the mule window; buckets are a fraction of it.
+            horizon_hours (float | None): Buckets this far behind a receiver's newest
+                transfer are dropped. None keeps everything (e.g. out-of-order replays).
+        """
+        self.window_seconds = window_hours * 3600
+        self.bucket_seconds = self.window_seconds / MULE_WINDOW_BUCKETS
+        self.horizon_seconds = None if horizon_hours is None else horizon_hours * 3600
+        self.receivers = {}  # receiver -> {bucket index: DistinctCounter}
+        self.newest = {}     # receiver -> index of its newest bucket
+        self._copied = None  # (receiver, bucket) counters an overlay owns
+
+    @classmethod
+    def from_dataframe(cls, tx_history_df, window_hours=MULE_WINDOW_HOURS, horizon_hours=MULE_WINDOW_HOURS):
+        """Builds per-receiver windows from a transaction history DataFrame."""
+        windows = cls(window_hours=window_hours, horizon_hours=horizon_hours)
+        if tx_history_df is None or tx_history_df.empty:
+            return windows
+        required = {"Sender_Account_ID", "Receiver_Account_ID", "Timestamp"}
+        if not required.issubset(tx_history_df.columns):
+            return windows
+        senders = tx_history_df["Sender_Account_ID"].tolist()
+        receivers = tx_history_df["Receiver_Account_ID"].tolist()
+        times = series_to_epoch_seconds(tx_history_df["Timestamp"]).tolist()
+        for sender_id, receiver_id, ts in zip(senders, receivers, times):
+            windows.add(receiver_id, sender_id, ts)
+        return windows
+
+    def overlay(self):
+        """Copy-on-write view for speculative transfers, e.g. earlier rows of a batch."""
+        view = ReceiverWindows(horizon_hours=None)
+        view.window_seconds = self.window_seconds
+        view.bucket_seconds = self.bucket_seconds
+        view.receivers = ChainMap({}, self.receivers)
+        view.newest = ChainMap({}, self.newest)
+        view._copied = set()
+        return view
+
+    def subset(self, receiver_ids):
+        """Windows of the given receivers only, sharing their buckets with this index."""
+        windows = ReceiverWindows(horizon_hours=None)
+        windows.window_seconds = self.window_seconds
+        windows.bucket_seconds = self.bucket_seconds
+        windows.horizon_seconds = self.horizon_seconds
+        for receiver_id in receiver_ids:
+            if receiver_id in self.receivers:
+                windows.receivers[receiver_id] = self.receivers[receiver_id]
+                windows.newest[receiver_id] = self.newest[receiver_id]
+        return windows
+
+    def add(self, receiver_id, sender_id, ts):
+        if ts != ts:  # NaN timestamps can never match a window
+            return
+        bucket = math.floor(ts / self.bucket_seconds)
+        if self._copied is None:
+            buckets = self.receivers.setdefault(receiver_id, {})
+        else:
+            local = self.receivers.maps[0]
+            if receiver_id not in local:
+                local[receiver_id] = dict(self.receivers.get(receiver_id, {}))
+            buckets = local[receiver_id]
+            if (receiver_id, bucket) not in self._copied and bucket in buckets:
+                buckets[bucket] = buckets[bucket].copy()
+            self._copied.add((receiver_id, bucket))
+        counter = buckets.get(bucket)
+        if counter is None:
+            counter = buckets[bucket] = DistinctCounter()
+        counter.add(sender_id, ts)
+        newest = self.newest.get(receiver_id)
+        if newest is None or bucket > newest:
+            newest = self.newest[receiver_id] = bucket
+        if self.horizon_seconds is not None:
+            oldest = math.floor((newest * self.bucket_seconds - self.horizon_seconds) / self.bucket_seconds)
+            for expired in [index for index in buckets if index < oldest]:
+                del buckets[expired]
+
+    def add_transaction(self, tx):
+        self.add(
+            tx.get("Receiver_Account_ID"),
+            tx.get("Sender_Account_ID"),
+            to_epoch_seconds(tx.get("Timestamp")),
+        )
+
+    def distinct_senders(self, receiver_id, since, pending_sender=_NO_SENDER):
+        """
+        Number of distinct accounts that sent to `receiver_id` at or after
+        `since` (epoch seconds), including a pending sender.
+        """
+        first = math.floor(since / self.bucket_seconds)
+        buckets = self.receivers.get(receiver_id, {})
+        last = self.newest.get(receiver_id, first - 1)
+        # Walk the window's bucket range rather than every bucket: without a
+        # horizon a receiver keeps all its old buckets, which a query never needs
+        if last - first < len(buckets):
+            counters = ((index, buckets[index]) for index in range(first, last + 1) if index in buckets)
+        else:
+            counters = ((index, counter) for index, counter in buckets.items() if index >= first)
+        senders = set()
+        registers = None
+        for index, counter in counters:
+            if counter.registers is not None:
+                sketch = np.frombuffer(counter.registers, dtype=np.uint8)
+                registers = sketch.copy() if registers is None else np.maximum(registers, sketch)
+            elif index == first:
+                senders.update(sender_id for sender_id, ts in counter.latest.items() if ts >= since)
+            else:
+                senders.update(counter.latest)
+        if pending_sender is not _NO_SENDER:
+            senders.add(pending_sender)
+        if registers is None:
+            return len(senders)
+        registers = bytearray(registers)
+        for sender_id in senders:
+            _hll_add(registers, sender_id)
+        return _hll_estimate(registers)
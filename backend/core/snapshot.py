@@ -0,0 +1,129 @@
+"""
+Columnar Snapshot Cache
+Converts the Excel source files to Parquet once and memory-maps the snapshot
+on later starts. Excel stays the source of truth and the fallback.
+
+A snapshot is reused while its manifest matches the source file's size and
+mtime; if only the mtime moved (e.g. a fresh checkout), the content hash
+decides. pyarrow is optional: without it every start reads Excel directly.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (pandas' Parquet engine)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+CACHE_DIR_NAME = ".cache"
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomically(path, write):
+    """
+    Calls write(tmp_path) on a temporary file private to this call, next to
+    `path`, then renames it over `path`. Workers rebuilding the same snapshot
+    at once each write their own file, and readers only ever see a whole one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class SnapshotCache:
+    def __init__(self, cache_dir, enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled and PARQUET_AVAILABLE
+        self.hits = 0
+        self.misses = 0
+
+    def _paths(self, source_path):
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+        base = os.path.join(self.cache_dir, stem)
+        return base + ".parquet", base + ".manifest.json"
+
+    def _fresh(self, source_path, manifest_path):
+        """True if the manifest still describes the source file (refreshing a stale mtime)."""
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        stat = os.stat(source_path)
+        if manifest.get("size") != stat.st_size:
+            return False
+        if manifest.get("mtime_ns") == stat.st_mtime_ns:
+            return True
+        if manifest.get("sha256") != _file_sha256(source_path):
+            return False
+        manifest["mtime_ns"] = stat.st_mtime_ns
+        self._write_manifest(manifest_path, manifest)
+        return True
+
+    @staticmethod
+    def _write_manifest(manifest_path, manifest):
+        def write(tmp_path):
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+        _write_atomically(manifest_path, write)
+
+    def read_excel(self, source_path):
+        """
+        Reads an Excel source through its Parquet snapshot when one is fresh.
+
+        Returns:
+            pd.DataFrame | None: The table, or None if the source does not exist.
+        """
+        if not os.path.exists(source_path):
+            return None
+        if not self.enabled:
+            return pd.read_excel(source_path)
+
+        parquet_path, manifest_path = self._paths(source_path)
+        if os.path.exists(parquet_path) and self._fresh(source_path, manifest_path):
+            try:
+                df = pd.read_parquet(parquet_path, memory_map=True)
+                self.hits += 1
+                return df
+            except Exception as e:
+                print(f"⚠️  Snapshot {parquet_path} unreadable ({e}) - rebuilding from Excel")
+
+        self.misses += 1
+        # Fingerprint before parsing so a concurrent edit is caught next start
+        stat = os.stat(source_path)
+        source_hash = _file_sha256(source_path)
+        df = pd.read_excel(source_path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            _write_atomically(parquet_path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+            self._write_manifest(manifest_path, {
+                "source": os.path.basename(source_path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": source_hash,
+            })
+        except Exception as e:
+            # The cache is an optimisation only; Excel data is already loaded
+            print(f"⚠️  Could not write snapshot for {source_path}: {e}")
+        return df
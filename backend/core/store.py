@@ -0,0 +1,98 @@
+"""
+Columnar Transaction Store
+Append-only, growable NumPy columns holding the evaluated transaction history.
+
+Appends write into pre-allocated arrays that double in capacity when full,
+so recording a transaction is amortised O(1) instead of copying the whole
+history through pd.concat. Readers get zero-copy views of the filled prefix.
+"""
+
+import numpy as np
+import pandas as pd
+
+from backend.core.windows import series_to_epoch_seconds, to_epoch_seconds
+
+# Column name -> (dtype, default used when a record omits it)
+COLUMNS = {
+    "Transaction_ID": (object, None),
+    "Sender_Account_ID": (object, None),
+    "Receiver_Account_ID": (object, None),
+    "Amount": (np.float64, 0.0),
+    "Timestamp": (object, None),
+    "Currency": (object, "USD"),
+}
+EPOCH_COLUMN = "Timestamp_epoch"
+
+
+class TransactionStore:
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.capacity = max(int(capacity), 1)
+        self.columns = {name: np.empty(self.capacity, dtype=dtype) for name, (dtype, _) in COLUMNS.items()}
+        self.columns[EPOCH_COLUMN] = np.empty(self.capacity, dtype=np.float64)
+        self._df_cache = None
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Bulk-loads a transaction DataFrame, parsing timestamps once."""
+        n = 0 if df is None else len(df)
+        store = cls(capacity=max(1024, n * 2))
+        if n == 0:
+            return store
+        for name, (dtype, default) in COLUMNS.items():
+            if name in df.columns:
+                values = df[name].to_numpy(dtype=dtype)
+                if dtype is object and default is not None:
+                    values = np.where(pd.isna(values), default, values)
+            else:
+                values = np.full(n, default, dtype=dtype)
+            store.columns[name][:n] = values
+        if "Timestamp" in df.columns:
+            store.columns[EPOCH_COLUMN][:n] = series_to_epoch_seconds(df["Timestamp"])
+        else:
+            store.columns[EPOCH_COLUMN][:n] = np.nan
+        store.size = n
+        return store
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def empty(self):
+        return self.size == 0
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, values in self.columns.items():
+            grown = np.empty(self.capacity, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            self.columns[name] = grown
+
+    def append(self, tx):
+        """Appends one transaction record (dict) in amortised O(1)."""
+        if self.size == self.capacity:
+            self._grow()
+        i = self.size
+        for name, (_, default) in COLUMNS.items():
+            value = tx.get(name, default)
+            self.columns[name][i] = default if value is None else value
+        self.columns[EPOCH_COLUMN][i] = to_epoch_seconds(tx.get("Timestamp"))
+        self.size += 1
+        self._df_cache = None
+
+    def column(self, name):
+        """Zero-copy view of a column's filled prefix."""
+        return self.columns[name][:self.size]
+
+    def to_dataframe(self):
+        """
+        DataFrame over the current history (without the epoch column).
+
+        The frame is cached until the next append so repeated readers share it.
+        """
+        if self._df_cache is None:
+            self._df_cache = pd.DataFrame(
+                {name: self.column(name) for name in COLUMNS},
+                copy=False,
+            )
+        return self._df_cache
@@ -0,0 +1,113 @@
+"""
+Ledger Verification
+Streams compliance_log with a cursor and re-derives the hash chain.
+
+Routine checks resume from the newest signed checkpoint; full audits split the
+ledger into id segments verified in parallel worker processes. A segment only
+needs its own rows: every row must rehash to its stored current_hash and link
+to the previous row's stored hash, and the parent then checks that adjacent
+segments join up (the first segment joins GENESIS_HASH).
+
+Kept free of app imports so spawned workers start quickly.
+"""
+
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import secrets
+import sqlite3
+from pathlib import Path
+
+GENESIS_HASH = "GENESIS_HASH"
+
+CHECKPOINT_SCHEMA = '''CREATE TABLE IF NOT EXISTS verification_checkpoints
+             (id INTEGER PRIMARY KEY AUTOINCREMENT,
+              ledger_id INTEGER,
+              head_hash TEXT,
+              signature TEXT,
+              created_at DATETIME DEFAULT CURRENT_TIMESTAMP)'''
+
+ROWS_SQL = "SELECT id, tx_data, score, prev_hash, current_hash FROM compliance_log WHERE id > ? AND id <= ? ORDER BY id"
+
+
+def chain_hash(tx_data, score, prev_hash):
+    # Deterministic string representation
+    payload = f"{json.dumps(tx_data, sort_keys=True)}{score}{prev_hash}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def connect_readonly(db_path, check_same_thread=True):
+    return sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True,
+                           check_same_thread=check_same_thread)
+
+
+def walk_chain(rows, prev_hash):
+    """
+    Checks a stream of (id, tx_data, score, prev_hash, current_hash) rows.
+
+    Returns:
+        tuple: (first_tampered_id or None, last verified hash, last verified id, rows checked)
+    """
+    last_id, checked = None, 0
+    for row_id, tx_data_str, score, stored_prev, stored_curr in rows:
+        if stored_prev != prev_hash or chain_hash(json.loads(tx_data_str), score, prev_hash) != stored_curr:
+            return row_id, prev_hash, last_id, checked
+        prev_hash, last_id = stored_curr, row_id
+        checked += 1
+    return None, prev_hash, last_id, checked
+
+
+def verify_segment(db_path, after_id, upto_id):
+    """
+    Process-pool task: verifies rows after_id < id <= upto_id on their own.
+
+    Returns:
+        dict: first_id, first_prev (the hash the segment expects before it),
+        last_hash, first_tampered_id and rows checked.
+    """
+    conn = connect_readonly(db_path)
+    try:
+        cursor = conn.execute(ROWS_SQL, (after_id, upto_id))
+        first = cursor.fetchone()
+        if first is None:
+            return {"first_id": None, "first_prev": None, "last_hash": None, "first_tampered_id": None, "rows": 0}
+        first_tampered, last_hash, _, checked = walk_chain(itertools.chain([first], cursor), first[3])
+    finally:
+        conn.close()
+    return {
+        "first_id": first[0],
+        "first_prev": first[3],
+        "last_hash": last_hash,
+        "first_tampered_id": first_tampered,
+        "rows": checked
+    }
+
+
+def load_checkpoint_key(db_path):
+    """
+    HMAC key for checkpoints: LEDGER_CHECKPOINT_KEY, else a random key kept
+    next to the database (created on first use, owner-readable only).
+    """
+    key = os.getenv("LEDGER_CHECKPOINT_KEY")
+    if key:
+        return key.encode()
+    key_path = db_path + ".checkpoint-key"
+    try:
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(key_path, "rb") as f:
+            return f.read()
+    key = secrets.token_hex(32).encode()
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def sign_checkpoint(key, ledger_id, head_hash):
+    return hmac.new(key, f"{ledger_id}:{head_hash}".encode(), hashlib.sha256).hexdigest()
+
+
+def checkpoint_valid(key, ledger_id, head_hash, signature):
+    return hmac.compare_digest(sign_checkpoint(key, ledger_id, head_hash), signature or "")
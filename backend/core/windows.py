@@ -0,0 +1,178 @@
+"""
+Per-Sender Sliding Windows
+Time-ordered amount/count aggregates backing the structuring and velocity rules.
+
+Each sender keeps its transaction timestamps sorted alongside running totals,
+so "how much / how many since T" is a binary search plus one subtraction
+instead of a filter and timestamp parse over the whole history.
+
+Entries are dropped once they fall behind the horizon: the longest rule window
+plus WINDOW_LATENESS_HOURS, the clock skew accepted between a sender's rows.
+A back-dated row up to that far behind its sender's newest transaction still
+finds every entry its windows cover.
+"""
+
+import os
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+EPOCH = datetime(1970, 1, 1)
+
+RULE_WINDOW_HOURS = 48  # Longest window a rule reads back (velocity)
+WINDOW_LATENESS_HOURS = float(os.getenv("WINDOW_LATENESS_HOURS", "24"))
+WINDOW_HORIZON_HOURS = RULE_WINDOW_HOURS + WINDOW_LATENESS_HOURS
+
+
+def to_epoch_seconds(value):
+    """Converts a datetime, pandas Timestamp or timestamp string to epoch seconds (NaN if unparseable)."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.replace(tzinfo=None)
+        return (value - EPOCH).total_seconds()
+    try:
+        parsed = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        return float("nan")
+    if pd.isna(parsed):
+        return float("nan")
+    return to_epoch_seconds(parsed.to_pydatetime())
+
+
+def series_to_epoch_seconds(timestamps):
+    """Vectorised to_epoch_seconds for a pandas Series."""
+    parsed = pd.to_datetime(timestamps, errors="coerce")
+    return ((parsed - pd.Timestamp(EPOCH)) / pd.Timedelta(seconds=1)).to_numpy(dtype=float)
+
+
+class _AccountWindow:
+    __slots__ = ("times", "cumulative", "base", "start")
+
+    def __init__(self):
+        self.times = []       # sorted epoch seconds
+        self.cumulative = []  # running amount total, aligned with times
+        self.base = 0.0       # running total before times[start]
+        self.start = 0        # entries before this index have expired
+
+    def insert(self, ts, amount):
+        if not self.times or ts >= self.times[-1]:
+            last = self.cumulative[-1] if self.cumulative else self.base
+            self.times.append(ts)
+            self.cumulative.append(last + amount)
+            return
+        # Out-of-order arrival: insert and repair the running totals after it
+        idx = max(bisect_right(self.times, ts), self.start)
+        self.times.insert(idx, ts)
+        prev = self.cumulative[idx - 1] if idx > self.start else self.base
+        self.cumulative.insert(idx, prev + amount)
+        for i in range(idx + 1, len(self.cumulative)):
+            self.cumulative[i] += amount
+
+    def expire(self, cutoff):
+        idx = bisect_left(self.times, cutoff, lo=self.start)
+        if idx == self.start:
+            return
+        self.base = self.cumulative[idx - 1]
+        self.start = idx
+        # Compact once most of the list is dead, rebasing totals to keep them small
+        if self.start > 64 and self.start * 2 > len(self.times):
+            base = self.base
+            self.times = self.times[self.start:]
+            self.cumulative = [total - base for total in self.cumulative[self.start:]]
+            self.base = 0.0
+            self.start = 0
+
+    def stats_since(self, since):
+        idx = bisect_left(self.times, since, lo=self.start)
+        count = len(self.times) - idx
+        if count == 0:
+            return 0, 0.0
+        before = self.cumulative[idx - 1] if idx > self.start else self.base
+        return count, self.cumulative[-1] - before
+
+
+class SenderWindows:
+    def __init__(self, horizon_hours=WINDOW_HORIZON_HOURS):
+        # Entries older than the horizon (relative to an account's newest
+        # transaction) are dropped; the horizon must cover the longest rule
+        # window plus the lateness back-dated rows are allowed. None keeps
+        # everything, which serves back-dated queries of any age exactly.
+        self.horizon_seconds = None if horizon_hours is None else horizon_hours * 3600
+        self.accounts = {}
+
+    @classmethod
+    def from_dataframe(cls, tx_history_df, horizon_hours=WINDOW_HORIZON_HOURS):
+        """Builds per-sender windows from a transaction history DataFrame."""
+        windows = cls(horizon_hours=horizon_hours)
+        if tx_history_df is None or tx_history_df.empty:
+            return windows
+        required = {"Sender_Account_ID", "Amount", "Timestamp"}
+        if not required.issubset(tx_history_df.columns):
+            return windows
+        senders = tx_history_df["Sender_Account_ID"].tolist()
+        amounts = tx_history_df["Amount"].astype(float).tolist()
+        times = series_to_epoch_seconds(tx_history_df["Timestamp"]).tolist()
+        for sender_id, amount, ts in zip(senders, amounts, times):
+            windows.add(sender_id, ts, amount)
+        return windows
+
+    def subset(self, sender_ids):
+        """Windows of the given senders only, sharing their entries with this index."""
+        windows = SenderWindows(horizon_hours=None)
+        windows.horizon_seconds = self.horizon_seconds
+        windows.accounts = {
+            sender_id: self.accounts[sender_id] for sender_id in sender_ids if sender_id in self.accounts
+        }
+        return windows
+
+    def add(self, sender_id, ts, amount):
+        if ts != ts:  # NaN timestamps can never match a window
+            return
+        window = self.accounts.get(sender_id)
+        if window is None:
+            window = self.accounts[sender_id] = _AccountWindow()
+        window.insert(ts, amount)
+        if self.horizon_seconds is not None:
+            window.expire(window.times[-1] - self.horizon_seconds)
+
+    def add_transaction(self, tx):
+        self.add(
+            tx.get("Sender_Account_ID"),
+            to_epoch_seconds(tx.get("Timestamp")),
+            float(tx.get("Amount", 0)),
+        )
+
+    def stats(self, sender_id, since):
+        """
+        Aggregates a sender's transactions with timestamp >= `since` (epoch seconds).
+
+        Returns:
+            tuple: (count, total_amount)
+        """
+        window = self.accounts.get(sender_id)
+        if window is None:
+            return 0, 0.0
+        return window.stats_since(since)
+
+    def stats_many(self, sender_id, since):
+        """
+        Vectorised stats() for one sender over an array of cutoffs.
+
+        Returns:
+            tuple: (counts, totals) as NumPy arrays aligned with `since`
+        """
+        since = np.asarray(since, dtype=float)
+        counts = np.zeros(len(since), dtype=np.int64)
+        totals = np.zeros(len(since), dtype=float)
+        window = self.accounts.get(sender_id)
+        if window is None or window.start == len(window.times):
+            return counts, totals
+        times = np.asarray(window.times[window.start:])
+        cumulative = np.asarray(window.cumulative[window.start:])
+        idx = np.searchsorted(times, since, side="left")
+        counts[:] = len(times) - idx
+        before = np.where(idx > 0, cumulative[np.maximum(idx - 1, 0)], window.base)
+        totals[:] = np.where(counts > 0, cumulative[-1] - before, 0.0)
+        return counts, totals
@@ -1,20 +1,76 @@
 
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
 import pandas as pd
 import json
+import os
 import sqlite3
 
 from backend.core.ingestion import DataLoader
+from backend.core.locks import KeyedLocks
+from backend.core.shared_state import SHARED_STATE_DB, EngineState, SharedEngineState
 from backend.core.aml_engine import AMLEngine
+from backend.core.sharded import ShardedEvaluator
 from backend.core.provenance import ProvenanceManager
+from backend.core.ledger_query import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ledger_timestamp, stream_page
+from backend.core.store import EPOCH_COLUMN
+from backend.core.windows import to_epoch_seconds
 from backend.services.str_generator import generate_str_report
-from backend.services.simulator import stream_live_transactions_generator
+from backend.services.str_queue import ReportStore, STRQueue
+from backend.services.simulator import catch_up_events, event_ledger_id, stream_live_transactions_generator
+from backend.services.replay import DEFAULT_REPLAY_TPS, ReplayPacer
+from backend.services.broadcast import BroadcastHub
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="RegShield: Real-Time AML & Compliance Rule Engine")
+# Initialize Logic Layers
+# Stateful singletons are built exactly once, in the app lifespan, so importing
+# this module (e.g. to inspect routes) neither parses the datasets nor probes Web3.
+data_loader: Optional[DataLoader] = None
+aml_engine = AMLEngine()
+# Worker processes for large batch chunks (SHARDED_EVAL_WORKERS); started on first use
+sharded_evaluator = ShardedEvaluator()
+provenance_manager: Optional[ProvenanceManager] = None
+str_queue: Optional[STRQueue] = None
+broadcast_hub: Optional[BroadcastHub] = None
+# History, gating and threshold changes go through engine_state so that other
+# worker processes see them too when SHARED_STATE_DB is set
+engine_state: Optional[EngineState] = None
+# Serializes evaluations per sender account (see /api/evaluate)
+account_locks = KeyedLocks()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global data_loader, provenance_manager, str_queue, broadcast_hub, engine_state
+    data_loader = DataLoader(data_dir="backend/data")
+    if SHARED_STATE_DB:
+        engine_state = SharedEngineState(SHARED_STATE_DB, data_loader, aml_engine)
+    else:
+        engine_state = EngineState(data_loader, aml_engine)
+    provenance_manager = ProvenanceManager(db_path="backend/data/provenance.db")
+    str_queue = STRQueue(generate_str_report, ReportStore("backend/data/str_reports.db"))
+    # All live feed clients share one evaluation pipeline
+    broadcast_hub = BroadcastHub(
+        lambda pacer, resume: stream_live_transactions_generator(
+            data_loader, aml_engine, provenance_manager, str_queue, pacer, resume=resume
+        ),
+        # Reconnecting clients catch up from stored results instead of re-running rules
+        catch_up=lambda last_event_id: catch_up_events(provenance_manager.db_path, str_queue, last_event_id),
+        event_id=event_ledger_id
+    )
+    print("RegShield System Initialized: Data Loaded.")
+    yield
+    await broadcast_hub.close()
+    # Stops the ledger writer, anchor worker and STR workers; unfinished jobs resume on next start
+    str_queue.close()
+    provenance_manager.close()
+    engine_state.close()
+    sharded_evaluator.close()
+
+app = FastAPI(title="RegShield: Real-Time AML & Compliance Rule Engine", lifespan=lifespan)
 
 # Add CORS Middleware for Next.js Frontend
 app.add_middleware(
@@ -25,15 +81,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Logic Layers
-# In a real app, use dependency injection or lifespan events
-data_loader = DataLoader(data_dir="backend/data")
-aml_engine = AMLEngine()
-provenance_manager = ProvenanceManager(db_path="backend/data/provenance.db")
-
-# In-memory STR report storage (use Redis/DB in production)
-str_reports_cache = {}
-
 class Transaction(BaseModel):
     Transaction_ID: str
     Sender_Account_ID: str
@@ -47,78 +94,87 @@ class TransactionResponse(BaseModel):
     risk_breakdown: Dict[str, int]
     total_score: int
     decision: str
-    provenance: Dict[str, str]
+    provenance: Dict[str, Union[str, int]]
     triggered_rules: List[str]
     str_report_url: Optional[str] = None
     str_report_text: Optional[str] = None
     cycle_path: Optional[List[str]] = None  # CRISIS FEATURE 3
 
-@app.on_event("startup")
-def startup_event():
-    # Load data on startup
-    data_loader.load_data()
-    print("RegShield System Initialized: Data Loaded.")
-
 @app.post("/api/evaluate", response_model=TransactionResponse)
-def evaluate_transaction(tx: Transaction, background_tasks: BackgroundTasks):
+async def evaluate_transaction(tx: Transaction):
     """
     OPTIMIZED: Returns risk score in < 200ms (sub-second).
     STR generation runs in background to meet < 2 second dashboard refresh requirement.
+    Transactions from the same sender are evaluated one at a time, in arrival
+    order; other senders run in parallel and share ledger group commits.
     """
     tx_dict = tx.dict()
+    async with account_locks.hold(tx_dict["Sender_Account_ID"]):
+        return await run_in_threadpool(evaluate_and_record, tx_dict)
+
+def evaluate_and_record(tx_dict: dict):
+    """Blocking half of /api/evaluate; the caller holds the sender's lock."""
+    # Pick up gating, threshold and history changes from other workers
+    engine_state.refresh()
     
     # 1. Get Context (Account Info, PEP status, History)
-    history_df = data_loader.transactions_df
+    history = data_loader.transactions
     account_db = data_loader.account_lookup
-    pep_db = data_loader.pep_names
+    pep_db = data_loader.pep_screener
     
     # 2. Run Deterministic Rules (FAST - no LLM here)
     try:
-        evaluation = aml_engine.evaluate_transaction(
-            tx_dict, 
-            account_db, 
-            pep_db, 
-            history_df
-        )
+        with data_loader.lock.read():
+            evaluation = aml_engine.evaluate_transaction(
+                tx_dict, 
+                account_db, 
+                pep_db, 
+                history,
+                graph=data_loader.graph,
+                windows=data_loader.windows,
+                receiver_windows=data_loader.receiver_windows,
+                account_flags=data_loader.account_flags
+            )
     except ValueError as e:
         if "GATED_ACCOUNT_BREACH" in str(e):
             raise HTTPException(status_code=403, detail=str(e))
         raise
     
-    score = evaluation["total_score"]
-    decision = evaluation["decision"]
-    triggered_rules = evaluation["triggered_rules"]
-    
-    # 3. Anchor to Blockchain (Provenance) - Uses mock hash if not connected, still fast
+    # 3. Chain into the ledger (Provenance) - the anchor worker sends it on-chain in the background
     provenance_record = provenance_manager.log_transaction(
         tx_dict, 
-        score, 
-        decision
+        evaluation["total_score"], 
+        evaluation["decision"],
+        evaluation
     )
     
-    # 4. Schedule STR generation in background if score > 80
-    # This ensures the API returns immediately without waiting for LLM
+    # 4. Update Memory State (Simulate Real-Time Ingestion)
+    engine_state.append_transactions([tx_dict])
+    
+    # 5. Queue STR generation if score > 80
+    # RETURN IMMEDIATELY - No waiting for LLM
+    return build_evaluation_response(tx_dict, evaluation, provenance_record)
+
+def build_evaluation_response(tx_dict: dict, evaluation: dict, provenance_record: dict):
+    """
+    Shapes an evaluation into the /api/evaluate response and, if score > 80,
+    queues STR generation so the API returns without waiting for the LLM.
+    """
+    tx_id = tx_dict["Transaction_ID"]
+    score = evaluation["total_score"]
+    triggered_rules = evaluation["triggered_rules"]
+    
     str_url = None
     if score > 80:
-        str_url = f"/api/reports/{tx.Transaction_ID}.pdf"
-        # Queue background task to generate STR asynchronously
-        background_tasks.add_task(
-            generate_str_report_async,
-            tx_dict,
-            triggered_rules,
-            tx.Transaction_ID
-        )
-        
-    # 5. Update Memory State (Simulate Real-Time Ingestion)
-    new_row = pd.DataFrame([tx_dict])
-    data_loader.transactions_df = pd.concat([data_loader.transactions_df, new_row], ignore_index=True)
+        str_url = f"/api/reports/{tx_id}.pdf"
+        # STR workers generate the report; duplicates of a Transaction_ID are ignored
+        str_queue.submit(tx_dict, triggered_rules)
     
-    # RETURN IMMEDIATELY - No waiting for LLM
     return {
-        "transaction_id": tx.Transaction_ID,
+        "transaction_id": tx_id,
         "risk_breakdown": evaluation["risk_breakdown"],
         "total_score": score,
-        "decision": decision,
+        "decision": evaluation["decision"],
         "provenance": provenance_record,
         "triggered_rules": triggered_rules,
         "str_report_url": str_url,
@@ -126,20 +182,77 @@ def evaluate_transaction(tx: Transaction, background_tasks: BackgroundTasks):
         "cycle_path": evaluation.get("cycle_path")  # CRISIS FEATURE 3
     }
 
-def generate_str_report_async(tx_dict: dict, triggered_rules: list, tx_id: str):
+# Rows per engine call / ledger commit when streaming batch results back
+# (raise it for bulk rescreening so chunks reach SHARDED_EVAL_MIN_ROWS)
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "1000"))
+
+@app.post("/api/evaluate/batch")
+async def evaluate_batch(request: Request):
     """
-    Background task to generate STR report without blocking the API response.
-    Stores report in memory cache for later retrieval.
+    Bulk scoring for upstream bursts.
+    Body: NDJSON, one Transaction per line. Response: NDJSON, one result per
+    input line in the same order, streamed back chunk by chunk.
+    
+    Results are identical to posting each line to /api/evaluate in order, but
+    rules run vectorized per chunk and each chunk is one ledger commit.
+    Rejected lines (invalid JSON/schema, gated-account breach) produce an
+    {"transaction_id", "error", "status_code"} line and are not recorded.
     """
-    try:
-        str_text = generate_str_report(tx_dict, triggered_rules)
-        # Store in cache for retrieval
-        str_reports_cache[tx_id] = str_text
-        print(f"✅ STR Report generated and cached for {tx_id}")
-    except Exception as e:
-        print(f"❌ STR Generation failed for {tx_id}: {e}")
-        # Store error report as fallback
-        str_reports_cache[tx_id] = f"Error generating report: {str(e)}"
+    body = await request.body()
+    lines = [line for line in body.decode("utf-8").splitlines() if line.strip()]
+    
+    def parse_chunk(chunk):
+        outputs = [None] * len(chunk)
+        valid_rows, tx_dicts = [], []
+        for i, line in enumerate(chunk):
+            try:
+                tx_dicts.append(Transaction.model_validate_json(line).model_dump())
+                valid_rows.append(i)
+            except ValueError as e:
+                outputs[i] = {"transaction_id": None, "error": str(e), "status_code": 422}
+        return outputs, valid_rows, tx_dicts
+    
+    def evaluate_chunk(outputs, valid_rows, tx_dicts):
+        engine_state.refresh()
+        with data_loader.lock.read():
+            evaluations = sharded_evaluator.evaluate_batch(
+                aml_engine,
+                tx_dicts,
+                data_loader.account_lookup,
+                data_loader.pep_screener,
+                data_loader.transactions,
+                graph=data_loader.graph,
+                windows=data_loader.windows,
+                receiver_windows=data_loader.receiver_windows,
+                account_flags=data_loader.account_flags
+            )
+        
+        accepted = []
+        for i, tx_dict, evaluation in zip(valid_rows, tx_dicts, evaluations):
+            if "error" in evaluation:
+                outputs[i] = {"transaction_id": tx_dict["Transaction_ID"], "error": evaluation["error"], "status_code": 403}
+            else:
+                accepted.append((i, tx_dict, evaluation))
+        
+        records = provenance_manager.log_transactions(
+            [(tx_dict, evaluation["total_score"], evaluation["decision"], evaluation) for _, tx_dict, evaluation in accepted]
+        ) if accepted else []
+        
+        engine_state.append_transactions([tx_dict for _, tx_dict, _ in accepted])
+        for (i, tx_dict, evaluation), provenance_record in zip(accepted, records):
+            outputs[i] = build_evaluation_response(tx_dict, evaluation, provenance_record)
+        
+        return "".join(json.dumps(output) + "\n" for output in outputs)
+    
+    async def result_stream():
+        for start in range(0, len(lines), BATCH_CHUNK_SIZE):
+            outputs, valid_rows, tx_dicts = await run_in_threadpool(parse_chunk, lines[start:start + BATCH_CHUNK_SIZE])
+            # Serialized against single evaluations of the same senders
+            async with account_locks.hold(*(tx["Sender_Account_ID"] for tx in tx_dicts)):
+                results = await run_in_threadpool(evaluate_chunk, outputs, valid_rows, tx_dicts)
+            yield results
+    
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
 
 @app.get("/api/reports/{transaction_id}")
 def get_str_report(transaction_id: str):
@@ -147,17 +260,120 @@ def get_str_report(transaction_id: str):
     Retrieve STR report for a specific transaction.
     Returns the report text if available, or 404 if not found.
     """
-    if transaction_id in str_reports_cache:
-        return {"transaction_id": transaction_id, "report": str_reports_cache[transaction_id]}
+    report = str_queue.get_report(transaction_id)
+    if report is not None:
+        return {"transaction_id": transaction_id, "report": report}
     else:
         raise HTTPException(status_code=404, detail=f"STR report for {transaction_id} not found. It may still be generating.")
 
+@app.get("/api/reports/{transaction_id}/status")
+def get_str_report_status(transaction_id: str):
+    """STR job state: queued, running, retrying, done or failed (with attempts and last error)."""
+    status = str_queue.status(transaction_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"No STR job for {transaction_id}")
+    return status
+
+@app.get("/api/reports")
+def get_str_queue_stats():
+    return str_queue.stats()
+
 @app.get("/api/verify_ledger")
-def verify_ledger():
-    status = provenance_manager.verify_ledger()
-    if status == "TAMPERED":
-        raise HTTPException(status_code=409, detail="Blockchain Integrity Check Failed: TAMPERED")
-    return {"status": "VERIFIED", "message": "All transactions match the cryptographic chain."}
+def verify_ledger(mode: str = "incremental"):
+    """
+    Routine checks (default) resume from the last signed checkpoint;
+    mode=full re-verifies the whole chain in parallel and names the first tampered row.
+    """
+    if mode not in ("incremental", "full"):
+        raise HTTPException(status_code=422, detail="mode must be 'incremental' or 'full'")
+    report = provenance_manager.verify_ledger_report(mode)
+    if report["status"] == "TAMPERED":
+        raise HTTPException(
+            status_code=409,
+            detail=f"Blockchain Integrity Check Failed: TAMPERED (first tampered ledger id: {report['first_tampered_id']})"
+        )
+    return {
+        "status": "VERIFIED",
+        "message": "All transactions match the cryptographic chain.",
+        "mode": report["mode"],
+        "rows_checked": report["rows_checked"]
+    }
+
+@app.get("/api/proof/{tx_id}")
+def get_inclusion_proof(tx_id: str):
+    """
+    Merkle inclusion proof linking a transaction's ledger hash to its anchored batch root.
+    Rows logged since the last anchoring interval report status PENDING.
+    """
+    proof = provenance_manager.get_inclusion_proof(tx_id)
+    if proof is None:
+        raise HTTPException(status_code=404, detail=f"Transaction {tx_id} not found in ledger")
+    return proof
+
+# Audit queries: NDJSON, one ledger row per line, then a {"next_cursor": ...} trailer.
+# Pass next_cursor back as ?cursor= for the next page (keyset pagination).
+def ledger_page_response(by: str, params: tuple, cursor: Optional[str], limit: int):
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    try:
+        lines = stream_page(provenance_manager.db_path, by, params, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+@app.get("/api/ledger/tx/{tx_id}")
+def query_ledger_by_tx(tx_id: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    return ledger_page_response("tx_id", (tx_id,), cursor, limit)
+
+@app.get("/api/ledger/decision/{decision}")
+def query_ledger_by_decision(decision: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    return ledger_page_response("decision", (decision,), cursor, limit)
+
+@app.get("/api/ledger/score")
+def query_ledger_by_score(min_score: int = 0, max_score: int = 1000, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    return ledger_page_response("score", (min_score, max_score), cursor, limit)
+
+@app.get("/api/ledger/time")
+def query_ledger_by_time(start: str, end: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """start/end: ISO-8601 timestamps (ledger times are UTC)."""
+    try:
+        bounds = (ledger_timestamp(start), ledger_timestamp(end))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid timestamp: {e}")
+    return ledger_page_response("timestamp", bounds, cursor, limit)
+
+# Account clusters are maintained by the graph index as transactions are recorded
+MAX_CLUSTERS_PER_PAGE = 1000
+
+@app.get("/api/graph/clusters")
+def get_account_clusters(min_size: int = 2, limit: int = 100):
+    """
+    Groups of accounts linked by any chain of transfers, largest first, read
+    from the incrementally maintained cluster map (no graph traversal).
+    cluster_id is the cluster's representative account and can change when
+    clusters merge.
+    """
+    if min_size < 1 or not 1 <= limit <= MAX_CLUSTERS_PER_PAGE:
+        raise HTTPException(status_code=422, detail=f"min_size must be >= 1 and limit between 1 and {MAX_CLUSTERS_PER_PAGE}")
+    engine_state.refresh()
+    with data_loader.lock.read():
+        clusters = data_loader.graph.clusters.clusters(min_size)
+        page = [
+            {"cluster_id": root, "size": len(members), "accounts": list(members)}
+            for root, members in clusters[:limit]
+        ]
+    return {"total_clusters": len(clusters), "clusters": page}
+
+@app.get("/api/graph/clusters/{account_id}")
+def get_account_cluster(account_id: str):
+    """The whole cluster an account belongs to, e.g. to pull a ring from one suspect."""
+    engine_state.refresh()
+    with data_loader.lock.read():
+        accounts = data_loader.graph.clusters.cluster_of(account_id)
+        cluster_id = data_loader.graph.clusters.find(account_id)
+    if accounts is None:
+        raise HTTPException(status_code=404, detail=f"Account {account_id} has no recorded transfers")
+    return {"account_id": account_id, "cluster_id": cluster_id, "size": len(accounts), "accounts": accounts}
 
 @app.post("/api/simulate_tamper")
 def simulate_tamper():
@@ -218,20 +434,26 @@ def shift_threshold(new_threshold: float = 7000):
     Retroactively scans last 24h transactions and flags accounts that now exceed the new threshold.
     Also updates the live compliance engine for future transactions.
     """
-    # Dynamic Update for Future Transactions
-    aml_engine.set_structuring_threshold(new_threshold)
+    # Dynamic Update for Future Transactions (in every worker)
+    engine_state.set_structuring_threshold(new_threshold)
+    engine_state.refresh()
 
     from datetime import datetime, timedelta
     
     current_time = datetime.now()
     lookback_time = current_time - timedelta(hours=24)
     
-    if data_loader.transactions_df.empty:
+    store = data_loader.transactions
+    if store.empty:
         return {"newly_flagged_accounts": [], "message": "No transactions in history"}
     
-    df = data_loader.transactions_df.copy()
-    df["Timestamp_dt"] = pd.to_datetime(df["Timestamp"], errors='coerce')
-    recent_txs = df[df["Timestamp_dt"] >= lookback_time]
+    # Zero-copy column views; timestamps were parsed to epoch seconds on append
+    with data_loader.lock.read():
+        recent_mask = store.column(EPOCH_COLUMN) >= to_epoch_seconds(lookback_time)
+        recent_txs = pd.DataFrame({
+            "Sender_Account_ID": store.column("Sender_Account_ID")[recent_mask],
+            "Amount": store.column("Amount")[recent_mask],
+        })
     
     if recent_txs.empty:
         return {"newly_flagged_accounts": [], "message": "No transactions in last 24 hours"}
@@ -277,7 +499,7 @@ RECOMMENDATION: Enhanced Due Diligence (EDD) required
     }
 
 @app.post("/api/admin/apply_weighted_risk")
-def apply_weighted_risk(account_id: str, velocity: float, geo_entropy: float, hops_to_blacklist: int):
+async def apply_weighted_risk(account_id: str, velocity: float, geo_entropy: float, hops_to_blacklist: int):
     """
     CRISIS FEATURE 2: Apply weighted risk scoring and gate high-risk accounts
     """
@@ -287,9 +509,10 @@ def apply_weighted_risk(account_id: str, velocity: float, geo_entropy: float, ho
     if not account_info:
         raise HTTPException(status_code=404, detail=f"Account {account_id} not found")
     
-    # If risk > 75, GATE the account
+    # If risk > 75, GATE the account (once its in-flight evaluations have finished)
     if risk_score > 75:
-        data_loader.account_lookup[account_id]["Account_Status"] = "Gated_5000_Limit"
+        async with account_locks.hold(account_id):
+            engine_state.set_account_status(account_id, "Gated_5000_Limit")
         status = "GATED"
         message = f"⚠️ ACCOUNT GATED: Risk score {risk_score:.2f} exceeds threshold (75). Transfer limit: ₹5,000"
     else:
@@ -313,16 +536,27 @@ def read_root():
     return {"message": "RegShield AML Engine is Running. Use /docs for API."}
 
 @app.get("/api/stream/live")
-async def stream_transactions():
+async def stream_transactions(mode: str = "tps", tps: float = DEFAULT_REPLAY_TPS, speed: float = 1.0,
+                              last_event_id: Optional[str] = Header(None)):
     """
     Server-Sent Events endpoint for live transaction monitoring simulation.
+    Clients share one running feed; the pacing below only applies when a
+    client starts the feed.
+    mode=tps replays `tps` rows per second (default: one every 1.5s),
+    mode=realtime follows the original timestamps sped up `speed` times,
+    mode=max replays as fast as the engine allows.
+    Event ids are ledger ids: a reconnect with Last-Event-ID catches up from
+    the ledger and resumes where the feed left off.
     """
-    return StreamingResponse(
-        stream_live_transactions_generator(
-            data_loader, 
-            aml_engine, 
-            provenance_manager,
-            generate_str_report
-        ),
-        media_type="text/event-stream"
-    )
+    try:
+        pacer = ReplayPacer(mode, tps=tps, speed=speed)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    # A malformed Last-Event-ID is treated as a fresh connection
+    resume_after = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(broadcast_hub.subscribe(pacer, resume_after), media_type="text/event-stream")
+
+@app.get("/api/stream/stats")
+def stream_stats():
+    """Live feed subscribers, their buffer lag and slow-client drops."""
+    return broadcast_hub.stats()
@@ -0,0 +1,217 @@
+"""
+Live Feed Broadcast Hub
+One producer evaluates the live feed; every /api/stream/live client reads a copy.
+
+The producer starts with the first subscriber and stops when the feed completes
+or the last subscriber leaves, so each transaction is evaluated, logged to the
+ledger and queued for an STR once no matter how many dashboards are open.
+
+Every subscriber has a bounded buffer. The producer never waits on a client:
+when a buffer is full, the slow client either loses its oldest undelivered
+events ("coalesce", it is told how many were skipped) or is disconnected
+("drop").
+
+A client reconnecting with a Last-Event-ID first catches up from the ledger
+(via the `catch_up` hook) and then continues on the live feed, skipping live
+events it has already been sent.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import deque
+
+BROADCAST_BUFFER_SIZE = int(os.getenv("BROADCAST_BUFFER_SIZE", "256"))
+BROADCAST_SLOW_CLIENT_POLICY = os.getenv("BROADCAST_SLOW_CLIENT_POLICY", "coalesce")
+SLOW_CLIENT_POLICIES = ("coalesce", "drop")
+
+_END = object()
+
+
+class _Subscriber:
+    def __init__(self, sub_id, buffer_size):
+        self.id = sub_id
+        self.buffer = deque()  # (published_at, event) pairs
+        self.ready = asyncio.Event()
+        self.buffer_size = buffer_size
+        self.connected_at = time.monotonic()
+        self.delivered = 0
+        self.skipped = 0
+        self.unreported_skips = 0
+        self.closed = False
+
+    def push(self, event):
+        self.buffer.append((time.monotonic(), event))
+        self.ready.set()
+
+    async def next(self):
+        while not self.buffer:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.buffer.popleft()[1]
+
+    def lag_seconds(self):
+        """Age of the oldest event still waiting in this client's buffer."""
+        return time.monotonic() - self.buffer[0][0] if self.buffer else 0.0
+
+
+class BroadcastHub:
+    def __init__(self, source_factory, buffer_size=BROADCAST_BUFFER_SIZE,
+                 slow_client_policy=BROADCAST_SLOW_CLIENT_POLICY, catch_up=None, event_id=None):
+        """
+        Args:
+            source_factory (callable): source_factory(pacer, resume) -> async iterator of SSE event strings;
+                resume is True when the feed is restarted by a reconnecting client.
+            buffer_size (int): Events buffered per subscriber before the slow-client policy applies.
+            slow_client_policy (str): "coalesce" skips a slow client's oldest events, "drop" disconnects it.
+            catch_up (callable, optional): catch_up(last_event_id) -> async iterator of the events
+                published after that id.
+            event_id (callable, optional): event_id(event) -> ordered id of a published event, or None.
+        """
+        if slow_client_policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy: {slow_client_policy}")
+        self.source_factory = source_factory
+        self.catch_up = catch_up
+        self.event_id = event_id or (lambda event: None)
+        self.buffer_size = max(1, buffer_size)
+        self.slow_client_policy = slow_client_policy
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._producer = None
+        self._preamble = None
+        self.mode = None
+        self.events_published = 0
+        self.clients_dropped = 0
+        self.runs = 0
+
+    @property
+    def running(self):
+        return self._producer is not None and not self._producer.done()
+
+    async def subscribe(self, pacer, last_event_id=None):
+        """
+        Async generator of SSE events for one client. Joins the running feed, or
+        starts one paced by `pacer` (a running feed keeps its original pacing).
+        Late joiners first get the feed's opening event so they know its size.
+
+        With last_event_id, the client first gets every event after that id
+        from `catch_up`, and a feed it restarts resumes instead of starting over.
+        """
+        resuming = last_event_id is not None and self.catch_up is not None
+        # Registered before catching up, so events published meanwhile are buffered
+        subscriber = _Subscriber(next(self._ids), self.buffer_size)
+        self._subscribers[subscriber.id] = subscriber
+        if not self.running:
+            self._start(pacer, resume=resuming)
+        elif self._preamble is not None and not resuming:
+            subscriber.push(self._preamble)
+        try:
+            seen = None
+            if resuming:
+                seen = last_event_id
+                async for event in self.catch_up(last_event_id):
+                    seen = self.event_id(event)
+                    subscriber.delivered += 1
+                    yield event
+            while True:
+                event = await subscriber.next()
+                if event is _END:
+                    return
+                ledger_id = self.event_id(event)
+                if seen is not None and ledger_id is not None and ledger_id <= seen:
+                    continue  # Already sent during catch-up
+                if subscriber.unreported_skips:
+                    yield f"data: {json.dumps({'status': 'lagged', 'skipped': subscriber.unreported_skips})}\n\n"
+                    subscriber.unreported_skips = 0
+                subscriber.delivered += 1
+                yield event
+        finally:
+            self._subscribers.pop(subscriber.id, None)
+            if not self._subscribers and self.running:
+                # Nobody is watching: stop evaluating, as a lone client's disconnect always did.
+                # Forgotten right away, so a client joining before it winds down starts a new one.
+                self._producer.cancel()
+                self._producer = None
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "mode": self.mode,
+            "runs": self.runs,
+            "subscribers": len(self._subscribers),
+            "events_published": self.events_published,
+            "clients_dropped": self.clients_dropped,
+            "slow_client_policy": self.slow_client_policy,
+            "buffer_size": self.buffer_size,
+            "clients": [{
+                "id": s.id,
+                "connected_seconds": round(time.monotonic() - s.connected_at, 3),
+                "buffered": len(s.buffer),
+                "lag_seconds": round(s.lag_seconds(), 3),
+                "delivered": s.delivered,
+                "skipped": s.skipped
+            } for s in self._subscribers.values()]
+        }
+
+    async def close(self):
+        """Stops the producer and ends every subscriber's stream."""
+        if self.running:
+            self._producer.cancel()
+            try:
+                await self._producer
+            except asyncio.CancelledError:
+                pass
+        self._end_all()
+
+    def _start(self, pacer, resume=False):
+        self._preamble = None
+        self.mode = pacer.mode
+        self.runs += 1
+        self._producer = asyncio.create_task(self._produce(pacer, resume))
+
+    async def _produce(self, pacer, resume):
+        try:
+            async for event in self.source_factory(pacer, resume):
+                if self._preamble is None:
+                    self._preamble = event
+                self.publish(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Live feed producer failed: {e}")
+            self.publish(f"data: {json.dumps({'error': str(e)})}\n\n")
+        finally:
+            # A producer that was replaced must not end its successor's subscribers
+            if self._producer is asyncio.current_task():
+                self._end_all()
+
+    def publish(self, event):
+        """Fans one event out to every subscriber without waiting on any of them."""
+        self.events_published += 1
+        for subscriber in list(self._subscribers.values()):
+            if subscriber.closed:
+                continue
+            if len(subscriber.buffer) < subscriber.buffer_size:
+                subscriber.push(event)
+            elif self.slow_client_policy == "coalesce":
+                subscriber.buffer.popleft()
+                subscriber.push(event)
+                subscriber.skipped += 1
+                subscriber.unreported_skips += 1
+            else:
+                self.clients_dropped += 1
+                print(f"⚠️  Live feed client {subscriber.id} dropped: buffer of {subscriber.buffer_size} events full")
+                subscriber.buffer.clear()
+                self._end(subscriber)
+
+    @staticmethod
+    def _end(subscriber):
+        subscriber.closed = True
+        subscriber.push(_END)
+
+    def _end_all(self):
+        for subscriber in self._subscribers.values():
+            if not subscriber.closed:
+                self._end(subscriber)
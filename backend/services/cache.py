@@ -0,0 +1,38 @@
+"""
+LRU Cache
+Thread-safe, size-bounded least-recently-used cache shared by the services.
+
+The STR queue keeps finished reports in one and the STR generator keeps LLM
+responses in another; both are read and filled from several threads at once.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_size):
+        """
+        Args:
+            max_size (int): Entries kept; the least recently used one goes first.
+        """
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
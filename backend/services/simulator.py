@@ -5,70 +5,192 @@ Processes transactions from the dataset and streams them via Server-Sent Events
 
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import json
-import asyncio
-import pandas as pd
+
+from backend.core.provenance import ANCHOR_PENDING
+from backend.core.verification import connect_readonly
+from backend.services.replay import ReplayEngine, ReplayPacer, normalize_row
 
 router = APIRouter()
 
-async def stream_live_transactions_generator(data_loader, aml_engine, provenance_manager, generate_str_report):
+# Ledger rows read per query when a reconnecting client catches up
+CATCH_UP_PAGE_SIZE = 500
+
+STR_PENDING_TEXT = "STR report generating in background..."
+
+FEED_ROWS_SQL = (
+    "SELECT id, tx_data, score, decision, prev_hash, current_hash, eth_tx_hash, evaluation FROM compliance_log "
+    "WHERE id > ? AND json_extract(evaluation, '$.feed_index') IS NOT NULL ORDER BY id LIMIT ?"
+)
+LAST_FEED_INDEX_SQL = (
+    "SELECT json_extract(evaluation, '$.feed_index') FROM compliance_log "
+    "WHERE json_extract(evaluation, '$.feed_index') IS NOT NULL ORDER BY id DESC LIMIT 1"
+)
+
+async def stream_live_transactions_generator(data_loader, aml_engine, provenance_manager, str_queue, pacer=None,
+                                             resume=False):
     """
-    Generator function that streams transactions one by one
+    Generator function that streams transactions one by one.
+    Rows are replayed once through a ReplayEngine and paced by `pacer`
+    (default: one transaction every 1.5 seconds).
+    Each evaluated row is stored with its result and sent with its ledger id
+    as the SSE event id. With resume=True the feed continues after the last
+    row it logged instead of starting over.
+    STRs are queued on the STR workers; each finished report is pushed as a
+    named `str_report` event, so plain `message` listeners are unaffected.
     """
     if data_loader.transactions_df is None or data_loader.transactions_df.empty:
         yield f"data: {json.dumps({'error': 'No transactions available'})}\n\n"
         return
     
+    pacer = pacer or ReplayPacer()
+    replay = ReplayEngine(aml_engine, data_loader.account_lookup, data_loader.pep_screener, data_loader.account_flags)
     transactions = data_loader.transactions_df.to_dict(orient="records")
-    yield f"data: {json.dumps({'status': 'started', 'total': len(transactions)})}\n\n"
+    start_index = await run_in_threadpool(next_feed_index, provenance_manager.db_path) if resume else 0
+    # Rows already in the ledger only need to be folded into the replay state
+    for idx, tx_row in enumerate(transactions[:start_index]):
+        replay.record(normalize_row(idx, tx_row))
     
-    for idx, tx_row in enumerate(transactions):
-        await asyncio.sleep(1.5)  # Simulate network delay
+    started = {'status': 'started', 'total': len(transactions), 'mode': pacer.mode}
+    if resume:
+        started['resumed_from'] = start_index
+    yield f"data: {json.dumps(started)}\n\n"
+    pending_reports = []
+    
+    for idx in range(start_index, len(transactions)):
+        tx_row = transactions[idx]
+        await pacer.wait(idx - start_index, tx_row.get("Timestamp"))
+        
+        for event in collect_finished_reports(str_queue, pending_reports):
+            yield event
         
-        try:
-            tx_dict = {
-                "Transaction_ID": str(tx_row.get("Transaction_ID", f"TXN-{idx}")),
-                "Sender_Account_ID": str(tx_row.get("Sender_Account_ID", "")),
-                "Receiver_Account_ID": str(tx_row.get("Receiver_Account_ID", "")),
-                "Amount": float(tx_row.get("Amount", 0)),
-                "Timestamp": str(tx_row.get("Timestamp", "")),
-                "Currency": str(tx_row.get("Currency", "USD"))
-            }
-            
-            history_df = data_loader.transactions_df.iloc[:idx] if idx > 0 else pd.DataFrame()
-            
-            evaluation = aml_engine.evaluate_transaction(
-                tx_dict,
-                data_loader.account_lookup,
-                data_loader.pep_names,
-                history_df
-            )
-            
-            score = evaluation["total_score"]
-            decision = evaluation["decision"]
-            triggered_rules = evaluation["triggered_rules"]
-            
-            provenance_record = provenance_manager.log_transaction(tx_dict, score, decision)
-            
-            str_text = None
-            if score > 80:
-                str_text = generate_str_report(tx_dict, triggered_rules)
-            
-            result = {
-                "index": idx + 1,
-                "transaction_id": tx_dict["Transaction_ID"],
-                "risk_breakdown": evaluation["risk_breakdown"],
-                "total_score": score,
-                "decision": decision,
-                "provenance": provenance_record,
-                "triggered_rules": triggered_rules,
-                "str_report_text": str_text,
-                "transaction_details": tx_dict
-            }
-            
-            yield f"data: {json.dumps(result)}\n\n"
-            
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e), 'transaction_id': tx_row.get('Transaction_ID', 'unknown')})}\n\n"
+        # Evaluation and the ledger write block, so they run off the event loop
+        ledger_id, result = await run_in_threadpool(
+            replay_row, replay, provenance_manager, str_queue, pending_reports, idx, tx_row
+        )
+        yield feed_event(ledger_id, result)
     
+    for event in collect_finished_reports(str_queue, pending_reports):
+        yield event
     yield f"data: {json.dumps({'status': 'completed'})}\n\n"
+
+
+def feed_event(ledger_id, result):
+    """SSE message for one feed result; logged rows carry their ledger id as the event id."""
+    event_id = f"id: {ledger_id}\n" if ledger_id is not None else ""
+    return f"{event_id}data: {json.dumps(result)}\n\n"
+
+
+def event_ledger_id(event):
+    """Ledger id of a feed event, or None for status/error/report events."""
+    if not event.startswith("id: "):
+        return None
+    return int(event[4:event.index("\n")])
+
+
+def replay_row(replay, provenance_manager, str_queue, pending_reports, idx, tx_row):
+    """
+    Evaluates, logs and (if needed) queues an STR for one replayed row.
+    
+    Returns:
+        tuple: (ledger id or None if the row was rejected, event payload)
+    """
+    try:
+        tx_dict = normalize_row(idx, tx_row)
+        evaluation = replay.evaluate(tx_dict)
+        
+        score = evaluation["total_score"]
+        decision = evaluation["decision"]
+        triggered_rules = evaluation["triggered_rules"]
+        
+        provenance_record = provenance_manager.log_transaction(
+            tx_dict, score, decision, {**evaluation, "feed_index": idx}
+        )
+        
+        str_text = None
+        if score > 80:
+            str_queue.submit(tx_dict, triggered_rules)
+            pending_reports.append(tx_dict["Transaction_ID"])
+            str_text = STR_PENDING_TEXT
+        
+        return provenance_record["ledger_id"], {
+            "index": idx + 1,
+            "transaction_id": tx_dict["Transaction_ID"],
+            "risk_breakdown": evaluation["risk_breakdown"],
+            "total_score": score,
+            "decision": decision,
+            "provenance": provenance_record,
+            "triggered_rules": triggered_rules,
+            "str_report_text": str_text,
+            "transaction_details": tx_dict
+        }
+    except Exception as e:
+        return None, {'error': str(e), 'transaction_id': tx_row.get('Transaction_ID', 'unknown')}
+
+
+def next_feed_index(db_path):
+    """Dataset position after the newest row the live feed logged (0 if it never ran)."""
+    conn = connect_readonly(db_path)
+    try:
+        row = conn.execute(LAST_FEED_INDEX_SQL).fetchone()
+    finally:
+        conn.close()
+    return row[0] + 1 if row else 0
+
+
+def read_feed_events(db_path, str_queue, after_id, limit=CATCH_UP_PAGE_SIZE):
+    """
+    Rebuilds the SSE events for feed rows logged after ledger id `after_id`
+    from their stored results, without re-running any rules.
+    """
+    conn = connect_readonly(db_path)
+    try:
+        rows = conn.execute(FEED_ROWS_SQL, (after_id, limit)).fetchall()
+    finally:
+        conn.close()
+    events = []
+    for ledger_id, tx_data, score, decision, prev_hash, current_hash, eth_tx_hash, evaluation in rows:
+        tx_dict, evaluation = json.loads(tx_data), json.loads(evaluation)
+        str_text = None
+        if score > 80:
+            str_text = str_queue.get_report(tx_dict["Transaction_ID"]) or STR_PENDING_TEXT
+        events.append(feed_event(ledger_id, {
+            "index": evaluation["feed_index"] + 1,
+            "transaction_id": tx_dict["Transaction_ID"],
+            "risk_breakdown": evaluation["risk_breakdown"],
+            "total_score": score,
+            "decision": decision,
+            "provenance": {
+                "prev_hash": prev_hash,
+                "current_hash": current_hash,
+                "eth_tx_hash": eth_tx_hash or ANCHOR_PENDING,
+                "ledger_id": ledger_id
+            },
+            "triggered_rules": evaluation["triggered_rules"],
+            "str_report_text": str_text,
+            "transaction_details": tx_dict
+        }))
+    return events
+
+
+async def catch_up_events(db_path, str_queue, after_id):
+    """Feed events logged after `after_id`, read from the ledger page by page until it is exhausted."""
+    while True:
+        events = await run_in_threadpool(read_feed_events, db_path, str_queue, after_id)
+        for event in events:
+            yield event
+        if len(events) < CATCH_UP_PAGE_SIZE:
+            return
+        after_id = event_ledger_id(events[-1])
+
+
+def collect_finished_reports(str_queue, pending_reports):
+    """SSE `str_report` events for queued reports that are ready; drops them from pending_reports."""
+    events = []
+    for tx_id in list(pending_reports):
+        report = str_queue.get_report(tx_id)
+        if report is not None:
+            pending_reports.remove(tx_id)
+            events.append(f"event: str_report\ndata: {json.dumps({'transaction_id': tx_id, 'str_report_text': report})}\n\n")
+    return events
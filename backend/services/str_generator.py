@@ -1,26 +1,113 @@
 
+import hashlib
 import json
 import os
-import google.generativeai as genai
-from openai import OpenAI
-from groq import Groq
+import threading
 from dotenv import load_dotenv
 
+from backend.services.cache import LRUCache
+
+# Provider SDKs are imported inside their client factories below so a worker
+# only pays for (and loads) the one it is configured to use.
+
 load_dotenv()
 
-def generate_str_report(transaction_details, triggered_rules):
-    """
-    Generates a Suspicious Transaction Report (STR) using an LLM.
+SYSTEM_PROMPT = "You are a professional Compliance Reporting Assistant."
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_REPORT_CACHE_SIZE = int(os.getenv("LLM_REPORT_CACHE_SIZE", "512"))
+
+
+def _gemini_client(api_key):
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel('gemini-1.5-flash')
+    return lambda prompt: model.generate_content(prompt).text
+
+
+def _openai_client(api_key):
+    from openai import OpenAI
+    client = OpenAI(api_key=api_key)
+    
+    def complete(prompt):
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "system", "content": SYSTEM_PROMPT},
+                      {"role": "user", "content": prompt}]
+        )
+        return response.choices[0].message.content
+    return complete
+
+
+def _groq_client(api_key):
+    from groq import Groq
+    client = Groq(api_key=api_key)
     
+    def complete(prompt):
+        completion = client.chat.completions.create(
+            messages=[
+                {
+                    "role": "system",
+                    "content": SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": prompt,
+                }
+            ],
+            model=os.getenv("LLM_MODEL", "llama-3.3-70b-versatile"), 
+        )
+        return completion.choices[0].message.content
+    return complete
+
+
+# provider name -> factory(api_key) returning complete(prompt) -> text.
+# Clients are built once per (provider, key) and reused, so their HTTP
+# connection pools (keep-alive, TLS sessions) carry across reports.
+PROVIDERS = {
+    "gemini": _gemini_client,
+    "openai": _openai_client,
+    "groq": _groq_client,
+}
+
+_clients = {}
+_semaphores = {}
+_registry_lock = threading.Lock()
+_report_cache = LRUCache(LLM_REPORT_CACHE_SIZE)
+
+
+def register_provider(name, factory, max_concurrency=None):
+    """
+    Adds (or replaces) a provider, e.g. a local fake standing in for the network.
+
     Args:
-        transaction_details (dict): The confirmed transaction details.
-        triggered_rules (list): List of rule names/descriptions that triggered the flag.
-        
-    Returns:
-        str: The generated report text.
+        factory (callable): factory(api_key) -> complete(prompt) -> report text.
+        max_concurrency (int): In-flight calls allowed for this provider.
     """
-    
-    prompt = f"""
+    with _registry_lock:
+        PROVIDERS[name] = factory
+        for key in [key for key in _clients if key[0] == name]:
+            del _clients[key]
+        _semaphores[name] = threading.BoundedSemaphore(max_concurrency or _provider_concurrency(name))
+
+
+def _provider_concurrency(provider):
+    return int(os.getenv(f"LLM_MAX_CONCURRENCY_{provider.upper()}", LLM_MAX_CONCURRENCY))
+
+
+def _get_client(provider, api_key):
+    key = (provider, api_key)
+    with _registry_lock:
+        if key not in _clients:
+            _clients[key] = PROVIDERS[provider](api_key)
+        if provider not in _semaphores:
+            _semaphores[provider] = threading.BoundedSemaphore(_provider_concurrency(provider))
+        return _clients[key], _semaphores[provider]
+
+
+def build_prompt(transaction_details, triggered_rules):
+    # Canonical JSON (sorted keys) so equal inputs always produce the same prompt
+    return f"""
     You are a strictly regulated Compliance Reporting AI. 
     Your task is to draft a formal Suspicious Transaction Report (STR) for financial regulators. 
 
@@ -34,54 +121,56 @@ def generate_str_report(transaction_details, triggered_rules):
     {json.dumps(triggered_rules, indent=2)}
     
     TRANSACTION DETAILS:
-    {json.dumps(transaction_details, indent=2)}
+    {json.dumps(transaction_details, indent=2, sort_keys=True)}
     
     Draft the report now.
     """
 
+
+def prompt_cache_key(provider, prompt):
+    """Content address of a generation: provider, model and whitespace-normalized prompt."""
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(f"{provider}\0{os.getenv('LLM_MODEL', '')}\0{normalized}".encode()).hexdigest()
+
+
+def generate_str_report(transaction_details, triggered_rules, fallback=True):
+    """
+    Generates a Suspicious Transaction Report (STR) using an LLM.
+    
+    Args:
+        transaction_details (dict): The confirmed transaction details.
+        triggered_rules (list): List of rule names/descriptions that triggered the flag.
+        fallback (bool): On an LLM error, return the template report instead of raising.
+        
+    Returns:
+        str: The generated report text.
+    """
+    
+    prompt = build_prompt(transaction_details, triggered_rules)
+
     provider = os.getenv("LLM_PROVIDER", "mock").lower()
     api_key = os.getenv("LLM_API_KEY")
 
-    try:
-        if provider == "gemini" and api_key:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(prompt)
-            return response.text
-
-        elif provider == "openai" and api_key:
-            client = OpenAI(api_key=api_key)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "system", "content": "You are a professional Compliance Reporting Assistant."},
-                          {"role": "user", "content": prompt}]
-            )
-            return response.choices[0].message.content
-            
-        elif provider == "groq" and api_key:
-            client = Groq(api_key=api_key)
-            completion = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a professional Compliance Reporting Assistant."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model=os.getenv("LLM_MODEL", "llama-3.3-70b-versatile"), 
-            )
-            return completion.choices[0].message.content
-
-    except Exception as e:
-        print(f"LLM Generation Failed: {e}")
-        # FALLBACK: Generate mock STR if LLM fails
-        pass
+    if provider in PROVIDERS and api_key:
+        cache_key = prompt_cache_key(provider, prompt)
+        report = _report_cache.get(cache_key)
+        if report is not None:
+            return report
+        try:
+            complete, semaphore = _get_client(provider, api_key)
+            with semaphore:
+                report = complete(prompt)
+            _report_cache.put(cache_key, report)
+            return report
+        except Exception as e:
+            print(f"LLM Generation Failed: {e}")
+            if not fallback:
+                raise
+            # FALLBACK: Generate mock STR if LLM fails
     
     # Mock STR if no LLM provider configured or failed
     from datetime import datetime
+    violations = '\n'.join(f'• {rule}' for rule in triggered_rules)
     return f"""
 ═══════════════════════════════════════════════════════════════════
               SUSPICIOUS TRANSACTION REPORT (STR)
@@ -102,7 +191,7 @@ Timestamp: {transaction_details.get('Timestamp', 'N/A')}
 ─────────────────────────────────────────────────────────────────
 2. COMPLIANCE VIOLATIONS DETECTED
 ─────────────────────────────────────────────────────────────────
-{'\n'.join(f'• {rule}' for rule in triggered_rules)}
+{violations}
 
 ─────────────────────────────────────────────────────────────────
 3. REGULATORY ASSESSMENT
@@ -0,0 +1,215 @@
+"""
+STR Job Queue
+Generates Suspicious Transaction Reports on dedicated worker threads, off the
+request and SSE paths.
+
+Jobs are persisted in SQLite (one row per Transaction_ID, so re-submitting a
+transaction never queues a second LLM call) and survive restarts. Failed LLM
+calls are retried with exponential backoff; the last attempt falls back to the
+template report, as the inline path always did. Finished reports are served
+through a size-bounded LRU cache in front of the store.
+"""
+
+import json
+import os
+import queue
+import random
+import sqlite3
+import threading
+
+from backend.services.cache import LRUCache
+
+STR_WORKERS = int(os.getenv("STR_WORKERS", "2"))
+STR_MAX_ATTEMPTS = int(os.getenv("STR_MAX_ATTEMPTS", "3"))
+STR_RETRY_BACKOFF_SECONDS = float(os.getenv("STR_RETRY_BACKOFF_SECONDS", "2"))
+STR_CACHE_SIZE = int(os.getenv("STR_CACHE_SIZE", "256"))
+
+REPORTS_SCHEMA = '''CREATE TABLE IF NOT EXISTS str_reports
+             (tx_id TEXT PRIMARY KEY,
+              status TEXT,
+              payload TEXT,
+              report TEXT,
+              attempts INTEGER DEFAULT 0,
+              last_error TEXT,
+              created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+              updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)'''
+
+# Statuses: queued -> running -> done, with retrying in between failed attempts
+ACTIVE_STATUSES = ("queued", "running", "retrying")
+
+_STOP = object()
+
+
+class ReportStore:
+    """SQLite-backed job and report table."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(REPORTS_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def create(self, tx_id, payload):
+        """
+        Registers a job; returns False if the transaction already has a live or
+        finished job (failed jobs are re-queued).
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO str_reports (tx_id, status, payload) VALUES (?, 'queued', ?) "
+                "ON CONFLICT(tx_id) DO UPDATE SET status = 'queued', payload = excluded.payload, attempts = 0, "
+                "last_error = NULL, updated_at = CURRENT_TIMESTAMP WHERE str_reports.status = 'failed'",
+                (tx_id, json.dumps(payload))
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def update(self, tx_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE str_reports SET {columns}, updated_at = CURRENT_TIMESTAMP WHERE tx_id = ?",
+                (*fields.values(), tx_id)
+            )
+            self._conn.commit()
+
+    def get(self, tx_id):
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM str_reports WHERE tx_id = ?", (tx_id,))
+            row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    def active_jobs(self):
+        with self._lock:
+            placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+            return [r[0] for r in self._conn.execute(
+                f"SELECT tx_id FROM str_reports WHERE status IN ({placeholders}) ORDER BY created_at", ACTIVE_STATUSES
+            )]
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM str_reports GROUP BY status").fetchall())
+
+
+class STRQueue:
+    def __init__(self, generate_fn, store, workers=STR_WORKERS, max_attempts=STR_MAX_ATTEMPTS,
+                 backoff_seconds=STR_RETRY_BACKOFF_SECONDS, cache_size=STR_CACHE_SIZE):
+        """
+        Args:
+            generate_fn (callable): generate_fn(tx_dict, triggered_rules, fallback) -> report text.
+                With fallback=False it must raise on provider errors so the job can retry.
+            store (ReportStore): Persistent job/report table.
+            workers (int): Concurrent report generations.
+            max_attempts (int): Attempts before the template fallback is used.
+            backoff_seconds (float): Base delay, doubled per failed attempt (with jitter).
+        """
+        self.generate_fn = generate_fn
+        self.store = store
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.cache = LRUCache(cache_size)
+        self._queue = queue.Queue()
+        self._timers = set()
+        self._timers_lock = threading.Lock()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"str-worker-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+        # Resume jobs interrupted by a restart
+        for tx_id in store.active_jobs():
+            self._queue.put(tx_id)
+
+    def submit(self, tx_dict, triggered_rules):
+        """Queues STR generation for a transaction; duplicates of a known Transaction_ID are ignored."""
+        tx_id = tx_dict["Transaction_ID"]
+        if self.store.create(tx_id, {"tx": tx_dict, "rules": triggered_rules}):
+            self._queue.put(tx_id)
+            return True
+        return False
+
+    def get_report(self, tx_id):
+        """Finished report text, or None if unknown or still generating."""
+        report = self.cache.get(tx_id)
+        if report is not None:
+            return report
+        job = self.store.get(tx_id)
+        if job is None or job["status"] != "done":
+            return None
+        self.cache.put(tx_id, job["report"])
+        return job["report"]
+
+    def status(self, tx_id):
+        job = self.store.get(tx_id)
+        if job is None:
+            return None
+        return {key: job[key] for key in ("tx_id", "status", "attempts", "last_error", "created_at", "updated_at")}
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "cached": len(self.cache), "jobs": self.store.counts()}
+
+    def close(self, timeout=5):
+        """Stops the workers; unfinished jobs stay queued in the store."""
+        self._closed = True
+        with self._timers_lock:
+            for timer in self._timers:
+                timer.cancel()
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self.store.close()
+
+    def _run(self):
+        while True:
+            tx_id = self._queue.get()
+            if tx_id is _STOP:
+                return
+            try:
+                self._process(tx_id)
+            except Exception as e:
+                print(f"❌ STR worker error for {tx_id}: {e}")
+
+    def _process(self, tx_id):
+        job = self.store.get(tx_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            return
+        payload = json.loads(job["payload"])
+        attempt = job["attempts"] + 1
+        self.store.update(tx_id, status="running", attempts=attempt)
+        try:
+            # The final attempt may fall back to the template report instead of failing
+            report = self.generate_fn(payload["tx"], payload["rules"], fallback=attempt >= self.max_attempts)
+        except Exception as e:
+            if attempt >= self.max_attempts:
+                self.store.update(tx_id, status="failed", last_error=str(e))
+                print(f"❌ STR Generation failed for {tx_id}: {e}")
+                return
+            delay = self.backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            self.store.update(tx_id, status="retrying", last_error=str(e))
+            print(f"⚠️  STR Generation for {tx_id} failed ({e}) - retrying in {delay:.1f}s")
+            self._schedule(tx_id, delay)
+            return
+        self.store.update(tx_id, status="done", report=report)
+        self.cache.put(tx_id, report)
+        print(f"✅ STR Report generated and stored for {tx_id}")
+
+    def _schedule(self, tx_id, delay):
+        def requeue():
+            with self._timers_lock:
+                self._timers.discard(timer)
+            if not self._closed:
+                self._queue.put(tx_id)
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self._timers_lock:
+            self._timers.add(timer)
+        timer.start()
@@ -8,12 +8,66 @@ import pandas as pd
 from datetime import datetime, timedelta
 from backend.core.aml_engine import AMLEngine
 from backend.core.provenance import ProvenanceManager
+from backend.core.graph_index import TransactionGraph
+from backend.core.windows import SenderWindows, to_epoch_seconds
+from backend.core.account_flags import FLAG_GATED, FLAG_KYC_INCOMPLETE, FLAG_PEP, AccountFlags
+from backend.core.screening import PEPScreener, normalize_name
+from backend.core.sketches import SKETCH_EXACT_LIMIT, ReceiverWindows
+from backend.core.store import TransactionStore, EPOCH_COLUMN
+from backend.core.snapshot import SnapshotCache, PARQUET_AVAILABLE
+from backend.core.ledger_writer import GroupCommitWriter
+from backend.core.locks import KeyedLocks, ReadWriteLock
+from backend.core.ingestion import DataLoader
+from backend.core.shared_state import SharedEngineState
+from backend.core import sharded
+from backend.core.sharded import EdgeDelta, EdgeIndex, ShardedEvaluator
+from backend.core.merkle import inclusion_proof, merkle_root, verify_proof
+from backend.core.provenance import ANCHOR_PENDING
+from backend.core.ledger_query import stream_page, ledger_timestamp
+from backend.services.cache import LRUCache
+from backend.services.str_queue import ReportStore, STRQueue
+from backend.services.str_generator import generate_str_report, register_provider
+from backend.services.replay import ReplayEngine, ReplayPacer
+from backend.services.simulator import (
+    event_ledger_id, read_feed_events, stream_live_transactions_generator
+)
+from backend.services.broadcast import BroadcastHub
+import asyncio
 import hashlib
 import json
 import os
+import random
 import sqlite3
 
 
+
+@pytest.fixture
+def account_db():
+    """Master data for the batch, replay and sharded evaluation tests"""
+    return {
+        "ACC-001": {"Name": "John Doe", "KYC_Status": "Verified", "Declared_Income": 50000, "Country": "USA"},
+        "ACC-002": {"Name": "Panama Holdings", "KYC_Status": "Incomplete", "Declared_Income": 20000, "Country": "Panama"},
+        "ACC-003": {"Name": "Jane Smith", "KYC_Status": "Verified", "Declared_Income": 30000, "Country": "USA",
+                    "Account_Status": "Gated_5000_Limit"},
+    }
+
+
+def random_transactions(n, seed, minutes, accounts, receivers=None, start=0):
+    """
+    Reproducible transfers between ACC-001..ACC-<accounts>, one every `minutes`
+    from 2024-01-01; receivers come from the first `receivers` accounts (default all).
+    """
+    rng = random.Random(seed)
+    base_time = datetime(2024, 1, 1)
+    ids = [f"ACC-{k:03d}" for k in range(1, accounts + 1)]
+    return [{
+        "Transaction_ID": f"TX-{start + i}",
+        "Sender_Account_ID": rng.choice(ids),
+        "Receiver_Account_ID": rng.choice(ids[:receivers]),
+        "Amount": rng.choice([800, 3200.5, 4999, 7000, 21000]),
+        "Timestamp": (base_time + timedelta(minutes=minutes * (start + i))).strftime("%Y-%m-%d %H:%M:%S"),
+    } for i in range(n)]
+
 class TestAMLEngine:
     """Test suite for AML evaluation logic"""
     
@@ -80,6 +134,31 @@ class TestAMLEngine:
         assert "Structuring" in str(result["triggered_rules"])
         assert result["total_score"] >= 30
     
+    def test_structuring_compares_unrounded_total(self, aml_engine, sample_account_db, sample_pep_db):
+        """A total a fraction of a cent over the threshold still triggers, in both paths"""
+        base_time = datetime.now()
+        history_df = pd.DataFrame([
+            {"Sender_Account_ID": "ACC-001", "Receiver_Account_ID": "ACC-003",
+             "Amount": 4000, "Timestamp": (base_time - timedelta(hours=2)).strftime("%Y-%m-%d %H:%M:%S")},
+            {"Sender_Account_ID": "ACC-001", "Receiver_Account_ID": "ACC-003",
+             "Amount": 3000, "Timestamp": (base_time - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")},
+        ])
+        txs = [
+            {"Sender_Account_ID": "ACC-001", "Receiver_Account_ID": "ACC-003",
+             "Amount": 3000.002, "Timestamp": (base_time - timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S")},
+            {"Sender_Account_ID": "ACC-001", "Receiver_Account_ID": "ACC-003",
+             "Amount": 0.002, "Timestamp": base_time.strftime("%Y-%m-%d %H:%M:%S")},
+        ]
+        
+        # 10000.004 is over the threshold even though it rounds to 10000.0
+        result = aml_engine.evaluate_transaction(txs[1], sample_account_db, sample_pep_db,
+                                                 pd.concat([history_df, pd.DataFrame(txs[:1])], ignore_index=True))
+        batch = aml_engine.evaluate_batch(txs, sample_account_db, sample_pep_db, history_df)
+        
+        assert result["risk_breakdown"]["structuring"] == 30
+        assert "Structuring: total 10000.0 > threshold 10000" in str(result["triggered_rules"])
+        assert batch[1] == result
+    
     def test_structuring_under_threshold(self, aml_engine, sample_account_db, sample_pep_db, empty_history):
         """Test structuring rule: Single transaction under threshold"""
         tx = {
@@ -311,6 +390,39 @@ class TestProvenanceManager:
         assert hash1 == hash2
         assert len(hash1) == 64  # SHA-256 produces 64-character hex string
     
+    def test_records_carry_ledger_ids_and_evaluations(self, provenance_manager, temp_db_path):
+        """Each record names its compliance_log row; the evaluation is stored beside the chained data"""
+        evaluation = {"total_score": 85, "risk_breakdown": {"pep": 85}, "triggered_rules": ["PEP"]}
+        first = provenance_manager.log_transaction({"Transaction_ID": "TX-1"}, 85, "Generate STR", evaluation)
+        records = provenance_manager.log_transactions([
+            ({"Transaction_ID": "TX-2"}, 10, "Approve"),
+            ({"Transaction_ID": "TX-3"}, 20, "Approve", {"total_score": 20}),
+        ])
+        provenance_manager.close()
+        
+        conn = sqlite3.connect(temp_db_path)
+        rows = conn.execute("SELECT id, tx_id, evaluation FROM compliance_log ORDER BY id").fetchall()
+        conn.close()
+        assert [first["ledger_id"]] + [r["ledger_id"] for r in records] == [row[0] for row in rows]
+        assert json.loads(rows[0][2]) == evaluation
+        assert rows[1][2] is None
+        assert json.loads(rows[2][2]) == {"total_score": 20}
+    
+    def test_adds_evaluation_column_to_existing_ledger(self, temp_db_path):
+        conn = sqlite3.connect(temp_db_path)
+        conn.execute("CREATE TABLE compliance_log (id INTEGER PRIMARY KEY AUTOINCREMENT, tx_id TEXT, tx_data TEXT, "
+                     "score INTEGER, decision TEXT, prev_hash TEXT, current_hash TEXT, eth_tx_hash TEXT, "
+                     "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        conn.close()
+        
+        pm = ProvenanceManager(db_path=temp_db_path)
+        pm.log_transaction({"Transaction_ID": "TX-1"}, 10, "Approve", {"total_score": 10})
+        pm.close()
+        
+        conn = sqlite3.connect(temp_db_path)
+        assert conn.execute("SELECT evaluation FROM compliance_log").fetchone() == ('{"total_score": 10}',)
+        conn.close()
+    
     def test_hash_changes_with_data(self, provenance_manager):
         """Test hash changes when transaction data changes"""
         tx_data1 = {"Transaction_ID": "TX-001", "Amount": 1000}
@@ -373,9 +485,1807 @@ class TestProvenanceManager:
         result = provenance_manager.log_transaction(tx, 50, "Clear")
         
         assert result["prev_hash"] == "GENESIS_HASH"
+    
+    def test_concurrent_logging_keeps_single_chain(self, provenance_manager):
+        """Concurrent writers never fork the hash chain"""
+        import threading
+        
+        def writer(worker):
+            for i in range(25):
+                provenance_manager.log_transaction({"Transaction_ID": f"TX-{worker}-{i}", "Amount": i}, 10, "Clear")
+        
+        threads = [threading.Thread(target=writer, args=(w,)) for w in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert provenance_manager.verify_ledger() == "VERIFIED"
+    
+    def test_chain_head_survives_restart(self, provenance_manager, temp_db_path):
+        """A new manager resumes from the persisted head and uses WAL journaling"""
+        record = provenance_manager.log_transaction({"Transaction_ID": "TX-001", "Amount": 1000}, 50, "Clear")
+        provenance_manager.close()
+        
+        reopened = ProvenanceManager(db_path=temp_db_path)
+        assert reopened.get_latest_hash() == record["current_hash"]
+        assert reopened._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+class TestLedgerVerification:
+    """Test suite for checkpointed and parallel ledger verification"""
+    
+    @pytest.fixture
+    def pm(self, tmp_path):
+        pm = ProvenanceManager(db_path=str(tmp_path / "verify.db"), anchor_mode="per_tx")
+        pm.checkpoint_lag = 5
+        pm.verify_segment_rows = 4
+        pm.log_transactions([({"Transaction_ID": f"TX-{i}", "Amount": i}, 10, "Clear") for i in range(20)])
+        yield pm
+        pm.close()
+    
+    @staticmethod
+    def tamper(pm, ledger_id):
+        conn = sqlite3.connect(pm.db_path)
+        conn.execute("UPDATE compliance_log SET score = score + 1 WHERE id = ?", (ledger_id,))
+        conn.commit()
+        conn.close()
+    
+    def test_incremental_resumes_from_checkpoint(self, pm):
+        """Routine checks only walk rows after the trailing checkpoint"""
+        first = pm.verify_ledger_report()
+        assert (first["status"], first["rows_checked"], first["resumed_from"]) == ("VERIFIED", 20, 0)
+        
+        pm.log_transactions([({"Transaction_ID": f"TX-{i}", "Amount": i}, 10, "Clear") for i in range(20, 25)])
+        second = pm.verify_ledger_report()
+        assert (second["status"], second["rows_checked"], second["resumed_from"]) == ("VERIFIED", 10, 15)
+        
+        self.tamper(pm, 23)
+        report = pm.verify_ledger_report()
+        assert (report["status"], report["first_tampered_id"]) == ("TAMPERED", 23)
+    
+    def test_forged_checkpoint_is_ignored(self, pm):
+        """A checkpoint without a valid signature is not trusted"""
+        conn = sqlite3.connect(pm.db_path)
+        conn.execute("INSERT INTO verification_checkpoints (ledger_id, head_hash, signature) VALUES (20, 'x', 'forged')")
+        conn.commit()
+        conn.close()
+        
+        assert pm.verify_ledger_report()["resumed_from"] == 0
+    
+    def test_full_audit_reports_first_tampered_row(self, pm, monkeypatch):
+        """Parallel full audit agrees with a sequential walk and finds the earliest tampered row"""
+        monkeypatch.setattr(os, "cpu_count", lambda: 2)  # Use the process pool even on one core
+        assert pm.verify_ledger_report("full")["status"] == "VERIFIED"
+        assert pm.verify_ledger_report("full")["rows_checked"] == 20
+        
+        self.tamper(pm, 14)
+        self.tamper(pm, 3)
+        report = pm.verify_ledger_report("full")
+        assert (report["status"], report["first_tampered_id"]) == ("TAMPERED", 3)
+
+
+class TestLedgerQuery:
+    """Test suite for keyset-paginated ledger queries"""
+    
+    @pytest.fixture
+    def pm(self, tmp_path):
+        pm = ProvenanceManager(db_path=str(tmp_path / "query.db"), anchor_mode="per_tx")
+        decisions = ["Clear", "Flagged", "STR"]
+        pm.log_transactions([
+            ({"Transaction_ID": f"TX-{i % 20}", "Amount": i}, (i * 7) % 5 * 20, decisions[i % 3]) for i in range(25)
+        ])
+        yield pm
+        pm.close()
+    
+    @staticmethod
+    def read_all(pm, by, params, limit):
+        """Follows next_cursor until the last page; returns row ids in page order"""
+        ids, cursor, pages = [], None, 0
+        while True:
+            lines = [json.loads(line) for line in stream_page(pm.db_path, by, params, cursor, limit)]
+            assert len(lines) <= limit + 1
+            ids += [row["id"] for row in lines[:-1]]
+            cursor, pages = lines[-1]["next_cursor"], pages + 1
+            if cursor is None:
+                return ids, pages
+    
+    def test_equality_queries_page_in_id_order(self, pm):
+        """Decision and tx_id lookups return every match exactly once, in ledger order"""
+        ids, pages = self.read_all(pm, "decision", ("Flagged",), 3)
+        assert ids == [i + 1 for i in range(25) if i % 3 == 1]
+        assert pages == 3
+        
+        ids, _ = self.read_all(pm, "tx_id", ("TX-2",), 1)
+        assert ids == [3, 23]
+    
+    def test_range_queries_resume_within_equal_keys(self, pm):
+        """Score ranges page in (score, id) order even when a page ends mid-score"""
+        conn = sqlite3.connect(pm.db_path)
+        expected = [r[0] for r in conn.execute(
+            "SELECT id FROM compliance_log WHERE score BETWEEN 20 AND 60 ORDER BY score, id"
+        )]
+        conn.close()
+        ids, _ = self.read_all(pm, "score", (20, 60), 4)
+        assert ids == expected
+        
+        bounds = (ledger_timestamp("2000-01-01T00:00:00+00:00"), ledger_timestamp("2100-01-01T00:00:00"))
+        ids, _ = self.read_all(pm, "timestamp", bounds, 7)
+        assert sorted(ids) == list(range(1, 26))
+    
+    def test_bad_cursor_rejected_before_streaming(self, pm):
+        with pytest.raises(ValueError):
+            stream_page(pm.db_path, "decision", ("Clear",), "not-a-cursor")
+
+
+class TestGroupCommitWriter:
+    """Test suite for the group-commit ledger writer"""
+    
+    def test_groups_rows_and_returns_each_callers_records(self):
+        """Rows queued together share one commit; each Future gets its own slice"""
+        import threading
+        started, release = threading.Event(), threading.Event()
+        commits = []
+        
+        def commit(entries):
+            started.set()
+            release.wait(5)  # Hold the first commit so later submissions pile up
+            commits.append(list(entries))
+            return [entry * 10 for entry in entries]
+        
+        writer = GroupCommitWriter(commit, max_rows=100)
+        first = writer.submit([1])
+        assert started.wait(5)
+        later = [writer.submit([i, i + 1]) for i in range(2, 12, 2)]
+        release.set()
+        
+        assert first.result(5) == [10]
+        assert [f.result(5) for f in later] == [[20, 30], [40, 50], [60, 70], [80, 90], [100, 110]]
+        assert len(commits) == 2  # One for the first row, one for everything that queued behind it
+        writer.close()
+    
+    def test_commit_failure_propagates_to_callers(self):
+        """A failed group commit fails every Future in that group"""
+        def commit(entries):
+            raise sqlite3.OperationalError("disk I/O error")
+        
+        writer = GroupCommitWriter(commit)
+        with pytest.raises(sqlite3.OperationalError):
+            writer.submit([1]).result(5)
+        writer.close()
+        
+        with pytest.raises(RuntimeError):
+            writer.submit([2]).result(5)
+    
+    def test_poisoned_entry_only_fails_its_caller(self):
+        """A group that fails is retried caller by caller; the others still commit"""
+        import threading
+        started, release = threading.Event(), threading.Event()
+        committed = []
+        
+        def commit(entries):
+            started.set()
+            release.wait(5)
+            if "poison" in entries:
+                raise sqlite3.IntegrityError("bad row")
+            committed.extend(entries)
+            return [f"rec-{entry}" for entry in entries]
+        
+        writer = GroupCommitWriter(commit, max_rows=100)
+        first = writer.submit(["a"])
+        assert started.wait(5)
+        # These three queue up behind the first commit and form one group
+        before, poisoned, after = writer.submit(["b", "c"]), writer.submit(["d", "poison"]), writer.submit(["e"])
+        release.set()
+        
+        assert first.result(5) == ["rec-a"]
+        assert before.result(5) == ["rec-b", "rec-c"]
+        assert after.result(5) == ["rec-e"]
+        with pytest.raises(sqlite3.IntegrityError):
+            poisoned.result(5)
+        # The poisoned caller's other entry rolled back with it
+        assert committed == ["a", "b", "c", "e"]
+        assert writer.rows_committed == 4
+        writer.close()
+
+
+class TestMerkleAnchoring:
+    """Test suite for Merkle-batched anchoring and inclusion proofs"""
+    
+    def test_every_leaf_proves_against_root(self):
+        """Proofs verify for odd and even batch sizes and fail for a rewritten leaf"""
+        for size in range(1, 10):
+            leaves = [hashlib.sha256(f"row-{i}".encode()).hexdigest() for i in range(size)]
+            root = merkle_root(leaves)
+            for i, leaf in enumerate(leaves):
+                assert verify_proof(leaf, inclusion_proof(leaves, i), root)
+            forged = hashlib.sha256(b"forged").hexdigest()
+            assert not verify_proof(forged, inclusion_proof(leaves, 0), root)
+    
+    def test_batch_anchors_pending_rows(self, tmp_path):
+        """Rows stay pending until their batch root is anchored, then prove inclusion"""
+        pm = ProvenanceManager(db_path=str(tmp_path / "merkle.db"), anchor_mode="merkle")
+        records = pm.log_transactions([({"Transaction_ID": f"TX-{i}", "Amount": i}, 10, "Clear") for i in range(5)])
+        assert all(r["eth_tx_hash"] == ANCHOR_PENDING for r in records)
+        assert pm.get_inclusion_proof("TX-3")["status"] == "PENDING"
+        assert pm.get_inclusion_proof("TX-404") is None
+        
+        batch = pm.anchor_pending_batch()
+        assert batch["leaf_count"] == 5
+        assert batch["merkle_root"] == merkle_root([r["current_hash"] for r in records])
+        assert pm.anchor_pending_batch() is None
+        
+        proof = pm.get_inclusion_proof("TX-3")
+        assert proof["status"] == "ANCHORED"
+        assert proof["verified"]
+        
+        # The root is anchored by the worker, which backfills every covered row
+        assert pm.anchor_worker.drain()
+        proof = pm.get_inclusion_proof("TX-3")
+        assert proof["eth_tx_hash"].startswith("0x")
+        hashes = {row[0] for row in pm._conn.execute("SELECT eth_tx_hash FROM compliance_log")}
+        assert hashes == {proof["eth_tx_hash"]}
+        assert pm.verify_ledger() == "VERIFIED"
+        pm.close()
+    
+    def test_workers_share_one_batcher(self, tmp_path):
+        """With two managers on one ledger, only the leader seals batches and they never overlap"""
+        import threading
+        
+        db_path = str(tmp_path / "merkle.db")
+        leader = ProvenanceManager(db_path=db_path, anchor_mode="merkle")
+        follower = ProvenanceManager(db_path=db_path, anchor_mode="merkle")
+        try:
+            assert leader._anchor_thread is not None and leader.anchor_worker is not None
+            assert follower._anchor_thread is None and follower.anchor_worker is None
+            
+            errors = []
+            
+            def seal(pm):
+                try:
+                    pm.anchor_pending_batch()
+                except Exception as e:
+                    errors.append(e)
+            
+            for i in range(40):
+                (leader if i % 2 else follower).log_transaction({"Transaction_ID": f"TX-{i}"}, i, "Approve")
+                if i % 10 == 9:
+                    # Explicit seals from both managers at once must not collide
+                    sealers = [threading.Thread(target=seal, args=(pm,)) for pm in (leader, follower)]
+                    for sealer in sealers:
+                        sealer.start()
+                    for sealer in sealers:
+                        sealer.join()
+        finally:
+            follower.close()
+            leader.close()
+        
+        conn = sqlite3.connect(db_path)
+        try:
+            batches = conn.execute("SELECT first_id, last_id FROM merkle_batches ORDER BY first_id").fetchall()
+        finally:
+            conn.close()
+        covered = [row_id for first_id, last_id in batches for row_id in range(first_id, last_id + 1)]
+        assert covered == list(range(1, 41))
+        assert not errors
+
+
+class TestAnchorQueue:
+    """Test suite for the asynchronous anchoring queue"""
+    
+    class FakeChain:
+        """Minimal stand-in for a node: accepts sends, mines on demand"""
+        def __init__(self, start_nonce=7):
+            self.start_nonce = start_nonce
+            self.sent = {}
+            self.mined = set()
+            self.eth = self
+            self.gas_price = 1
+        
+        def get_transaction_count(self, address, block="latest"):
+            return self.start_nonce
+        
+        def get_transaction_receipt(self, tx_hash):
+            if tx_hash not in self.mined:
+                raise LookupError("not mined")
+            return {"status": 1, "blockNumber": 1}
+        
+        def send(self, audit_hash, risk_score, nonce, gas_price):
+            tx_hash = "0x" + hashlib.sha256(f"{audit_hash}{nonce}".encode()).hexdigest()
+            self.sent[tx_hash] = nonce
+            return tx_hash
+        
+        def mine(self):
+            self.mined.update(self.sent)
+    
+    def test_logging_enqueues_and_mock_resolves_offline(self, tmp_path):
+        """Without a configured chain, queued anchors resolve to mock hashes"""
+        pm = ProvenanceManager(db_path=str(tmp_path / "queue.db"), anchor_mode="queue")
+        pm.contract_address = None
+        records = pm.log_transactions([({"Transaction_ID": f"TX-{i}", "Amount": i}, 10, "Clear") for i in range(3)])
+        assert all(r["eth_tx_hash"] == ANCHOR_PENDING for r in records)
+        
+        assert pm.anchor_worker.drain()
+        statuses = [row[0] for row in pm._conn.execute("SELECT status FROM anchor_queue ORDER BY id")]
+        assert statuses == ["mock"] * 3
+        assert all(row[0].startswith("0x") for row in pm._conn.execute("SELECT eth_tx_hash FROM compliance_log"))
+        pm.close()
+    
+    def test_anchors_in_flight_with_local_nonces(self, tmp_path):
+        """Anchors are sent with consecutive nonces and backfilled once mined"""
+        pm = ProvenanceManager(db_path=str(tmp_path / "queue.db"), anchor_mode="queue")
+        chain = self.FakeChain()
+        pm._w3, pm.sender_address = chain, "0xSender"
+        pm.chain_ready = lambda: True
+        pm.send_audit = chain.send
+        
+        pm.log_transactions([({"Transaction_ID": f"TX-{i}", "Amount": i}, 10, "Clear") for i in range(5)])
+        pm.anchor_worker.run_once()
+        assert sorted(chain.sent.values()) == [7, 8, 9, 10, 11]
+        assert pm.anchor_worker.pending_count() == 5  # All in flight, none mined
+        
+        chain.mine()
+        assert pm.anchor_worker.drain()
+        backfilled = [row[0] for row in pm._conn.execute("SELECT eth_tx_hash FROM compliance_log ORDER BY id")]
+        assert set(backfilled) == set(chain.sent)
+        pm.close()
+
+
+class TestSTRQueue:
+    """Test suite for the persistent STR job queue"""
+    
+    @staticmethod
+    def wait_for(queue, tx_id, status="done", timeout=5):
+        import time
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = queue.status(tx_id)
+            if job and job["status"] == status:
+                return job
+            time.sleep(0.01)
+        raise AssertionError(f"{tx_id} never reached {status}: {queue.status(tx_id)}")
+    
+    def test_dedup_and_persistence(self, tmp_path):
+        """One generation per Transaction_ID; reports survive a restart"""
+        calls = []
+        
+        def generate(tx, rules, fallback=True):
+            calls.append(tx["Transaction_ID"])
+            return f"STR for {tx['Transaction_ID']}: {', '.join(rules)}"
+        
+        db_path = str(tmp_path / "str.db")
+        queue = STRQueue(generate, ReportStore(db_path), workers=2)
+        tx = {"Transaction_ID": "TX-001", "Amount": 50000}
+        assert queue.submit(tx, ["Structuring"])
+        self.wait_for(queue, "TX-001")
+        assert not queue.submit(tx, ["Structuring"])
+        assert calls == ["TX-001"]
+        assert queue.get_report("TX-001") == "STR for TX-001: Structuring"
+        queue.close()
+        
+        reopened = STRQueue(generate, ReportStore(db_path))
+        assert reopened.get_report("TX-001") == "STR for TX-001: Structuring"
+        assert reopened.get_report("TX-404") is None
+        reopened.close()
+    
+    def test_retries_then_falls_back(self, tmp_path):
+        """Provider errors retry with backoff; the last attempt may use the template"""
+        def generate(tx, rules, fallback=True):
+            if not fallback:
+                raise ConnectionError("LLM provider timeout")
+            return "template report"
+        
+        queue = STRQueue(generate, ReportStore(str(tmp_path / "str.db")), max_attempts=3, backoff_seconds=0.01)
+        queue.submit({"Transaction_ID": "TX-002"}, ["PEP"])
+        job = self.wait_for(queue, "TX-002")
+        assert job["attempts"] == 3
+        assert job["last_error"] == "LLM provider timeout"
+        assert queue.get_report("TX-002") == "template report"
+        queue.close()
+    
+    def test_lru_cache_is_bounded(self):
+        cache = LRUCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.put("c", 3)
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+
+
+class TestLLMProviders:
+    """Test suite for pooled provider clients and the report cache, against a local fake provider"""
+    
+    class FakeProvider:
+        """Stands in for an LLM API: counts client setups and calls, tracks concurrency"""
+        def __init__(self, delay=0.0, fail=False):
+            import threading
+            self.delay, self.fail = delay, fail
+            self.clients = self.calls = self.in_flight = self.peak = 0
+            self._lock = threading.Lock()
+        
+        def factory(self, api_key):
+            self.clients += 1
+            return self.complete
+        
+        def complete(self, prompt):
+            import time
+            with self._lock:
+                self.calls += 1
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+            time.sleep(self.delay)
+            with self._lock:
+                self.in_flight -= 1
+            if self.fail:
+                raise ConnectionError("provider unreachable")
+            return f"LLM STR #{self.calls}"
+    
+    @pytest.fixture
+    def use_provider(self, monkeypatch):
+        def use(name, fake, max_concurrency=None):
+            register_provider(name, fake.factory, max_concurrency=max_concurrency)
+            monkeypatch.setenv("LLM_PROVIDER", name)
+            monkeypatch.setenv("LLM_API_KEY", "test-key")
+            return fake
+        return use
+    
+    def test_client_reused_and_identical_prompts_cached(self, use_provider):
+        """One client per provider; equal inputs (in any key order) hit the report cache"""
+        fake = use_provider("fake-pool", self.FakeProvider())
+        tx = {"Transaction_ID": "TX-100", "Amount": 50000, "Currency": "USD"}
+        first = generate_str_report(tx, ["Structuring"])
+        again = generate_str_report(dict(reversed(list(tx.items()))), ["Structuring"])
+        other = generate_str_report({**tx, "Transaction_ID": "TX-101"}, ["Structuring"])
+        
+        assert first == again == "LLM STR #1"
+        assert other == "LLM STR #2"
+        assert (fake.clients, fake.calls) == (1, 2)
+    
+    def test_concurrency_limited_per_provider(self, use_provider):
+        import threading
+        fake = use_provider("fake-limited", self.FakeProvider(delay=0.05), max_concurrency=2)
+        threads = [
+            threading.Thread(target=generate_str_report, args=({"Transaction_ID": f"TX-{i}"}, ["PEP"]))
+            for i in range(6)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert fake.calls == 6
+        assert fake.peak == 2
+    
+    def test_provider_errors_fall_back_or_raise(self, use_provider):
+        use_provider("fake-down", self.FakeProvider(fail=True))
+        tx = {"Transaction_ID": "TX-200", "Amount": 1000}
+        assert "SUSPICIOUS TRANSACTION REPORT" in generate_str_report(tx, ["PEP"])
+        with pytest.raises(ConnectionError):
+            generate_str_report(tx, ["PEP"], fallback=False)
+
+
+class TestTransactionGraph:
+    """Test suite for the incremental transaction graph index"""
+    
+    def test_incremental_index_matches_dataframe_build(self):
+        """Appending edges one by one yields the same index as a bulk build"""
+        rows = [("ACC-001", "ACC-002"), ("ACC-002", "ACC-003"), ("ACC-001", "ACC-002"), ("ACC-003", "ACC-001")]
+        history_df = pd.DataFrame(rows, columns=["Sender_Account_ID", "Receiver_Account_ID"])
+        
+        graph = TransactionGraph()
+        for sender_id, receiver_id in rows:
+            graph.add_transaction({"Sender_Account_ID": sender_id, "Receiver_Account_ID": receiver_id})
+        
+        bulk = TransactionGraph.from_dataframe(history_df)
+        assert graph.successors == bulk.successors
+        assert graph.predecessors == bulk.predecessors
+        assert graph.edge_count == 3  # Duplicate edge counted once
+    
+    def test_find_cycle_returns_path(self):
+        """Cycle lookup returns the full loop back to the sender"""
+        graph = TransactionGraph()
+        graph.add_edge("B", "C")
+        graph.add_edge("C", "A")
+        
+        assert graph.find_cycle("A", "B") == ["A", "B", "C", "A"]
+        assert graph.find_cycle("A", "C") == ["A", "C", "A"]
+        assert graph.find_cycle("B", "A") is None
+    
+    def test_find_cycle_respects_max_hops(self):
+        """A 5-hop layering ring is found once max_hops allows it"""
+        graph = TransactionGraph()
+        for sender_id, receiver_id in [("B", "C"), ("C", "D"), ("D", "E"), ("E", "A")]:
+            graph.add_edge(sender_id, receiver_id)
+        
+        assert graph.find_cycle("A", "B", max_hops=5) == ["A", "B", "C", "D", "E", "A"]
+        assert graph.find_cycle("A", "B", max_hops=4) is None
+    
+    def test_find_cycle_visit_budget_bounds_hub_queries(self):
+        """A hub's fan-out exhausts the budget before the ring behind it is reached"""
+        graph = TransactionGraph()
+        for i in range(200):
+            graph.add_edge("HUB", f"LEAF-{i}")
+            graph.add_edge(f"SRC-{i}", "A")
+        graph.add_edge("LEAF-199", "A")
+        
+        assert graph.find_cycle("A", "HUB", visit_budget=50) is None
+        assert graph.find_cycle("A", "HUB", visit_budget=1000) == ["A", "HUB", "LEAF-199", "A"]
+    
+    def test_find_cycle_returns_a_shortest_ring(self):
+        """The ring is made of real edges and is as short as a plain BFS says it can be"""
+        import random
+        from collections import deque
+        rng = random.Random(11)
+        graph = TransactionGraph()
+        for _ in range(150):
+            graph.add_edge(f"N{rng.randrange(40)}", f"N{rng.randrange(40)}")
+        
+        def shortest_path_edges(start, goal):
+            depth = {start: 0}
+            queue = deque([start])
+            while queue:
+                node = queue.popleft()
+                for neighbour in graph.successors.get(node, ()):
+                    if neighbour not in depth:
+                        depth[neighbour] = depth[node] + 1
+                        queue.append(neighbour)
+            return depth.get(goal)
+        
+        for _ in range(200):
+            sender_id, receiver_id = f"N{rng.randrange(40)}", f"N{rng.randrange(40)}"
+            if sender_id == receiver_id:
+                continue
+            ring = graph.find_cycle(sender_id, receiver_id, max_hops=6)
+            expected = shortest_path_edges(receiver_id, sender_id)
+            if expected is None or expected + 1 > 6:
+                assert ring is None
+                continue
+            assert ring[0] == ring[-1] == sender_id and ring[1] == receiver_id
+            assert len(ring) - 1 == expected + 1
+            assert all(b in graph.successors[a] for a, b in zip(ring[1:], ring[2:]))
+    
+    def test_clusters_merge_as_edges_arrive(self):
+        """Union-find clusters follow transfers in either direction"""
+        graph = TransactionGraph()
+        graph.add_edge("A", "B")
+        graph.add_edge("D", "C")
+        assert len(graph.clusters) == 2
+        assert not graph.clusters.connected("A", "C")
+        
+        graph.add_edge("C", "B")
+        assert len(graph.clusters) == 1
+        assert graph.clusters.connected("A", "D")
+        assert sorted(graph.clusters.cluster_of("D")) == ["A", "B", "C", "D"]
+        assert graph.clusters.clusters(min_size=2)[0][1] == graph.clusters.cluster_of("A")
+        assert graph.clusters.cluster_of("Z") is None
+    
+    def test_clusters_rule_out_rings_without_a_search(self, monkeypatch):
+        """Accounts in different clusters never get a path search"""
+        import backend.core.graph_index as graph_index
+        graph = TransactionGraph()
+        graph.add_edge("B", "C")
+        graph.add_edge("X", "A")
+        
+        def no_search(*args):
+            raise AssertionError("path search ran")
+        
+        monkeypatch.setattr(graph_index, "find_cycle", no_search)
+        assert graph.find_cycle("A", "B") is None
+    
+    def test_overlay_merges_stay_in_overlay(self):
+        graph = TransactionGraph()
+        graph.add_edge("A", "B")
+        graph.add_edge("C", "D")
+        
+        overlay = graph.overlay()
+        overlay.add_edge("B", "C")
+        overlay.add_edge("D", "A")
+        
+        assert overlay.clusters.connected("A", "C")
+        assert overlay.find_cycle("A", "B") == ["A", "B", "C", "D", "A"]
+        assert not graph.clusters.connected("A", "C")
+        assert len(graph.clusters) == 2
+    
+    def test_engine_uses_supplied_index(self):
+        """Engine queries the supplied indexes instead of scanning the history"""
+        now = datetime.now()
+        graph, receiver_windows = TransactionGraph(), ReceiverWindows()
+        for i in range(4):
+            graph.add_edge(f"ACC-M{i}", "ACC-003")
+            receiver_windows.add("ACC-003", f"ACC-M{i}", to_epoch_seconds(now - timedelta(hours=i)))
+        
+        tx = {
+            "Sender_Account_ID": "ACC-001",
+            "Receiver_Account_ID": "ACC-003",
+            "Amount": 100,
+            "Timestamp": now.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        empty_df = pd.DataFrame(columns=["Sender_Account_ID", "Receiver_Account_ID", "Amount", "Timestamp"])
+        
+        result = AMLEngine().evaluate_transaction(tx, {}, set(), empty_df, graph=graph, receiver_windows=receiver_windows)
+        
+        assert result["risk_breakdown"]["network"] == 40
+        assert "Mule account detected (5 unique senders" in str(result["triggered_rules"])
+
+
+class TestSenderWindows:
+    """Test suite for per-sender sliding window aggregates"""
+    
+    def test_stats_within_window(self):
+        """Count and sum only include transactions at or after the cutoff"""
+        windows = SenderWindows()
+        for hours_ago, amount in [(30, 100), (20, 200), (2, 300)]:
+            windows.add("ACC-001", 100000 - hours_ago * 3600, amount)
+        
+        assert windows.stats("ACC-001", 100000 - 24 * 3600) == (2, 500)
+        assert windows.stats("ACC-001", 100000 - 48 * 3600) == (3, 600)
+        assert windows.stats("ACC-404", 0) == (0, 0.0)
+    
+    def test_out_of_order_insert(self):
+        """Late-arriving transactions keep the running totals consistent"""
+        windows = SenderWindows()
+        windows.add("ACC-001", 1000, 10)
+        windows.add("ACC-001", 3000, 30)
+        windows.add("ACC-001", 2000, 20)
+        
+        assert windows.stats("ACC-001", 1500) == (2, 50)
+        assert windows.stats("ACC-001", 0) == (3, 60)
+    
+    def test_entries_expire_past_horizon(self):
+        """Entries older than the horizon are dropped as newer ones arrive"""
+        windows = SenderWindows(horizon_hours=1)
+        for i in range(200):
+            windows.add("ACC-001", i * 600, 1)  # One every 10 minutes
+        
+        window = windows.accounts["ACC-001"]
+        assert len(window.times) - window.start <= 7
+        assert windows.stats("ACC-001", 199 * 600 - 3600) == (7, 7)
+    
+    def test_back_dated_transaction_sees_full_windows(self):
+        """A row back-dated within the lateness allowance counts what an unbounded index would"""
+        bounded, unbounded = SenderWindows(), SenderWindows(horizon_hours=None)
+        base = 1_000_000
+        for windows in (bounded, unbounded):
+            windows.add("ACC-001", base, 1000)
+            windows.add("ACC-001", base + 60 * 3600, 2000)
+        
+        # Posted 20h behind the sender's newest: its 48h window reaches back to base - 8h
+        back_dated = base + 40 * 3600
+        for windows in (bounded, unbounded):
+            windows.add("ACC-001", back_dated, 500)
+        
+        since = back_dated - 48 * 3600
+        assert bounded.stats("ACC-001", since) == unbounded.stats("ACC-001", since) == (3, 3500)
+        assert bounded.stats_many("ACC-001", [since])[0].tolist() == [3]
+    
+    def test_from_dataframe_parses_timestamps(self):
+        """Bulk build parses string timestamps once"""
+        history_df = pd.DataFrame([
+            {"Sender_Account_ID": "ACC-001", "Amount": 5000, "Timestamp": "2023-10-26 10:00:00"},
+            {"Sender_Account_ID": "ACC-001", "Amount": 6000, "Timestamp": "2023-10-26 12:00:00"},
+        ])
+        windows = SenderWindows.from_dataframe(history_df)
+        
+        since = to_epoch_seconds("2023-10-26 11:00:00")
+        assert windows.stats("ACC-001", since) == (1, 6000)
+
+
+class TestReceiverWindows:
+    """Test suite for windowed distinct-sender counts behind the mule rule"""
+    
+    HOUR = 3600.0
+    
+    def test_counts_distinct_senders_inside_window(self):
+        windows = ReceiverWindows(window_hours=24)
+        t0 = 1_700_000_000.0
+        windows.add("MULE", "OLD", t0)
+        for i in range(3):
+            windows.add("MULE", f"S{i}", t0 + 30 * self.HOUR + i)
+        windows.add("MULE", "S0", t0 + 31 * self.HOUR)  # Repeat sender
+        
+        now = t0 + 40 * self.HOUR
+        assert windows.distinct_senders("MULE", now - 24 * self.HOUR) == 3
+        assert windows.distinct_senders("MULE", now - 24 * self.HOUR, "S1") == 3
+        assert windows.distinct_senders("MULE", now - 24 * self.HOUR, "NEW") == 4
+        # Exact buckets honour the precise window start, not just the bucket edge
+        assert windows.distinct_senders("MULE", t0 + 30 * self.HOUR + 1) == 3
+        assert windows.distinct_senders("MULE", t0 + 30 * self.HOUR + 2) == 2
+        assert windows.distinct_senders("NOBODY", 0, "X") == 1
+    
+    def test_switches_to_sketch_with_bounded_memory(self):
+        windows = ReceiverWindows(window_hours=24)
+        t0 = 1_700_000_000.0
+        for i in range(20000):
+            windows.add("HUB", f"S{i}", t0 + i % 3600)
+        
+        counter, = windows.receivers["HUB"].values()
+        assert counter.latest is None and len(counter.registers) == 1024
+        estimate = windows.distinct_senders("HUB", t0)
+        assert abs(estimate - 20000) < 0.05 * 20000
+    
+    def test_small_cardinalities_stay_exact(self):
+        windows = ReceiverWindows(window_hours=24)
+        for i in range(SKETCH_EXACT_LIMIT):
+            windows.add("R", f"S{i}", 1_700_000_000.0 + i)
+        assert windows.distinct_senders("R", 0) == SKETCH_EXACT_LIMIT
+        assert windows.receivers["R"][next(iter(windows.receivers["R"]))].registers is None
+    
+    def test_old_buckets_expire(self):
+        windows = ReceiverWindows(window_hours=24, horizon_hours=48)
+        t0 = 1_700_000_000.0
+        windows.add("R", "A", t0)
+        windows.add("R", "B", t0 + 100 * self.HOUR)
+        assert len(windows.receivers["R"]) == 1
+        assert ReceiverWindows(horizon_hours=None).horizon_seconds is None
+    
+    def test_query_skips_buckets_before_window(self):
+        """With no horizon, old buckets pile up but a query only visits the window's"""
+        windows = ReceiverWindows(window_hours=24, horizon_hours=None)
+        t0 = 1_700_000_000.0
+        for day in range(1000):
+            windows.add("R", f"S{day}", t0 + day * 24 * self.HOUR)
+        
+        class NoScan(dict):
+            def items(self):
+                raise AssertionError("scanned every bucket")
+        windows.receivers["R"] = NoScan(windows.receivers["R"])
+        
+        now = t0 + 999 * 24 * self.HOUR
+        assert windows.distinct_senders("R", now - 24 * self.HOUR) == 2
+        assert windows.distinct_senders("R", now - 72 * self.HOUR, "NEW") == 5
+    
+    def test_overlay_leaves_index_untouched(self):
+        windows = ReceiverWindows(window_hours=24)
+        t0 = 1_700_000_000.0
+        windows.add("R", "A", t0)
+        
+        overlay = windows.overlay()
+        overlay.add("R", "B", t0 + 1)
+        overlay.add("Q", "C", t0)
+        
+        assert overlay.distinct_senders("R", t0) == 2
+        assert windows.distinct_senders("R", t0) == 1
+        assert "Q" not in windows.receivers
+    
+    def test_mule_rule_ignores_senders_outside_window(self):
+        """Stale senders from weeks ago no longer make a receiver a mule"""
+        base = datetime(2024, 3, 1, 12, 0, 0)
+        history = pd.DataFrame([{
+            "Transaction_ID": f"H{i}", "Sender_Account_ID": f"ACC-S{i}", "Receiver_Account_ID": "ACC-MULE",
+            "Amount": 100.0, "Timestamp": (base - timedelta(days=30 if i < 3 else 1)).strftime("%Y-%m-%d %H:%M:%S")
+        } for i in range(6)])
+        tx = {"Sender_Account_ID": "ACC-NEW", "Receiver_Account_ID": "ACC-MULE", "Amount": 100,
+              "Timestamp": base.strftime("%Y-%m-%d %H:%M:%S")}
+        
+        result = AMLEngine().evaluate_transaction(tx, {}, set(), history)
+        assert result["risk_breakdown"]["network"] == 0
+        
+        history.loc[:, "Timestamp"] = (base - timedelta(hours=2)).strftime("%Y-%m-%d %H:%M:%S")
+        result = AMLEngine().evaluate_transaction(tx, {}, set(), history)
+        assert "Mule account detected (7 unique senders" in str(result["triggered_rules"])
+
+
+class TestPEPScreener:
+    """Test suite for the fuzzy watchlist screening index"""
+    
+    WATCHLIST = ["Politician A", "General B", "John Doe", "José García-Márquez", "Владимир Путин", "Panama Holdings"]
+    
+    def test_normalizes_case_accents_punctuation_and_order(self):
+        assert normalize_name("  José GARCÍA-Márquez ") == "garcia jose marquez"
+        assert normalize_name("Doe, John") == normalize_name("john doe")
+        assert normalize_name(None) == ""
+    
+    def test_exact_and_fuzzy_matches(self):
+        screener = PEPScreener(self.WATCHLIST)
+        
+        assert screener.match("DOE, John") == {"name": "John Doe", "score": 1.0}
+        assert screener.match("Jon Doe") == {"name": "John Doe", "score": 0.875}
+        assert screener.match("Jose Garcia Marquez")["name"] == "José García-Márquez"
+        assert screener.match("Владимир Путен")["name"] == "Владимир Путин"
+        assert "Panama Holding" in screener
+        assert screener.match("Jane Smith") is None
+        assert screener.match("") is None
+    
+    def test_threshold_one_matches_exactly_only(self):
+        screener = PEPScreener(self.WATCHLIST, threshold=1.0)
+        assert "john doe" in screener
+        assert "Jon Doe" not in screener
+    
+    def test_agrees_with_brute_force(self):
+        """The index must find every entry a full scan would, and pick the same best score"""
+        import random, string
+        from backend.core.screening import _edit_distance
+        
+        rng = random.Random(7)
+        word = lambda: "".join(rng.choice("aeioubdklmnrst") for _ in range(rng.randint(3, 8)))
+        names = [f"{word()} {word()}" for _ in range(3000)]
+        screener = PEPScreener(names)
+        
+        for name in rng.sample(names, 150):
+            for _ in range(rng.randint(0, 3)):
+                i = rng.randrange(len(name))
+                name = name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+            key = normalize_name(name)
+            best = None
+            for candidate in screener.keys:
+                longest = max(len(key), len(candidate))
+                limit = int(0.15 * longest + 1e-9)
+                distance = _edit_distance(key, candidate, limit)
+                if distance <= limit:
+                    score = round(1 - distance / longest, 4)
+                    best = score if best is None else max(best, score)
+            result = screener.match(name)
+            assert (result and result["score"]) == best
+    
+    def test_account_results_are_cached_until_renamed(self, monkeypatch):
+        screener = PEPScreener(self.WATCHLIST)
+        assert screener.screen("ACC-1", "Jon Doe")["name"] == "John Doe"
+        
+        monkeypatch.setattr(screener, "match", lambda name: pytest.fail("cache miss"))
+        assert screener.screen("ACC-1", "Jon Doe")["name"] == "John Doe"
+        
+        monkeypatch.undo()
+        assert screener.screen("ACC-1", "Jane Smith") is None
+    
+    def test_engine_flags_fuzzy_pep_match(self):
+        account_db = {
+            "ACC-1": {"Name": "Jon Doe", "KYC_Status": "Verified", "Declared_Income": 100000, "Country": "USA"},
+            "ACC-2": {"Name": "Acme Ltd", "KYC_Status": "Verified", "Declared_Income": 100000, "Country": "USA"},
+        }
+        tx = {"Sender_Account_ID": "ACC-1", "Receiver_Account_ID": "ACC-2", "Amount": 100,
+              "Timestamp": "2024-03-01 12:00:00"}
+        
+        result = AMLEngine().evaluate_transaction(tx, account_db, PEPScreener(self.WATCHLIST), None)
+        assert result["risk_breakdown"]["pep"] == 50
+        
+        result = AMLEngine().evaluate_transaction(tx, account_db, {"john doe"}, None)
+        assert result["risk_breakdown"]["pep"] == 0
+
+
+class TestAccountFlags:
+    """Test suite for the per-account flags behind the static rules"""
+    
+    ACCOUNTS = {
+        "ACC-PEP": {"Name": "Jon Doe", "KYC_Status": "Verified", "Declared_Income": 10000, "Country": "USA"},
+        "ACC-RISK": {"Name": "Acme Ltd", "KYC_Status": "Incomplete", "Declared_Income": 0, "Country": "Panama"},
+        "ACC-GATED": {"Name": "Gated Co", "KYC_Status": "Verified", "Declared_Income": 90000, "Country": "UK",
+                      "Account_Status": "Gated_5000_Limit"},
+    }
+    
+    def test_records_reduce_master_data_to_bits(self):
+        flags = AccountFlags.build(self.ACCOUNTS, PEPScreener(["John Doe"]))
+        
+        assert flags.get("ACC-PEP").bits == FLAG_PEP
+        assert flags.get("ACC-PEP").income_limit == 5000
+        assert flags.get("ACC-RISK").bits & FLAG_KYC_INCOMPLETE
+        assert flags.get("ACC-RISK").country == "Panama"
+        assert flags.get("ACC-RISK").income_limit == float("inf")  # No declared income, no 50% rule
+        assert flags.get("ACC-GATED").bits == FLAG_GATED
+        # Unknown accounts read as an empty master record
+        assert flags.get("ACC-NONE").bits == FLAG_KYC_INCOMPLETE
+    
+    def test_engine_results_match_unflagged_evaluation(self):
+        screener = PEPScreener(["John Doe"])
+        flags = AccountFlags.build(self.ACCOUNTS, screener)
+        engine = AMLEngine()
+        for sender_id, receiver_id, amount in [("ACC-PEP", "ACC-RISK", 25000), ("ACC-RISK", "ACC-NONE", 100),
+                                               ("ACC-GATED", "ACC-PEP", 4000), ("ACC-NONE", "ACC-GATED", 9000)]:
+            tx = {"Sender_Account_ID": sender_id, "Receiver_Account_ID": receiver_id, "Amount": amount,
+                  "Timestamp": "2024-03-01 12:00:00"}
+            expected = engine.evaluate_transaction(tx, self.ACCOUNTS, screener, None)
+            assert engine.evaluate_transaction(tx, self.ACCOUNTS, screener, None, account_flags=flags) == expected
+            assert engine.evaluate_batch([tx], self.ACCOUNTS, screener, None, account_flags=flags) == [expected]
+    
+    def test_engine_reads_flags_not_master_data(self):
+        flags = AccountFlags.build(self.ACCOUNTS, PEPScreener(["John Doe"]))
+        tx = {"Sender_Account_ID": "ACC-PEP", "Receiver_Account_ID": "ACC-RISK", "Amount": 6000,
+              "Timestamp": "2024-03-01 12:00:00"}
+        
+        result = AMLEngine().evaluate_transaction(tx, {}, set(), None, account_flags=flags)
+        assert result["risk_breakdown"]["pep"] == 50
+        assert result["risk_breakdown"]["jurisdiction"] == 25
+        assert "KYC: Amount (6000.0) > 50% of Income (10000.0)" in result["triggered_rules"]
+    
+    def test_refresh_picks_up_gating(self):
+        accounts = {account_id: dict(info) for account_id, info in self.ACCOUNTS.items()}
+        flags = AccountFlags.build(accounts, set())
+        tx = {"Sender_Account_ID": "ACC-PEP", "Receiver_Account_ID": "ACC-RISK", "Amount": 6000,
+              "Timestamp": "2024-03-01 12:00:00"}
+        AMLEngine().evaluate_transaction(tx, accounts, set(), None, account_flags=flags)
+        
+        accounts["ACC-PEP"]["Account_Status"] = "Gated_5000_Limit"
+        flags.refresh("ACC-PEP", accounts["ACC-PEP"], set())
+        with pytest.raises(ValueError, match="GATED_ACCOUNT_BREACH"):
+            AMLEngine().evaluate_transaction(tx, accounts, set(), None, account_flags=flags)
+    
+    def test_flags_for_other_jurisdictions_are_not_used(self):
+        flags = AccountFlags.build(self.ACCOUNTS, set(), high_risk_countries={"USA"})
+        tx = {"Sender_Account_ID": "ACC-PEP", "Receiver_Account_ID": "ACC-GATED", "Amount": 100,
+              "Timestamp": "2024-03-01 12:00:00"}
+        result = AMLEngine().evaluate_transaction(tx, self.ACCOUNTS, set(), None, account_flags=flags)
+        assert result["risk_breakdown"]["jurisdiction"] == 0
+
+
+class TestTransactionStore:
+    """Test suite for the append-only columnar transaction store"""
+    
+    def test_append_grows_capacity(self):
+        """Appends past the initial capacity double the arrays and keep every row"""
+        store = TransactionStore(capacity=2)
+        for i in range(5):
+            store.append({"Transaction_ID": f"TX-{i}", "Sender_Account_ID": "ACC-001",
+                          "Receiver_Account_ID": "ACC-002", "Amount": i * 100,
+                          "Timestamp": "2023-10-26 10:00:00"})
+        
+        assert len(store) == 5
+        assert store.capacity == 8
+        assert store.column("Transaction_ID").tolist() == [f"TX-{i}" for i in range(5)]
+        assert store.column("Amount").sum() == 1000
+        assert store.column("Currency").tolist() == ["USD"] * 5
+    
+    def test_column_is_zero_copy_view(self):
+        """Column accessors return views over the backing arrays"""
+        store = TransactionStore()
+        store.append({"Transaction_ID": "TX-1", "Amount": 10, "Timestamp": "2023-10-26 10:00:00"})
+        
+        view = store.column("Amount")
+        assert view.base is store.columns["Amount"]
+        assert store.column(EPOCH_COLUMN)[0] == to_epoch_seconds("2023-10-26 10:00:00")
+    
+    def test_dataframe_roundtrip_and_cache(self):
+        """DataFrame view matches the source and is rebuilt only after appends"""
+        source = pd.DataFrame([
+            {"Transaction_ID": "TX-1", "Sender_Account_ID": "ACC-001", "Receiver_Account_ID": "ACC-002",
+             "Amount": 500, "Timestamp": "2023-10-26 10:00:00"},
+        ])
+        store = TransactionStore.from_dataframe(source)
+        
+        df = store.to_dataframe()
+        assert df is store.to_dataframe()
+        assert df.loc[0, "Sender_Account_ID"] == "ACC-001"
+        
+        store.append({"Transaction_ID": "TX-2", "Amount": 1, "Timestamp": "2023-10-26 11:00:00"})
+        assert len(store.to_dataframe()) == 2
+        assert len(df) == 1
+    
+    def test_engine_accepts_store_history(self):
+        """Engine falls back to building indexes from a store when none are supplied"""
+        store = TransactionStore()
+        now = datetime.now()
+        for i in range(6):
+            store.append({"Transaction_ID": f"TX-{i}", "Sender_Account_ID": "ACC-001",
+                          "Receiver_Account_ID": "ACC-003", "Amount": 100,
+                          "Timestamp": (now - timedelta(hours=i)).strftime("%Y-%m-%d %H:%M:%S")})
+        tx = {"Sender_Account_ID": "ACC-001", "Receiver_Account_ID": "ACC-003",
+              "Amount": 100, "Timestamp": now.strftime("%Y-%m-%d %H:%M:%S")}
+        
+        result = AMLEngine().evaluate_transaction(tx, {}, set(), store)
+        assert result["risk_breakdown"]["velocity"] == 20
+
+
+class TestBatchEvaluation:
+    """Test suite for vectorized batch evaluation"""
+    
+    def _transactions(self, n):
+        return random_transactions(n, seed=7, minutes=45, accounts=5)
+    
+    def test_batch_matches_sequential_evaluation(self, account_db):
+        """Each batch row sees earlier rows as history, exactly like sequential calls"""
+        engine = AMLEngine()
+        pep_db = {"panama holdings"}
+        txs = self._transactions(150)
+        # ISO timestamps are evaluated at "now" but still recorded at their own time
+        for tx in txs[::7]:
+            tx["Timestamp"] = tx["Timestamp"].replace(" ", "T")
+        
+        graph, windows, receiver_windows = TransactionGraph(), SenderWindows(), ReceiverWindows()
+        sequential = []
+        for tx in txs:
+            try:
+                sequential.append(engine.evaluate_transaction(tx, account_db, pep_db, None, graph=graph, windows=windows,
+                                                              receiver_windows=receiver_windows))
+                graph.add_transaction(tx)
+                windows.add_transaction(tx)
+                receiver_windows.add_transaction(tx)
+            except ValueError as e:
+                sequential.append({"error": str(e)})
+        
+        batch = engine.evaluate_batch(txs, account_db, pep_db, None, graph=TransactionGraph(), windows=SenderWindows(),
+                                      receiver_windows=ReceiverWindows())
+        
+        assert batch == sequential
+        assert any("error" in result for result in batch)
+        assert any(result.get("risk_breakdown", {}).get("structuring") for result in batch)
+    
+    def test_batch_leaves_supplied_index_untouched(self, account_db):
+        """Batch rows are only visible through the overlay, not the caller's graph"""
+        graph = TransactionGraph()
+        graph.add_edge("ACC-001", "ACC-002")
+        
+        AMLEngine().evaluate_batch(self._transactions(20), account_db, set(), None, graph=graph, windows=SenderWindows())
+        
+        assert graph.edge_count == 1
+        assert graph.successors == {"ACC-001": {"ACC-002": None}}
+
+
+@pytest.mark.skipif(not PARQUET_AVAILABLE, reason="pyarrow not installed")
+class TestSnapshotCache:
+    """Test suite for the Parquet snapshot cache in front of the Excel sources"""
+    
+    @pytest.fixture
+    def source(self, tmp_path):
+        path = tmp_path / "accounts.xlsx"
+        pd.DataFrame({"Account_ID": ["ACC-001", "ACC-002"], "Declared_Income": [50000, 30000]}).to_excel(path, index=False)
+        return path
+    
+    def test_second_read_hits_snapshot(self, source, tmp_path):
+        """First read parses Excel and writes a snapshot; the next one reuses it"""
+        first = SnapshotCache(str(tmp_path / "cache"))
+        df1 = first.read_excel(str(source))
+        assert (first.hits, first.misses) == (0, 1)
+        
+        second = SnapshotCache(str(tmp_path / "cache"))
+        df2 = second.read_excel(str(source))
+        assert (second.hits, second.misses) == (1, 0)
+        pd.testing.assert_frame_equal(df1, df2, check_dtype=False)
+    
+    def test_touched_source_with_same_content_still_hits(self, source, tmp_path):
+        """An mtime change alone is resolved by the content hash"""
+        SnapshotCache(str(tmp_path / "cache")).read_excel(str(source))
+        os.utime(source, (1, 1))
+        
+        cache = SnapshotCache(str(tmp_path / "cache"))
+        cache.read_excel(str(source))
+        assert cache.hits == 1
+    
+    def test_modified_source_rebuilds(self, source, tmp_path):
+        """Changed Excel content invalidates the snapshot"""
+        SnapshotCache(str(tmp_path / "cache")).read_excel(str(source))
+        pd.DataFrame({"Account_ID": ["ACC-009"], "Declared_Income": [1]}).to_excel(source, index=False)
+        
+        cache = SnapshotCache(str(tmp_path / "cache"))
+        df = cache.read_excel(str(source))
+        assert cache.misses == 1
+        assert df["Account_ID"].tolist() == ["ACC-009"]
+    
+    def test_writers_use_private_temp_files(self, source, tmp_path):
+        """Another worker's in-flight temp file neither blocks nor mixes with this write"""
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        (cache_dir / "accounts.parquet.tmp").write_bytes(b"half-written by another worker")
+        
+        SnapshotCache(str(cache_dir)).read_excel(str(source))
+        cache = SnapshotCache(str(cache_dir))
+        assert cache.read_excel(str(source))["Account_ID"].tolist() == ["ACC-001", "ACC-002"]
+        assert cache.hits == 1
+        assert sorted(os.listdir(cache_dir)) == ["accounts.manifest.json", "accounts.parquet", "accounts.parquet.tmp"]
+    
+    def test_missing_source_returns_none(self, tmp_path):
+        assert SnapshotCache(str(tmp_path / "cache")).read_excel(str(tmp_path / "missing.xlsx")) is None
 
 
 # Additional integration tests
+class TestReplay:
+    """Test suite for the transaction replay engine"""
+    
+    def _transactions_df(self, n):
+        df = pd.DataFrame(random_transactions(n, seed=11, minutes=40, accounts=4))
+        return df.assign(Amount=df["Amount"].astype(float), Currency="USD")
+    
+    def test_replay_matches_prefix_history(self, account_db):
+        """Incremental replay gives the same result as evaluating each row against df.iloc[:idx]"""
+        engine = AMLEngine()
+        pep_db = {"panama holdings"}
+        df = self._transactions_df(80)
+        
+        def evaluate(call):
+            try:
+                return call()
+            except ValueError as e:
+                return {"error": str(e)}
+        
+        replay = ReplayEngine(engine, account_db, pep_db)
+        rows = df.to_dict(orient="records")
+        replayed = [evaluate(lambda: replay.evaluate(tx)) for tx in rows]
+        legacy = [evaluate(lambda: engine.evaluate_transaction(tx, account_db, pep_db, df.iloc[:idx]))
+                  for idx, tx in enumerate(rows)]
+        
+        assert replayed == legacy
+        assert any("error" in result for result in replayed)
+        assert len(replay.history) == len(rows)
+    
+    def test_pacer_offsets(self):
+        """Each mode schedules rows relative to the start of the replay"""
+        assert ReplayPacer("tps", tps=4).offset(10, None) == 2.5
+        assert ReplayPacer("max").offset(10, "2024-01-01 05:00:00") == 0.0
+        
+        pacer = ReplayPacer("realtime", speed=60)
+        assert pacer.offset(0, "2024-01-01 00:00:00") == 0.0
+        assert pacer.offset(1, "2024-01-01 01:00:00") == 60.0
+        # Unparseable and back-dated rows follow the previous row
+        assert pacer.offset(2, "not a date") == 60.0
+        assert pacer.offset(3, "2024-01-01 00:30:00") == 60.0
+        assert pacer.offset(4, "2024-01-01 02:00:00") == 120.0
+    
+    def test_pacer_rejects_bad_settings(self):
+        with pytest.raises(ValueError):
+            ReplayPacer("warp")
+        with pytest.raises(ValueError):
+            ReplayPacer("tps", tps=0)
+        with pytest.raises(ValueError):
+            ReplayPacer("realtime", speed=-1)
+    
+    def test_stream_at_max_speed(self, tmp_path, account_db):
+        """The SSE generator replays every row once and logs it to the ledger"""
+        from types import SimpleNamespace
+        
+        df = self._transactions_df(30)
+        screener = PEPScreener(["Panama Holdings"])
+        loader = SimpleNamespace(transactions_df=df, account_lookup=account_db, pep_screener=screener,
+                                 account_flags=AccountFlags.build(account_db, screener))
+        pm = ProvenanceManager(db_path=str(tmp_path / "ledger.db"), anchor_mode="per_tx")
+        submitted = []
+        str_queue = SimpleNamespace(submit=lambda tx, rules: submitted.append(tx["Transaction_ID"]),
+                                    get_report=lambda tx_id: "report")
+        
+        async def collect():
+            generator = stream_live_transactions_generator(loader, AMLEngine(), pm, str_queue, ReplayPacer("max"))
+            return [event async for event in generator]
+        
+        try:
+            events = asyncio.run(collect())
+        finally:
+            pm.close()
+        
+        payloads = [json.loads(e.split("data: ", 1)[1]) for e in events if not e.startswith("event: ")]
+        rows = payloads[1:-1]
+        assert payloads[0] == {"status": "started", "total": 30, "mode": "max"}
+        assert payloads[-1] == {"status": "completed"}
+        assert len(rows) == 30
+        logged = [row for row in rows if "error" not in row]
+        assert [row["index"] for row in logged] == sorted(row["index"] for row in logged)
+        assert submitted == [row["transaction_id"] for row in logged if row["total_score"] > 80]
+        assert sum(e.startswith("event: str_report") for e in events) == len(submitted)
+    
+    def test_reconnect_catches_up_and_resumes_from_ledger(self, tmp_path, account_db):
+        """Catch-up events are rebuilt from stored results; a resumed feed continues after the last logged row"""
+        from types import SimpleNamespace
+        
+        df = self._transactions_df(40)
+        screener = PEPScreener(["Panama Holdings"])
+        loader = SimpleNamespace(transactions_df=df, account_lookup=account_db, pep_screener=screener,
+                                 account_flags=AccountFlags.build(account_db, screener))
+        str_queue = SimpleNamespace(submit=lambda tx, rules: None, get_report=lambda tx_id: None)
+        
+        def feed_events(pm, resume=False, limit=None):
+            async def collect():
+                events = []
+                generator = stream_live_transactions_generator(
+                    loader, AMLEngine(), pm, str_queue, ReplayPacer("max"), resume=resume
+                )
+                async for event in generator:
+                    if event_ledger_id(event) is not None:
+                        events.append(event)
+                        if len(events) == limit:
+                            break
+                await generator.aclose()
+                return events
+            return asyncio.run(collect())
+        
+        reference = ProvenanceManager(db_path=str(tmp_path / "reference.db"), anchor_mode="per_tx")
+        pm = ProvenanceManager(db_path=str(tmp_path / "ledger.db"), anchor_mode="per_tx")
+        try:
+            full_run = feed_events(reference)
+            first_part = feed_events(pm, limit=12)
+            
+            # A client that saw the first 5 rows gets rows 6-12 back from the ledger, unchanged
+            caught_up = read_feed_events(pm.db_path, str_queue, event_ledger_id(first_part[4]))
+            assert caught_up == first_part[5:]
+            
+            resumed = feed_events(pm, resume=True)
+            assert resumed == full_run[12:]
+            assert pm.verify_ledger() == "VERIFIED"
+        finally:
+            reference.close()
+            pm.close()
+
+
+class TestBroadcastHub:
+    """Test suite for the shared live feed producer"""
+    
+    @staticmethod
+    def _source(count, started, delay=0.0):
+        async def source(pacer, resume):
+            started.append(pacer.mode)
+            for i in range(count):
+                await asyncio.sleep(delay)
+                yield f"data: {i}\n\n"
+        return source
+    
+    @staticmethod
+    async def _read(stream, limit=None):
+        events = []
+        async for event in stream:
+            events.append(event)
+            if limit and len(events) == limit:
+                break
+        return events
+    
+    def test_subscribers_share_one_producer(self):
+        """Two clients see every event while the source runs once"""
+        started = []
+        
+        async def run():
+            hub = BroadcastHub(self._source(20, started, delay=0.001))
+            first, second = hub.subscribe(ReplayPacer("max")), hub.subscribe(ReplayPacer("tps"))
+            return await asyncio.gather(self._read(first), self._read(second)), hub
+        
+        (first, second), hub = asyncio.run(run())
+        
+        assert started == ["max"]
+        assert first == second == [f"data: {i}\n\n" for i in range(20)]
+        assert hub.stats()["events_published"] == 20
+        assert hub.stats()["subscribers"] == 0
+    
+    def test_slow_client_is_coalesced(self):
+        """A full buffer loses its oldest events and the client is told how many"""
+        async def run():
+            hub = BroadcastHub(self._source(10, []), buffer_size=3, slow_client_policy="coalesce")
+            stream = hub.subscribe(ReplayPacer("max"))
+            first = await stream.__anext__()
+            await hub._producer
+            return [first] + await self._read(stream), hub
+        
+        events, hub = asyncio.run(run())
+        
+        assert events[0] == "data: 0\n\n"
+        assert json.loads(events[1].split("data: ", 1)[1]) == {"status": "lagged", "skipped": 6}
+        assert events[2:] == ["data: 7\n\n", "data: 8\n\n", "data: 9\n\n"]
+    
+    def test_slow_client_is_dropped(self):
+        """Under the drop policy a full buffer ends that client's stream only"""
+        async def run():
+            hub = BroadcastHub(self._source(10, []), buffer_size=3, slow_client_policy="drop")
+            slow = hub.subscribe(ReplayPacer("max"))
+            await slow.__anext__()
+            await hub._producer
+            return await self._read(slow), hub
+        
+        events, hub = asyncio.run(run())
+        
+        assert events == []
+        assert hub.stats()["clients_dropped"] == 1
+    
+    def test_last_subscriber_leaving_stops_producer(self):
+        async def run():
+            hub = BroadcastHub(self._source(1000, [], delay=0.001))
+            stream = hub.subscribe(ReplayPacer("max"))
+            await self._read(stream, limit=3)
+            await stream.aclose()
+            await asyncio.sleep(0.01)
+            return hub
+        
+        hub = asyncio.run(run())
+        
+        assert not hub.running
+        assert hub.stats()["events_published"] < 1000
+    
+    def test_resubscribe_right_after_last_client_leaves(self):
+        """A client joining while the cancelled producer winds down gets a feed of its own"""
+        started = []
+        
+        async def run():
+            hub = BroadcastHub(self._source(5, started, delay=0.001))
+            stream = hub.subscribe(ReplayPacer("max"))
+            await self._read(stream, limit=2)
+            await stream.aclose()
+            # No await in between: the old producer has not finished cancelling yet
+            return await self._read(hub.subscribe(ReplayPacer("tps"))), hub
+        
+        events, hub = asyncio.run(run())
+        
+        assert started == ["max", "tps"]
+        assert events == [f"data: {i}\n\n" for i in range(5)]
+        assert hub.stats()["runs"] == 2
+    
+    def test_resuming_client_gets_catch_up_then_live_without_duplicates(self):
+        """Live events already delivered by the catch-up are skipped"""
+        resumed = []
+        
+        async def source(pacer, resume):
+            resumed.append(resume)
+            for i in range(4, 9):
+                yield f"id: {i}\ndata: {i}\n\n"
+        
+        async def catch_up(last_event_id):
+            for i in range(last_event_id + 1, 6):
+                yield f"id: {i}\ndata: {i}\n\n"
+        
+        async def run():
+            hub = BroadcastHub(source, catch_up=catch_up, event_id=event_ledger_id)
+            return await self._read(hub.subscribe(ReplayPacer("max"), last_event_id=2))
+        
+        events = asyncio.run(run())
+        
+        assert resumed == [True]
+        assert [event_ledger_id(e) for e in events] == [3, 4, 5, 6, 7, 8]
+    
+    def test_rejects_unknown_policy(self):
+        with pytest.raises(ValueError):
+            BroadcastHub(lambda pacer: None, slow_client_policy="block")
+
+
+class TestConcurrency:
+    """Test suite for the locks guarding concurrent evaluations"""
+    
+    def test_rw_lock_readers_share_writers_exclude(self):
+        import threading
+        import time
+        lock = ReadWriteLock()
+        active, peak, overlaps = [0], [0], []
+        guard = threading.Lock()
+        
+        def reader():
+            with lock.read():
+                with guard:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with guard:
+                    active[0] -= 1
+        
+        def writer():
+            with lock.write():
+                overlaps.append(active[0])
+                time.sleep(0.01)
+        
+        threads = [threading.Thread(target=reader) for _ in range(4)] + [threading.Thread(target=writer) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert peak[0] > 1
+        assert overlaps == [0, 0]
+    
+    def test_keyed_locks_serialize_per_key_only(self):
+        locks = KeyedLocks()
+        log = []
+        
+        async def work(key, tag):
+            async with locks.hold(key):
+                log.append(("start", tag))
+                await asyncio.sleep(0.01)
+                log.append(("end", tag))
+        
+        async def run():
+            await asyncio.gather(work("ACC-1", "a1"), work("ACC-1", "a2"), work("ACC-2", "b1"))
+        
+        asyncio.run(run())
+        
+        # a2 waits for a1; b1 runs alongside a1
+        assert log.index(("end", "a1")) < log.index(("start", "a2"))
+        assert log.index(("start", "b1")) < log.index(("end", "a1"))
+        assert len(locks) == 0
+    
+    def test_keyed_locks_overlapping_sets_do_not_deadlock(self):
+        locks = KeyedLocks()
+        
+        async def work(*keys):
+            async with locks.hold(*keys):
+                await asyncio.sleep(0.005)
+        
+        async def run():
+            await asyncio.wait_for(asyncio.gather(*(
+                work("A", "B", "C") if i % 2 else work("C", "B", "A") for i in range(20)
+            )), timeout=5)
+        
+        asyncio.run(run())
+        assert len(locks) == 0
+    
+    def test_concurrent_evaluate_and_append(self, tmp_path):
+        """Evaluations read the indexes while other threads append; the ledger chain stays linear"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        loader = DataLoader(data_dir=str(tmp_path), use_snapshot_cache=False)
+        pm = ProvenanceManager(db_path=str(tmp_path / "ledger.db"), anchor_mode="per_tx")
+        engine = AMLEngine()
+        base_time = datetime(2024, 1, 1)
+        
+        def process(i):
+            tx = {
+                "Transaction_ID": f"TX-{i}",
+                "Sender_Account_ID": f"ACC-{i % 7}",
+                "Receiver_Account_ID": f"ACC-{(i * 3 + 1) % 7}",
+                "Amount": 1000.0 + i,
+                "Timestamp": (base_time + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            with loader.lock.read():
+                evaluation = engine.evaluate_transaction(
+                    tx, {}, set(), loader.transactions, graph=loader.graph, windows=loader.windows
+                )
+            record = pm.log_transaction(tx, evaluation["total_score"], evaluation["decision"], evaluation)
+            loader.append_transaction(tx)
+            return record["ledger_id"]
+        
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                ledger_ids = list(pool.map(process, range(300)))
+            assert sorted(ledger_ids) == list(range(1, 301))
+            assert pm.verify_ledger() == "VERIFIED"
+        finally:
+            pm.close()
+        assert len(loader.transactions) == 300
+        assert loader.graph.edge_count == len({(f"ACC-{i % 7}", f"ACC-{(i * 3 + 1) % 7}") for i in range(300)})
+
+
+class TestSharedEngineState:
+    """Test suite for state shared between worker processes"""
+    
+    def _worker(self, tmp_path, name, poll_seconds=60):
+        data_dir = tmp_path / name
+        data_dir.mkdir()
+        loader = DataLoader(data_dir=str(data_dir), use_snapshot_cache=False)
+        loader.account_lookup = {"ACC-001": {"Name": "John Doe", "KYC_Status": "Verified", "Country": "USA"}}
+        engine = AMLEngine()
+        state = SharedEngineState(str(tmp_path / "shared.db"), loader, engine, poll_seconds=poll_seconds)
+        return state, loader, engine
+    
+    def _tx(self, i):
+        return {"Transaction_ID": f"TX-{i}", "Sender_Account_ID": "ACC-001", "Receiver_Account_ID": "ACC-002",
+                "Amount": 4000.0, "Timestamp": f"2024-01-01 0{i}:00:00"}
+    
+    def test_changes_reach_other_workers(self, tmp_path):
+        a, loader_a, engine_a = self._worker(tmp_path, "a")
+        b, loader_b, engine_b = self._worker(tmp_path, "b")
+        try:
+            a.append_transactions([self._tx(1), self._tx(2)])
+            a.set_structuring_threshold(7000)
+            a.set_account_status("ACC-001", "Gated_5000_Limit")
+            
+            b.refresh()
+            assert len(loader_b.transactions) == 2
+            assert engine_b.structuring_threshold == 7000
+            assert loader_b.account_lookup["ACC-001"]["Account_Status"] == "Gated_5000_Limit"
+            assert loader_b.account_flags.get("ACC-001").bits & FLAG_GATED
+            assert loader_b.windows.stats("ACC-001", 0) == (2, 8000.0)
+            
+            # Each worker applies its own writes once
+            b.append_transactions([self._tx(3)])
+            a.refresh()
+            b.refresh()
+            assert len(loader_a.transactions) == len(loader_b.transactions) == 3
+        finally:
+            a.close()
+            b.close()
+    
+    def test_idle_worker_catches_up_within_poll_interval(self, tmp_path):
+        import time
+        a, _, _ = self._worker(tmp_path, "a")
+        b, _, engine_b = self._worker(tmp_path, "b", poll_seconds=0.05)
+        try:
+            a.set_structuring_threshold(5000)
+            deadline = time.monotonic() + 2
+            while engine_b.structuring_threshold != 5000 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert engine_b.structuring_threshold == 5000
+        finally:
+            a.close()
+            b.close()
+    
+    def test_new_worker_replays_journal(self, tmp_path):
+        a, _, _ = self._worker(tmp_path, "a")
+        a.append_transactions([self._tx(1)])
+        a.set_account_status("ACC-001", "Gated_5000_Limit")
+        a.close()
+        
+        b, loader_b, _ = self._worker(tmp_path, "b")
+        b.close()
+        assert len(loader_b.transactions) == 1
+        assert loader_b.account_lookup["ACC-001"]["Account_Status"] == "Gated_5000_Limit"
+    
+    def test_ledger_chain_spans_writers(self, tmp_path):
+        """Two managers on one database (as two workers would be) extend a single chain"""
+        db_path = str(tmp_path / "ledger.db")
+        first = ProvenanceManager(db_path=db_path, anchor_mode="queue")
+        second = ProvenanceManager(db_path=db_path, anchor_mode="queue")
+        try:
+            # Only one of them runs the anchor worker
+            assert first.anchor_worker is not None
+            assert second.anchor_worker is None
+            for i in range(10):
+                (first if i % 3 else second).log_transaction({"Transaction_ID": f"TX-{i}"}, i, "Approve")
+            assert first.verify_ledger() == "VERIFIED"
+            assert second.verify_ledger_report("full")["rows_checked"] == 10
+        finally:
+            second.close()
+            first.close()
+
+
+class TestShardedEvaluation:
+    """Test suite for batch evaluation spread across worker processes"""
+    
+    def _transactions(self, n, seed, start=0):
+        return random_transactions(n, seed, minutes=20, accounts=12, receivers=6, start=start)
+    
+    def test_sharded_matches_single_process(self, account_db):
+        """Every rule, graph rules included, matches evaluate_batch row for row"""
+        engine = AMLEngine()
+        pep_db = {"panama holdings"}
+        graph, windows = TransactionGraph(), SenderWindows()
+        for tx in self._transactions(40, seed=1):
+            graph.add_transaction(tx)
+            windows.add_transaction(tx)
+        txs = self._transactions(400, seed=2, start=40)
+        
+        expected = engine.evaluate_batch(txs, account_db, pep_db, None, graph=graph, windows=windows)
+        evaluator = ShardedEvaluator(workers=2, min_rows=0)
+        try:
+            assert evaluator.evaluate_batch(engine, txs, account_db, pep_db, None, graph=graph, windows=windows) == expected
+            # The pool and the history index are reused across batches
+            assert evaluator.evaluate_batch(engine, txs[:100], account_db, pep_db, None, graph=graph, windows=windows) == expected[:100]
+        finally:
+            evaluator.close()
+        
+        assert any("error" in result for result in expected)
+        assert any(result.get("cycle_path") for result in expected)
+        assert any("Mule" in " ".join(result.get("triggered_rules", [])) for result in expected)
+    
+    def test_edge_index_shows_each_row_earlier_edges_only(self):
+        graph = TransactionGraph()
+        graph.add_edge("C", "A")
+        index = EdgeIndex.build(graph)
+        delta = EdgeDelta.build(index, graph, ["A", "B", "X"], ["B", "C", "A"], [True, True, False])
+        code = dict(zip(["A", "B", "X"], delta.sender))
+        code["C"] = delta.receiver[1]
+        
+        # Row 1 (B→C) only closes A→B→C→A once row 0 (A→B) is visible
+        assert delta.at(index, 1).find_cycle(code["B"], code["C"]) == [code[n] for n in ("B", "C", "A", "B")]
+        assert delta.at(index, 0).find_cycle(code["B"], code["C"]) is None
+        # Row 2 (X→A) was rejected, so its edge is never added
+        assert delta.at(index, 2).find_cycle(code["X"], code["A"]) is None
+    
+    def test_edge_index_takes_history_edges_in_place(self):
+        graph = TransactionGraph()
+        graph.add_edge("A", "B")
+        index = EdgeIndex.build(graph)
+        slots = len(index.succ_len)
+        
+        for k in range(sharded.INDEX_SLACK + 2):
+            index.add_edge("A", f"N{k}")
+        
+        # A's spare slots take the first edges, the rest overflow in order
+        a = index.codes["A"]
+        start, length = index.succ_start[a], index.succ_len[a]
+        assert [index.nodes[c] for c in index.succ_to[start:start + length]] == ["B", "N0", "N1", "N2", "N3"]
+        assert [(index.nodes[o], index.nodes[n]) for o, n in index.succ_overflow] == [("A", "N4"), ("A", "N5")]
+        assert len(index.succ_len) == slots
+        assert not index.full(graph.edge_count)
+    
+    def test_index_is_kept_across_batches(self, account_db, monkeypatch):
+        """History gained between batches reaches workers without a new index, until it overflows"""
+        engine = AMLEngine()
+        graph, windows = TransactionGraph(), SenderWindows()
+        for tx in self._transactions(40, seed=1):
+            graph.add_transaction(tx)
+            windows.add_transaction(tx)
+        evaluator = ShardedEvaluator(workers=2, min_rows=0)
+        try:
+            evaluator.evaluate_batch(engine, self._transactions(50, seed=2, start=40), account_db, set(), None,
+                                     graph=graph, windows=windows)
+            spec = evaluator._index_spec
+            for start, seed in ((50, 4), (200, 5)):
+                # New accounts too: ACC-013+ never appeared before
+                for tx in self._transactions(150, seed=seed, start=start):
+                    tx["Receiver_Account_ID"] = tx["Receiver_Account_ID"].replace("ACC-00", "ACC-10")
+                    graph.add_transaction(tx)
+                    windows.add_transaction(tx)
+                txs = self._transactions(300, seed=seed + 10, start=start + 150)
+                expected = engine.evaluate_batch(txs, account_db, set(), None, graph=graph, windows=windows)
+                assert evaluator.evaluate_batch(engine, txs, account_db, set(), None,
+                                                graph=graph, windows=windows) == expected
+                assert evaluator._index_spec == spec
+                assert any(result.get("cycle_path") for result in expected)
+            
+            # Past the overflow limit the index is rebuilt
+            monkeypatch.setattr(sharded, "INDEX_OVERFLOW_MIN", 0)
+            monkeypatch.setattr(sharded, "INDEX_OVERFLOW_FRACTION", 0)
+            graph.add_edge("ACC-001", "ACC-NEW")
+            evaluator.evaluate_batch(engine, txs, account_db, set(), None, graph=graph, windows=windows)
+            assert evaluator._index_spec != spec
+        finally:
+            evaluator.close()
+    
+    def test_edge_log_stays_bounded_between_batches(self, account_db, monkeypatch):
+        """A graph that keeps growing without sharded batches drops its log instead of copying itself"""
+        monkeypatch.setattr(sharded, "INDEX_OVERFLOW_MIN", 20)
+        engine = AMLEngine()
+        graph, windows = TransactionGraph(), SenderWindows()
+        evaluator = ShardedEvaluator(workers=2, min_rows=0)
+        try:
+            evaluator.evaluate_batch(engine, self._transactions(50, seed=2), account_db, set(), None,
+                                     graph=graph, windows=windows)
+            spec = evaluator._index_spec
+            assert graph.edge_log == []
+        
+            for k in range(20):
+                graph.add_edge("ACC-001", f"ACC-9{k:02d}")
+            assert len(graph.edge_log) == 20
+            for k in range(20, 200):
+                graph.add_edge("ACC-001", f"ACC-9{k:02d}")
+            assert graph.edge_log is None
+        
+            # The next batch rebuilds from the adjacency maps and stays exact
+            txs = self._transactions(100, seed=6, start=50)
+            expected = engine.evaluate_batch(txs, account_db, set(), None, graph=graph, windows=windows)
+            assert evaluator.evaluate_batch(engine, txs, account_db, set(), None,
+                                            graph=graph, windows=windows) == expected
+            assert evaluator._index_spec != spec
+            assert graph.edge_log == []
+        finally:
+            evaluator.close()
+        assert graph.edge_log is None
+    
+    def test_small_batches_stay_in_process(self, account_db):
+        evaluator = ShardedEvaluator(workers=4, min_rows=1000)
+        txs = self._transactions(50, seed=3)
+        
+        results = evaluator.evaluate_batch(AMLEngine(), txs, account_db, set(), None,
+                                           graph=TransactionGraph(), windows=SenderWindows())
+        
+        assert len(results) == 50
+        assert evaluator._pool is None
+
+
+class TestAPI:
+    """Test suite for the HTTP endpoints, against a temporary ledger and empty history"""
+    
+    @pytest.fixture
+    def app_state(self, tmp_path, monkeypatch, account_db):
+        """Installs a fresh engine, ledger and history in backend.main; returns a TestClient for it"""
+        from fastapi.testclient import TestClient
+        from backend import main
+        from backend.core.shared_state import EngineState
+        opened = []
+        
+        def install(name="app"):
+            state_dir = tmp_path / name
+            state_dir.mkdir()
+            loader = DataLoader(data_dir=str(state_dir))
+            loader.account_lookup = {account_id: dict(info) for account_id, info in account_db.items()}
+            loader.pep_screener = PEPScreener(["Panama Holdings"])
+            loader.account_flags = AccountFlags.build(loader.account_lookup, loader.pep_screener)
+            engine = AMLEngine()
+            pm = ProvenanceManager(db_path=str(state_dir / "provenance.db"), anchor_mode="per_tx")
+            reports = STRQueue(lambda tx, rules, fallback=True: "template report", ReportStore(str(state_dir / "str.db")))
+            opened.extend([reports, pm])
+            for attr, value in [("data_loader", loader), ("aml_engine", engine), ("provenance_manager", pm),
+                                ("str_queue", reports), ("engine_state", EngineState(loader, engine))]:
+                monkeypatch.setattr(main, attr, value)
+            # No `with`: the app lifespan (which loads backend/data) does not run
+            return TestClient(main.app)
+        
+        yield install
+        for resource in opened:
+            resource.close()
+    
+    @pytest.fixture
+    def api(self, app_state):
+        return app_state()
+    
+    def test_concurrent_paged_ledger_queries(self, api):
+        """Streams advanced on different threadpool threads keep their SQLite reader usable"""
+        import httpx
+        from backend import main
+        main.provenance_manager.log_transactions([
+            ({"Transaction_ID": f"TX-{i}", "Amount": i}, 10, "Clear") for i in range(300)
+        ])
+        
+        async def read_all(client):
+            ids, cursor = [], None
+            while True:
+                params = {"limit": 50, **({"cursor": cursor} if cursor else {})}
+                response = await client.get("/api/ledger/decision/Clear", params=params)
+                assert response.status_code == 200
+                lines = [json.loads(line) for line in response.text.splitlines()]
+                ids += [row["id"] for row in lines[:-1]]
+                cursor = lines[-1]["next_cursor"]
+                if cursor is None:
+                    return ids
+        
+        async def run():
+            # One event loop for every stream, as in the server, so they share its threadpool
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(*(read_all(client) for _ in range(30)))
+        
+        results = asyncio.run(run())
+        assert all(ids == list(range(1, 301)) for ids in results)
+    
+    @staticmethod
+    def ledger_rows():
+        from backend import main
+        conn = sqlite3.connect(main.provenance_manager.db_path)
+        rows = conn.execute(
+            "SELECT tx_id, tx_data, score, decision, prev_hash, current_hash FROM compliance_log ORDER BY id"
+        ).fetchall()
+        conn.close()
+        return rows
+    
+    def test_batch_endpoint_matches_sequential_calls(self, app_state, monkeypatch):
+        """NDJSON rows, rejected lines included, come back as /api/evaluate would answer them one by one"""
+        from backend import main
+        monkeypatch.setattr(main, "BATCH_CHUNK_SIZE", 7)  # Several chunks, split mid-sender
+        lines = [json.dumps(tx) for tx in random_transactions(40, seed=7, minutes=45, accounts=5)]
+        lines[3] = "{not json"
+        lines[11] = json.dumps({"Transaction_ID": "TX-11", "Amount": 5})  # Missing fields
+        lines.insert(20, "   ")  # Blank lines are skipped, not answered
+        
+        client = app_state("sequential")
+        expected = []
+        for line in lines:
+            if not line.strip():
+                continue
+            response = client.post("/api/evaluate", content=line, headers={"Content-Type": "application/json"})
+            if response.status_code == 200:
+                expected.append(response.json())
+            else:
+                tx_id = json.loads(line)["Transaction_ID"] if response.status_code == 403 else None
+                expected.append({"status_code": response.status_code, "transaction_id": tx_id})
+        sequential_ledger = self.ledger_rows()
+        
+        client = app_state("batch")
+        response = client.post("/api/evaluate/batch", content="\n".join(lines))
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        results = [json.loads(line) for line in response.text.splitlines()]
+        
+        assert len(results) == len(expected) == 40
+        for result, want in zip(results, expected):
+            if "status_code" in want:
+                assert (result["status_code"], result["transaction_id"]) == (want["status_code"], want["transaction_id"])
+                if want["status_code"] == 403:
+                    assert "GATED_ACCOUNT_BREACH" in result["error"]
+            else:
+                assert result == want
+        assert [r["status_code"] for r in results if "error" in r].count(422) == 2
+        assert any(r.get("status_code") == 403 for r in results)
+        # Same rows, same chain: rejected lines never reach the ledger
+        assert self.ledger_rows() == sequential_ledger
+        assert len(sequential_ledger) == sum("error" not in r for r in results)
+    
+    
+    def test_cluster_endpoints(self, api):
+        """Clusters come back largest first with their members; unknown accounts are a 404"""
+        from backend import main
+        main.data_loader.append_transactions([
+            {"Transaction_ID": f"TX-{i}", "Sender_Account_ID": sender, "Receiver_Account_ID": receiver,
+             "Amount": 100.0, "Timestamp": f"2024-01-01 0{i}:00:00"}
+            for i, (sender, receiver) in enumerate([("D", "E"), ("A", "B"), ("B", "C"), ("C", "A"), ("F", "F")])
+        ])
+        
+        body = api.get("/api/graph/clusters").json()
+        assert body["total_clusters"] == 2
+        assert [(c["size"], sorted(c["accounts"])) for c in body["clusters"]] == [(3, ["A", "B", "C"]), (2, ["D", "E"])]
+        assert all(c["cluster_id"] in c["accounts"] for c in body["clusters"])
+        
+        body = api.get("/api/graph/clusters", params={"min_size": 1, "limit": 2}).json()
+        assert body["total_clusters"] == 3
+        assert [c["size"] for c in body["clusters"]] == [3, 2]
+        assert api.get("/api/graph/clusters", params={"limit": 0}).status_code == 422
+        
+        body = api.get("/api/graph/clusters/C").json()
+        assert body["size"] == 3 and body["accounts"] == ["A", "B", "C"]  # In the order they joined
+        assert body["cluster_id"] == api.get("/api/graph/clusters/A").json()["cluster_id"]
+        assert api.get("/api/graph/clusters/F").json()["accounts"] == ["F"]
+        
+        response = api.get("/api/graph/clusters/NOBODY")
+        assert response.status_code == 404
+        assert "NOBODY" in response.json()["detail"]
+    
+
+
 class TestIntegration:
     """Integration tests for complete workflows"""
     
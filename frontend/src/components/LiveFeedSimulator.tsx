@@ -54,6 +54,11 @@ export default function LiveFeedSimulator({ onTransactionReceived }: LiveFeedSim
     };
 
     eventSource.onerror = (error) => {
+      // The browser reconnects with Last-Event-ID and the server resumes from the ledger
+      if (eventSource.readyState === EventSource.CONNECTING) {
+        setCurrentStatus("connecting");
+        return;
+      }
       console.error("EventSource error:", error);
       setCurrentStatus("error");
       stopLiveFeed();